@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the batch dispatch solver on synthetic orders and drivers.
+
+Each scenario places N pending orders and N idle drivers uniformly at
+random, either in one 40 x 40 km metro area (one reachable group, the worst
+case) or spread over ten such cities, and times the steps of
+``plan_dispatch``: splitting into reachable groups, building the haversine
+cost matrices and solving the assignment (SciPy, and the NumPy auction
+fallback for sizes up to ``--fallback-max``).
+
+Usage:
+    python bench_dispatch.py [--sizes 1000,10000] [--max-pickup-km 15] [--fallback-max 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from backend.utils import dispatch
+
+CITIES = [(18.52, 73.86), (19.08, 72.88), (28.61, 77.21), (12.97, 77.59), (13.08, 80.27),
+          (22.57, 88.36), (17.39, 78.49), (23.02, 72.57), (26.91, 75.79), (21.15, 79.09)]
+METRO_DEGREES = 0.36  # about 40 km
+
+
+def _points(rng, n, cities):
+    centres = np.array(cities)[rng.integers(0, len(cities), n)]
+    return centres + rng.uniform(-METRO_DEGREES / 2, METRO_DEGREES / 2, (n, 2))
+
+
+def run(n, cities, max_km, solver, rng):
+    orders, drivers = _points(rng, n, cities), _points(rng, n, cities)
+    dispatch.linear_sum_assignment = solver
+    timings = {"groups": 0.0, "matrix": 0.0, "solve": 0.0}
+    assigned, total_km = 0, 0.0
+
+    started = time.perf_counter()
+    groups = dispatch.reachable_groups(orders[:, 0], orders[:, 1], drivers[:, 0], drivers[:, 1], max_km)
+    timings["groups"] = time.perf_counter() - started
+    for order_idx, driver_idx in groups:
+        started = time.perf_counter()
+        cost = dispatch.haversine_matrix_km(orders[order_idx, 0], orders[order_idx, 1],
+                                            drivers[driver_idx, 0], drivers[driver_idx, 1])
+        timings["matrix"] += time.perf_counter() - started
+        started = time.perf_counter()
+        rows, columns = dispatch.solve_assignment(cost, max_km)
+        timings["solve"] += time.perf_counter() - started
+        assigned += len(rows)
+        total_km += float(cost[rows, columns].sum())
+    return len(groups), timings, assigned, total_km
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='1000,10000', help='Comma-separated N for N orders x N drivers.')
+    parser.add_argument('--max-pickup-km', type=float, default=15.0)
+    parser.add_argument('--fallback-max', type=int, default=1000,
+                        help='Largest N also timed with the auction fallback.')
+    args = parser.parse_args()
+
+    scipy_solver = dispatch.linear_sum_assignment
+    solvers = [("scipy", scipy_solver)] if scipy_solver is not None else []
+    solvers.append(("auction", None))
+    for n in [int(size) for size in args.sizes.split(',')]:
+        for layout, cities in (("1 city", CITIES[:1]), ("10 cities", CITIES)):
+            for name, solver in solvers:
+                if solver is None and n > args.fallback_max:
+                    continue
+                groups, timings, assigned, total_km = run(n, cities, args.max_pickup_km, solver,
+                                                          np.random.default_rng(n))
+                total = sum(timings.values())
+                print(f"{n:>6} x {n:<6} {layout:>9} {name:>7}: groups {groups:>2}  "
+                      f"split {timings['groups']:6.2f}s  matrix {timings['matrix']:6.2f}s  "
+                      f"solve {timings['solve']:7.2f}s  total {total:7.2f}s  "
+                      f"assigned {assigned}  pickup {total_km / max(assigned, 1):.2f} km avg", flush=True)
+    dispatch.linear_sum_assignment = scipy_solver
+
+
+if __name__ == "__main__":
+    main()
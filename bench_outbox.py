@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark outbox drain throughput against a local SMTP stand-in.
+
+Starts a minimal SMTP sink on 127.0.0.1, queues N messages into a throwaway
+SQLite database and times how long the outbox worker takes to deliver them.
+
+Usage: python bench_outbox.py [--messages 2000] [--batch-size 50]
+"""
+import argparse
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib and counts delivered messages."""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.sessions += 1
+        self.reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.delivered += 1
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.sessions = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    sink = SMTPSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_outbox.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['MAIL_SERVER'] = '127.0.0.1'
+    os.environ['MAIL_PORT'] = str(sink.server_address[1])
+    os.environ['MAIL_USE_TLS'] = 'false'
+    os.environ['MAIL_DEFAULT_SENDER'] = 'bench@swiftlogix.local'
+    os.environ['FLASK_ENV'] = 'production'  # keeps smtplib debug output quiet
+
+    from flask_mail import Message
+    from backend.app import create_app
+    from backend.database import db
+    from backend.utils.outbox import enqueue_message, run_worker
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            enqueue_message(Message(subject=f"Bench {i}", recipients=[f"user{i}@example.com"],
+                                    body="Outbox benchmark message"), commit=False)
+        db.session.commit()
+        enqueue_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sent, failed = run_worker(once=True, batch_size=args.batch_size)
+        drain_time = time.perf_counter() - start
+
+    sink.shutdown()
+    print(f"Queued {args.messages} messages in {enqueue_time:.3f}s "
+          f"({args.messages / enqueue_time:.0f} msg/s)")
+    print(f"Drained sent={sent} failed={failed} in {drain_time:.3f}s "
+          f"({sent / drain_time:.0f} msg/s, batch size {args.batch_size})")
+    print(f"SMTP sink received {sink.delivered} messages over {sink.sessions} session(s)")
+
+
+if __name__ == "__main__":
+    main()
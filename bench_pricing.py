@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark route pricing: scalar loop vs NumPy arrays.
+
+Prices random routes around Pune with the per-route loop (the fallback used
+when NumPy is missing) and with ``price_route_arrays``, and checks that both
+give identical distances, totals, driver shares and commissions.
+
+Usage: python bench_pricing.py [--sizes 1000 100000 1000000] [--seed 7]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from backend.utils import pricing  # noqa: E402
+
+
+def random_routes(n, rng):
+    pickup_lats = [18.3 + rng.random() * 0.5 for _ in range(n)]
+    pickup_lngs = [73.6 + rng.random() * 0.5 for _ in range(n)]
+    drop_lats = [18.3 + rng.random() * 0.5 for _ in range(n)]
+    drop_lngs = [73.6 + rng.random() * 0.5 for _ in range(n)]
+    weights = [round(rng.uniform(0.5, 500), 1) for _ in range(n)]
+    return pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if pricing.np is None:
+        print("NumPy is not installed; only the scalar loop is available")
+    rng = random.Random(args.seed)
+    for n in args.sizes:
+        routes = random_routes(n, rng)
+
+        start = time.perf_counter()
+        expected = pricing._price_routes_loop(*routes)
+        loop_time = time.perf_counter() - start
+        line = f"{n:>9} routes: loop {loop_time * 1000:9.1f} ms ({n / loop_time:>11,.0f} routes/s)"
+
+        if pricing.np is not None:
+            start = time.perf_counter()
+            got = pricing.price_route_arrays(*routes)
+            numpy_time = time.perf_counter() - start
+            mismatches = sum(sum(1 for a, b in zip(want, column.tolist()) if a != b)
+                             for want, column in zip(expected, got))
+            line += (f" | numpy {numpy_time * 1000:8.1f} ms ({n / numpy_time:>12,.0f} routes/s,"
+                     f" {loop_time / numpy_time:5.1f}x) | mismatches: {mismatches}")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
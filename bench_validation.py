@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark order payload validation: hand-written checks vs schemas.
+
+The legacy path is the one ``create_order`` used before the schemas: copy
+the form into a dict, ``require_fields``, a type/float loop over the route
+fields, then ``validate_lat_lng`` (which converts to float again). The
+schema path is ``ORDER_SCHEMA.parse`` on the same input. Both are timed on
+a JSON object and on a multipart-style ``MultiDict`` of strings, plus an
+invalid payload.
+
+Usage:
+    python bench_validation.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from werkzeug.datastructures import MultiDict
+
+from backend.utils.validators import ORDER_SCHEMA, require_fields
+
+ORDER_FIELDS = ["pickup_lat", "pickup_lng", "drop_lat", "drop_lng",
+                "pickup_address", "drop_address", "material_type", "weight_kg"]
+ROUTE_FIELDS = ["pickup_lat", "pickup_lng", "drop_lat", "drop_lng", "weight_kg"]
+FORM_FIELDS = ORDER_FIELDS + ["material_description", "quote_token"]
+
+
+def validate_lat_lng(lat, lng):
+    try:
+        lat = float(lat)
+        lng = float(lng)
+        return -90 <= lat <= 90 and -180 <= lng <= 180
+    except Exception:
+        return False
+
+
+def legacy_parse(data, is_form):
+    if is_form:
+        data = {field: data.get(field) for field in FORM_FIELDS}
+    if not isinstance(data, dict):
+        return None, "Order must be a JSON object"
+    ok, err = require_fields(data, ORDER_FIELDS)
+    if not ok:
+        return None, err
+    route = {}
+    try:
+        for field in ROUTE_FIELDS:
+            value = data[field]
+            if not isinstance(value, (str, int, float)):
+                return None, f"Invalid {field} value"
+            route[field] = float(value)
+    except (ValueError, TypeError) as e:
+        return None, f"Invalid numeric values provided: {str(e)}"
+    if not (validate_lat_lng(route["pickup_lat"], route["pickup_lng"])
+            and validate_lat_lng(route["drop_lat"], route["drop_lng"])):
+        return None, "Invalid coordinates"
+    route.update({
+        "pickup_address": data["pickup_address"],
+        "drop_address": data["drop_address"],
+        "material_type": data["material_type"],
+        "material_description": data.get("material_description"),
+    })
+    return route, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    payload = {"pickup_lat": 18.5204, "pickup_lng": 73.8567, "drop_lat": 18.5912, "drop_lng": 73.7389,
+               "pickup_address": "Shivajinagar, Pune", "drop_address": "Hinjewadi, Pune",
+               "material_type": "Boxes", "weight_kg": 12.5, "material_description": "Fragile"}
+    cases = {
+        "json": (payload, False),
+        "form": (MultiDict({k: str(v) for k, v in payload.items()}), True),
+        "invalid": (dict(payload, drop_lat="north"), False),
+    }
+
+    for name, (data, is_form) in cases.items():
+        legacy, _ = legacy_parse(data, is_form)
+        compiled, _ = ORDER_SCHEMA.parse(data)
+        if name != "invalid" and legacy != compiled:
+            raise SystemExit(f"{name}: results differ\n  legacy:   {legacy}\n  compiled: {compiled}")
+        timings = {}
+        for label, fn in (("legacy", lambda: legacy_parse(data, is_form)),
+                          ("schema", lambda: ORDER_SCHEMA.parse(data))):
+            best = min(timeit.repeat(fn, number=args.iterations, repeat=3))
+            timings[label] = best / args.iterations * 1e6
+        print(f"{name:>8}: legacy {timings['legacy']:6.2f} us  schema {timings['schema']:6.2f} us  "
+              f"({timings['legacy'] / timings['schema']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Shared fixtures for the pytest suites in this directory.
+
+The backend reads its configuration from the environment when it is first
+imported, so the test settings are put in place here, before any test
+module imports it: an in-memory database per app, in-process rate limits,
+cheap bcrypt and inline hashing.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["RATE_LIMIT_STORAGE"] = "memory://"
+os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+os.environ["HASH_POOL_WORKERS"] = "0"
+os.environ["LOCATION_FLUSH_INTERVAL"] = "0"
+os.environ["PROXY_FIX_X_FOR"] = "1"
+os.environ["LOG_SAMPLE_RATE"] = "0"
+os.environ["LOG_DEBUG_FLAG_FILE"] = ""
+os.environ["ID_STATE_DIR"] = tempfile.mkdtemp(prefix="swiftlogix-ids-")
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-of-at-least-32-bytes")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+
+@pytest.fixture
+def app():
+    from backend.app import create_app
+    from backend.database import db
+    from backend.utils.rate_limit import limiter
+    from backend.utils.revocation import revocation_cache
+
+    # Per-process singletons would otherwise carry state between tests
+    limiter._backend = None
+    revocation_cache.__init__()
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, email, role="customer", password="Secret123!", **fields):
+    """Register through the API; returns ``(token, user)``."""
+    response = client.post("/api/auth/register", json=dict(
+        name="Test " + email.split("@")[0], email=email, password=password, role=role, **fields))
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    return body["token"], body["user"]
+
+
+def auth(token):
+    return {"Authorization": "Bearer " + token}
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, send_from_directory
+from flask import Flask, render_template, send_from_directory
 from flask_cors import CORS
 from flask_mail import Mail
 from dotenv import load_dotenv
@@ -9,12 +9,17 @@ load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
 from .config import DevelopmentConfig, ProductionConfig
 from .database import db, migrate
-from .utils.security import bcrypt, jwt
+from .utils.security import bcrypt, jwt, HashingBusy, too_many_requests
 from .routes.auth_routes import auth_bp
 from .routes.customer_routes import customer_bp
 from .routes.driver_routes import driver_bp
 from .routes.admin_routes import admin_bp
 from . import models  # ensure models are imported for migrations
+from .cli import register_cli
+from .utils.request_logging import init_logging
+from .utils.uploads import UploadRequest, UploadRejected, send_upload
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
 def create_app():
@@ -31,6 +36,14 @@ def create_app():
     else:
         app.config.from_object(DevelopmentConfig)
 
+    # Streams material photos straight to disk (see utils/uploads.py)
+    app.request_class = UploadRequest
+
+    # Behind a load balancer remote_addr is the proxy; take the client
+    # address from the X-Forwarded-For hops the proxies added
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
     CORS(app, supports_credentials=True)
 
     # Init extensions
@@ -43,13 +56,11 @@ def create_app():
     mail = Mail(app)
     app.extensions['mail'] = mail
 
-    # Request logging middleware
-    @app.before_request
-    def log_request_info():
-        print(f"Request: {request.method} {request.url}")
-        print(f"Headers: {dict(request.headers)}")
-        if request.data:
-            print(f"Body: {request.data}")
+    # Background job commands (outbox worker, ...)
+    register_cli(app)
+
+    # Sampled, queue-backed request logging
+    init_logging(app)
 
     # Blueprints
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
@@ -60,14 +71,23 @@ def create_app():
     # Global error handlers
     @app.errorhandler(422)
     def handle_unprocessable_entity(e):
-        print(f"422 Error: {e}")
-        print(f"Request: {request.method} {request.url}")
-        print(f"Headers: {dict(request.headers)}")
+        app.logger.info(f"422 Error: {e}")
         return {"message": "Unprocessable Entity"}, 422
 
+    @app.errorhandler(HashingBusy)
+    def handle_hashing_busy(e):
+        return too_many_requests("Server is busy, please retry shortly", e.retry_after)
+
+    @app.errorhandler(UploadRejected)
+    def handle_upload_rejected(e):
+        return {"message": e.message}, e.status
+
     @app.errorhandler(Exception)
     def handle_exception(e):
-        print(f"Unhandled exception: {str(e)}")
+        if isinstance(e, HTTPException):
+            # 404, 405, 416, ... keep their own status
+            return e
+        app.logger.error(f"Unhandled exception: {str(e)}", exc_info=e)
         return {"message": "Internal Server Error"}, 500
 
     @app.route('/')
@@ -125,6 +145,11 @@ def create_app():
     def driver_chat_page():
         return render_template('driver/chat.html')
         
+    # Material photos and thumbnails, by content hash
+    @app.route('/uploads/<name>')
+    def uploaded_photo(name):
+        return send_upload(name)
+
     # Serve favicon.ico explicitly
     @app.route('/favicon.ico')
     def favicon():
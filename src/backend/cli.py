@@ -0,0 +1,109 @@
+"""
+Flask CLI commands for background jobs.
+
+Run with ``flask --app backend.app <command>`` from the ``src`` directory.
+"""
+import time
+
+import click
+
+
+def register_cli(app):
+    @app.cli.command('outbox-worker')
+    @click.option('--once', is_flag=True, help='Drain whatever is due and exit.')
+    @click.option('--batch-size', type=int, default=None, help='Messages per SMTP session.')
+    @click.option('--poll-interval', type=float, default=None, help='Seconds to sleep when idle.')
+    def outbox_worker(once, batch_size, poll_interval):
+        """Deliver queued emails from the outbox table."""
+        from .utils.outbox import run_worker
+        sent, failed = run_worker(once=once, batch_size=batch_size, poll_interval=poll_interval) or (0, 0)
+        click.echo(f"Outbox drained: sent={sent} failed={failed}")
+
+    @app.cli.command('sweep-reset-tokens')
+    @click.option('--interval', type=float, default=None,
+                  help='Repeat every N seconds instead of running once.')
+    def sweep_reset_tokens(interval):
+        """Delete expired password-reset tokens."""
+        from .utils.reset_tokens import sweep_expired_reset_tokens
+        while True:
+            click.echo(f"Expired reset tokens removed: {sweep_expired_reset_tokens()}")
+            if not interval:
+                return
+            time.sleep(interval)
+
+    @app.cli.command('thumbnails')
+    def thumbnails():
+        """Create thumbnails missing from the upload folder."""
+        from .utils.uploads import backfill_thumbnails
+        made = backfill_thumbnails(app.config['UPLOAD_FOLDER'], app.config.get('UPLOAD_THUMBNAIL_SIZE', 320))
+        click.echo(f"Thumbnails created: {made}")
+
+    @app.cli.command('backfill-pickup-cells')
+    @click.option('--chunk-size', type=int, default=1000, help='Orders per transaction.')
+    def backfill_pickup_cells(chunk_size):
+        """Fill in Order.pickup_cell for orders created before it existed."""
+        from .database import db
+        from .models import Order
+        from .utils.geo import pickup_cell
+        filled, last = 0, 0
+        while True:
+            rows = (db.session.query(Order.id, Order.pickup_lat, Order.pickup_lng)
+                    .filter(Order.id > last, Order.pickup_cell.is_(None), Order.pickup_lat.isnot(None))
+                    .order_by(Order.id).limit(chunk_size).all())
+            if not rows:
+                break
+            db.session.execute(db.update(Order), [
+                {"id": row.id, "pickup_cell": pickup_cell(row.pickup_lat, row.pickup_lng)} for row in rows])
+            db.session.commit()
+            filled += len(rows)
+            last = rows[-1].id
+        click.echo(f"Pickup cells filled: {filled}")
+
+    @app.cli.command('dispatch')
+    @click.option('--interval', type=float, default=None,
+                  help='Repeat every N seconds instead of running once.')
+    @click.option('--max-pickup-km', type=float, default=None, help='Farthest a driver is sent to a pickup.')
+    def dispatch(interval, max_pickup_km):
+        """Assign pending orders to idle drivers, minimising total pickup distance."""
+        from .utils.dispatch import run_dispatch
+        while True:
+            stats = run_dispatch(max_km=max_pickup_km)
+            click.echo(f"Dispatched {stats['assigned']} of {stats['orders']} pending orders "
+                       f"to {stats['drivers']} drivers in {stats['seconds']}s")
+            if not interval:
+                return
+            time.sleep(interval)
+
+    @app.cli.command('location-history-sweep')
+    @click.option('--interval', type=float, default=None,
+                  help='Repeat every N seconds instead of running once.')
+    def location_history_sweep(interval):
+        """Downsample driver location history past its full-resolution window and expire old history."""
+        from .utils.location_history import sweep_history
+        config = app.config
+        while True:
+            stats = sweep_history(config['LOCATION_HISTORY_FULL_HOURS'], config['LOCATION_HISTORY_DOWNSAMPLE_SECONDS'],
+                                  config['LOCATION_HISTORY_RETENTION_DAYS'], config['LOCATION_HISTORY_SWEEP_CHUNK_SIZE'])
+            click.echo(f"Location history: merged {stats['merged']} segments into {stats['written']}, "
+                       f"deleted {stats['deleted']}")
+            if not interval:
+                return
+            time.sleep(interval)
+
+    @app.cli.command('reconcile-aggregates')
+    @click.option('--chunk-size', type=int, default=None, help='Customers or drivers per pass.')
+    @click.option('--dry-run', is_flag=True, help='Report drift without repairing it.')
+    @click.option('--interval', type=float, default=None,
+                  help='Repeat every N seconds instead of running once.')
+    def reconcile_aggregates(chunk_size, dry_run, interval):
+        """Recompute customer and driver totals from orders and repair drift."""
+        from .utils.order_changes import reconcile_customers, reconcile_drivers
+        chunk_size = chunk_size or app.config['AGGREGATE_RECONCILE_CHUNK_SIZE']
+        while True:
+            checked, drifted = reconcile_customers(chunk_size, dry_run)
+            click.echo(f"Customers checked={checked} drifted={drifted}")
+            checked, drifted = reconcile_drivers(chunk_size, dry_run)
+            click.echo(f"Drivers checked={checked} drifted={drifted}")
+            if not interval:
+                return
+            time.sleep(interval)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 class BaseConfig:
@@ -9,6 +10,94 @@ class BaseConfig:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=8)  # Extended from 30 minutes to 8 hours
     SECURITY_PASSWORD_SALT = os.getenv("SECURITY_PASSWORD_SALT", "salt")
     SECURE_COOKIES = os.getenv("SECURE_COOKIES", "false").lower() == "true"
+    # Seconds between checks of the revocation counter in each worker
+    REVOCATION_POLL_INTERVAL = float(os.getenv("REVOCATION_POLL_INTERVAL", "2"))
+    PASSWORD_RESET_TTL_MINUTES = int(os.getenv("PASSWORD_RESET_TTL_MINUTES", "60"))
+
+    # Password hashing. Each gunicorn worker owns a pool of HASH_POOL_WORKERS
+    # processes for the requests it serves; 0 hashes inline on the request
+    # thread, as do scripts and CLI commands (see utils/security.py).
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+    HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+    HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+    HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))
+    HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "10"))
+
+    # Fare quotes (see utils/quote_cache.py)
+    QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "10000"))
+    QUOTE_WEIGHT_BUCKET_KG = float(os.getenv("QUOTE_WEIGHT_BUCKET_KG", "0.1"))
+    QUOTE_TOKEN_TTL_SECONDS = int(os.getenv("QUOTE_TOKEN_TTL_SECONDS", "900"))
+
+    # GET /api/customer/orders page sizes
+    ORDER_HISTORY_PAGE_SIZE = int(os.getenv("ORDER_HISTORY_PAGE_SIZE", "50"))
+    ORDER_HISTORY_MAX_PAGE_SIZE = int(os.getenv("ORDER_HISTORY_MAX_PAGE_SIZE", "200"))
+
+    # GET /api/driver/orders/available: pending orders near the driver
+    AVAILABLE_ORDERS_RADIUS_KM = float(os.getenv("AVAILABLE_ORDERS_RADIUS_KM", "10"))
+    AVAILABLE_ORDERS_MAX_RADIUS_KM = float(os.getenv("AVAILABLE_ORDERS_MAX_RADIUS_KM", "50"))
+    AVAILABLE_ORDERS_LIMIT = int(os.getenv("AVAILABLE_ORDERS_LIMIT", "50"))
+    AVAILABLE_ORDERS_MAX_LIMIT = int(os.getenv("AVAILABLE_ORDERS_MAX_LIMIT", "200"))
+
+    # Live order tracking streams (see utils/order_events.py). Each open stream
+    # holds a gunicorn thread, so keep the cap below the worker's --threads.
+    TRACK_STREAM_MAX_CONNECTIONS = int(os.getenv("TRACK_STREAM_MAX_CONNECTIONS", "4"))
+    TRACK_STREAM_HEARTBEAT_SECONDS = float(os.getenv("TRACK_STREAM_HEARTBEAT_SECONDS", "15"))
+    TRACK_STREAM_RESYNC_SECONDS = float(os.getenv("TRACK_STREAM_RESYNC_SECONDS", "30"))
+    TRACK_STREAM_MAX_SECONDS = int(os.getenv("TRACK_STREAM_MAX_SECONDS", "300"))
+    TRACK_STREAM_RESUME_SECONDS = float(os.getenv("TRACK_STREAM_RESUME_SECONDS", "60"))
+    TRACK_STREAM_RETRY_MS = int(os.getenv("TRACK_STREAM_RETRY_MS", "3000"))
+    # Retry-After on the 503 a client gets while the worker is at its stream limit
+    TRACK_STREAM_BUSY_RETRY_SECONDS = int(os.getenv("TRACK_STREAM_BUSY_RETRY_SECONDS", "5"))
+
+    # POST /api/customer/orders/batch limits
+    ORDER_BATCH_MAX_ROWS = int(os.getenv("ORDER_BATCH_MAX_ROWS", "1000"))
+    ORDER_BATCH_CHUNK_SIZE = int(os.getenv("ORDER_BATCH_CHUNK_SIZE", "200"))
+
+    # Driver GPS pings are buffered and written in bulk this often, in seconds
+    # (see utils/locations.py); 0 writes each ping through
+    LOCATION_FLUSH_INTERVAL = float(os.getenv("LOCATION_FLUSH_INTERVAL", "2"))
+
+    # Driver location history (see utils/location_history.py). Each worker
+    # keeps up to LOCATION_HISTORY_RING_SIZE fixes per driver between writes;
+    # `flask location-history-sweep` downsamples and expires old segments.
+    LOCATION_HISTORY_FLUSH_INTERVAL = float(os.getenv("LOCATION_HISTORY_FLUSH_INTERVAL", "30"))
+    LOCATION_HISTORY_RING_SIZE = int(os.getenv("LOCATION_HISTORY_RING_SIZE", "256"))
+    LOCATION_HISTORY_FULL_HOURS = float(os.getenv("LOCATION_HISTORY_FULL_HOURS", "24"))
+    LOCATION_HISTORY_DOWNSAMPLE_SECONDS = int(os.getenv("LOCATION_HISTORY_DOWNSAMPLE_SECONDS", "60"))
+    LOCATION_HISTORY_RETENTION_DAYS = float(os.getenv("LOCATION_HISTORY_RETENTION_DAYS", "90"))
+    LOCATION_HISTORY_SWEEP_CHUNK_SIZE = int(os.getenv("LOCATION_HISTORY_SWEEP_CHUNK_SIZE", "200"))
+    LOCATION_HISTORY_MAX_POINTS = int(os.getenv("LOCATION_HISTORY_MAX_POINTS", "5000"))
+
+    # Batch dispatch, `flask dispatch` (see utils/dispatch.py). The cost matrix
+    # is orders x drivers float64: 10k x 10k needs about 0.9 GB while solving.
+    DISPATCH_MAX_PICKUP_KM = float(os.getenv("DISPATCH_MAX_PICKUP_KM", "15"))
+    DISPATCH_MAX_ORDERS = int(os.getenv("DISPATCH_MAX_ORDERS", "10000"))
+    DISPATCH_MAX_DRIVERS = int(os.getenv("DISPATCH_MAX_DRIVERS", "10000"))
+
+    # Customers/drivers per pass of `flask reconcile-aggregates` (see utils/order_changes.py)
+    AGGREGATE_RECONCILE_CHUNK_SIZE = int(os.getenv("AGGREGATE_RECONCILE_CHUNK_SIZE", "500"))
+
+    # Public id generation (see utils/ids.py). Each process locks one of
+    # ID_WORKER_SLOTS slot files in ID_STATE_DIR; a lost directory is reseeded
+    # from the database. Hosts sharing a database need disjoint ID_WORKER_RANGEs
+    # ("0-7", "8-15"); ID_WORKER_SLOTS is part of the id layout, so keep it fixed.
+    # Each slot owns 10000 / ID_WORKER_SLOTS of a day's order numbers.
+    ID_STATE_DIR = os.getenv("ID_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "instance", "ids"))
+    ID_WORKER_SLOTS = int(os.getenv("ID_WORKER_SLOTS", "16"))
+    ID_WORKER_RANGE = os.getenv("ID_WORKER_RANGE")
+    ID_RESERVE_BLOCK = int(os.getenv("ID_RESERVE_BLOCK", "64"))
+
+    # Material photo uploads (see utils/uploads.py). Photos are stored once per
+    # SHA-256 and served with a year-long immutable Cache-Control.
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "uploads"))
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+    UPLOAD_ALLOWED_TYPES = os.getenv("UPLOAD_ALLOWED_TYPES", "image/jpeg,image/png,image/webp")
+    UPLOAD_THUMBNAIL_SIZE = int(os.getenv("UPLOAD_THUMBNAIL_SIZE", "320"))
+    UPLOAD_CACHE_MAX_AGE = int(os.getenv("UPLOAD_CACHE_MAX_AGE", "31536000"))
+
+    # Admin bulk user import (see utils/bulk_import.py)
+    BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "200"))
+    BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", "100"))
     
     # Email configuration
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
@@ -18,6 +107,39 @@ class BaseConfig:
     MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER")
 
+    # Email outbox delivery (see utils/outbox.py)
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+    OUTBOX_BACKOFF_MAX_SECONDS = int(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+    # Authenticated SMTP sessions kept open between batches (see utils/mail_transport.py)
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+    SMTP_HEALTHCHECK_AFTER = float(os.getenv("SMTP_HEALTHCHECK_AFTER", "30"))
+    SMTP_MAX_SESSION_AGE = float(os.getenv("SMTP_MAX_SESSION_AGE", "300"))
+    # Used to build links in outgoing emails
+    APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:5000")
+
+    # Number of proxies in front of the app that append to X-Forwarded-For
+    # (1 on Render); 0 trusts no forwarded headers. Login throttling and
+    # request logs use the client address this resolves.
+    PROXY_FIX_X_FOR = int(os.getenv("PROXY_FIX_X_FOR", "0"))
+
+    # Login throttling (see utils/rate_limit.py). Limits are "burst/seconds".
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "sqlite:///" + os.path.join(tempfile.gettempdir(), "swiftlogix-ratelimit.db"))
+    LOGIN_RATE_LIMIT_PER_IP = os.getenv("LOGIN_RATE_LIMIT_PER_IP", "20/60")
+    LOGIN_RATE_LIMIT_PER_EMAIL = os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL", "5/300")
+
+    # Request logging (see utils/request_logging.py). LOG_SAMPLE_RATES takes
+    # "endpoint=rate" pairs; errors are always logged regardless of sampling.
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_DEBUG = os.getenv("LOG_DEBUG", "false").lower() == "true"
+    LOG_DEBUG_FLAG_FILE = os.getenv("LOG_DEBUG_FLAG_FILE", os.path.join(tempfile.gettempdir(), "swiftlogix-log-debug"))
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "driver.update_location=0.05,static=0,favicon=0")
+
 class DevelopmentConfig(BaseConfig):
     DEBUG = True
 
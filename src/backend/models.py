@@ -1,7 +1,8 @@
 from datetime import datetime
 from enum import Enum
 from .database import db
-import random
+from .utils.ids import id_service
+from .utils import geo
 
 class UserRole(str, Enum):
     CUSTOMER = "customer"
@@ -19,6 +20,8 @@ class User(db.Model):
     # Add a field to track if user is blacklisted
     is_blacklisted = db.Column(db.Boolean, default=False)
     blacklist_reason = db.Column(db.String(255))
+    # Tokens issued with a lower version are rejected (see utils/revocation.py)
+    token_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     customer_profile = db.relationship('Customer', backref='user', uselist=False)
     driver_profile = db.relationship('Driver', backref='user', uselist=False)
@@ -38,6 +41,11 @@ class Customer(db.Model):
     total_spent = db.Column(db.Float, default=0.0)
     loyalty_points = db.Column(db.Integer, default=0)
     last_order_date = db.Column(db.DateTime)
+    # Delivered orders; kept in step with the other totals (see utils/order_changes.py)
+    completed_orders = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped whenever one of the customer's orders is created or changes;
+    # drives the ETag of the order history (see utils/order_changes.py)
+    orders_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     def __init__(self, **kwargs):
         super(Customer, self).__init__(**kwargs)
@@ -46,21 +54,8 @@ class Customer(db.Model):
             self.customer_id = self.generate_unique_customer_id()
     
     def generate_unique_customer_id(self):
-        # Generate a 9-digit number
-        # We'll use a simpler approach to avoid context issues
-        import time
-        # Use timestamp + random to create a unique ID
-        timestamp_part = int(time.time()) % 100000
-        random_part = random.randint(10000, 99999)
-        candidate = int(f"{timestamp_part:05d}{random_part:05d}")
-        # Ensure it's 9 digits
-        if candidate < 100000000:
-            candidate += 100000000
-        elif candidate > 999999999:
-            candidate = candidate % 1000000000
-            if candidate < 100000000:
-                candidate += 100000000
-        return candidate
+        # 9-digit, k-sortable and unique per worker slot (see utils/ids.py)
+        return id_service.public_id()
 
 class Driver(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +64,9 @@ class Driver(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     current_lat = db.Column(db.Float)
     current_lng = db.Column(db.Float)
+    # When the stored fix was taken, ms since the epoch; older fixes never
+    # overwrite it (see utils/locations.py)
+    location_seq = db.Column(db.BigInteger)
     is_verified = db.Column(db.Boolean, default=False)
     is_available = db.Column(db.Boolean, default=True)
     phone = db.Column(db.String(20))
@@ -87,21 +85,8 @@ class Driver(db.Model):
             self.driver_id = self.generate_unique_driver_id()
     
     def generate_unique_driver_id(self):
-        # Generate a 9-digit number
-        # We'll use a simpler approach to avoid context issues
-        import time
-        # Use timestamp + random to create a unique ID
-        timestamp_part = int(time.time()) % 100000
-        random_part = random.randint(10000, 99999)
-        candidate = int(f"{timestamp_part:05d}{random_part:05d}")
-        # Ensure it's 9 digits
-        if candidate < 100000000:
-            candidate += 100000000
-        elif candidate > 999999999:
-            candidate = candidate % 1000000000
-            if candidate < 100000000:
-                candidate += 100000000
-        return candidate
+        # 9-digit, k-sortable and unique per worker slot (see utils/ids.py)
+        return id_service.public_id()
 
 class OrderStatus(str, Enum):
     PENDING = "pending"
@@ -111,6 +96,10 @@ class OrderStatus(str, Enum):
     DELIVERED = "delivered"
     CANCELLED = "cancelled"
 
+def _pickup_cell_default(context):
+    params = context.get_current_parameters()
+    return geo.pickup_cell(params.get('pickup_lat'), params.get('pickup_lng'))
+
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
@@ -122,6 +111,13 @@ class Order(db.Model):
     drop_address = db.Column(db.String(255))
     drop_lat = db.Column(db.Float)
     drop_lng = db.Column(db.Float)
+    # Geohash of the pickup point (see utils/geo.py); filled in on insert,
+    # including bulk INSERTs that only pass the coordinates
+    pickup_cell = db.Column(db.String(12), default=_pickup_cell_default)
+
+    # ORDyyyymmddNNNN, shown to customers (see utils/ids.py); NULL on
+    # orders created before it was stored
+    public_id = db.Column(db.String(24), unique=True, index=True)
 
     material_type = db.Column(db.String(120))
     weight_kg = db.Column(db.Float, default=0)
@@ -138,10 +134,43 @@ class Order(db.Model):
     status = db.Column(db.String(20), default=OrderStatus.PENDING.value)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # When a driver took the order; bounds the driver's trail shown for it
+    assigned_at = db.Column(db.DateTime)
 
     customer = db.relationship('Customer', backref='orders')
     driver = db.relationship('Driver', backref='orders')
 
+    __table_args__ = (
+        # Keyset pagination of a customer's order history
+        db.Index('ix_order_customer_created', 'customer_id', 'created_at', 'id'),
+        # A driver's orders and deliveries, and the aggregate reconciliation
+        db.Index('ix_order_driver_status', 'driver_id', 'status'),
+        # Driver feed of nearby pending orders; only pending rows are indexed
+        db.Index('ix_order_pending_pickup_cell', 'pickup_cell',
+                 sqlite_where=db.text("status = 'pending'"),
+                 postgresql_where=db.text("status = 'pending'")),
+    )
+
+class LocationTrack(db.Model):
+    # A driver's fixes within one clock hour, packed (see utils/location_history.py).
+    # Rows are appended, and replaced or deleted only by the history sweep.
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    # First and last fix, ms since the epoch
+    start_seq = db.Column(db.BigInteger, nullable=False)
+    end_seq = db.Column(db.BigInteger, nullable=False)
+    # 0: every fix received; otherwise at most one fix per this many seconds
+    resolution = db.Column(db.Integer, default=0, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    points = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        # A driver's trail over a time range
+        db.Index('ix_location_track_driver_start', 'driver_id', 'start_seq'),
+        # Downsampling and retention sweeps
+        db.Index('ix_location_track_resolution_start', 'resolution', 'start_seq'),
+    )
+
 class PaymentStatus(str, Enum):
     INITIATED = "initiated"
     PAID = "paid"
@@ -155,4 +184,48 @@ class Payment(db.Model):
     status = db.Column(db.String(20), default=PaymentStatus.INITIATED.value)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    order = db.relationship('Order', backref='payment')
\ No newline at end of file
+    order = db.relationship('Order', backref='payment')
+
+class RevocationCounter(db.Model):
+    # Single row bumped on every revocation so workers can poll one cheap value
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, default=0, nullable=False)
+
+class PasswordResetToken(db.Model):
+    # SHA-256 of the emailed token; the raw token is never stored
+    token_hash = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+class EmailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255))
+    # Recipient lists are stored as JSON arrays
+    recipients = db.Column(db.Text, nullable=False)
+    cc = db.Column(db.Text)
+    bcc = db.Column(db.Text)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+
+    status = db.Column(db.String(20), default=OutboxStatus.PENDING.value, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Set while a worker holds the row so other workers skip it
+    claimed_by = db.Column(db.String(32))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
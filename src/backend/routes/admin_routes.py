@@ -1,9 +1,18 @@
 import csv
 import io
-from flask import Blueprint, jsonify, send_file, request
+from flask import Blueprint, jsonify, send_file, request, current_app
 from ..database import db
 from ..models import User, UserRole, Order, OrderStatus, Customer, Driver
 from ..utils.security import role_required
+from ..utils.request_logging import debug_switch
+from ..utils.rate_limit import limiter
+from ..utils.quote_cache import quote_cache
+from ..utils.order_events import order_events
+from ..utils.locations import location_buffer, now_seq
+from ..utils.location_history import HOUR_MS, driver_track, order_window
+from ..utils.revocation import revoke_user_tokens
+from ..utils.bulk_import import detect_format, import_users
+from ..utils.email_utils import send_bulk_import_summary
 from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
@@ -32,15 +41,33 @@ def dashboard():
         print(f"Error in admin dashboard: {str(e)}")
         return jsonify({"message": "Internal server error"}), 500
 
+def _customer_totals(customer):
+    # Cancelled orders are not counted in total_orders / total_spent
+    return {
+        "total_orders": customer.total_orders or 0,
+        "total_spent": round(customer.total_spent or 0, 2),
+        "completed_orders": customer.completed_orders or 0,
+    }
+
+def _driver_totals(driver):
+    return {
+        "total_deliveries": driver.total_deliveries or 0,
+        "total_earnings": round(driver.total_earnings or 0, 2),
+    }
+
 @admin_bp.get('/users')
 @role_required('admin')
 def get_all_users():
     try:
-        # Get all users with their roles
-        users = User.query.all()
+        # One query for every user and their profile; the totals are the
+        # stored aggregates (see utils/order_changes.py), not order scans
+        rows = (db.session.query(User, Customer, Driver)
+                .outerjoin(Customer, Customer.user_id == User.id)
+                .outerjoin(Driver, Driver.user_id == User.id)
+                .order_by(User.id).all())
         
         user_data = []
-        for user in users:
+        for user, customer, driver in rows:
             user_info = {
                 "id": user.id,
                 "name": user.name,
@@ -53,27 +80,16 @@ def get_all_users():
             }
             
             # Add role-specific information
-            if user.role == UserRole.CUSTOMER.value:
-                customer = Customer.query.filter_by(user_id=user.id).first()
-                if customer:
-                    user_info["customer_id"] = customer.customer_id  # Use 9-digit ID
-                    # Get customer orders count and total spent
-                    orders = Order.query.filter_by(customer_id=customer.id).all()
-                    user_info["total_orders"] = len(orders)
-                    user_info["total_spent"] = sum(order.fare_total for order in orders)
-                    user_info["completed_orders"] = len([order for order in orders if order.status == OrderStatus.DELIVERED.value])
-            elif user.role == UserRole.DRIVER.value:
-                driver = Driver.query.filter_by(user_id=user.id).first()
-                if driver:
-                    user_info["driver_id"] = driver.driver_id  # Use 9-digit ID
-                    user_info["is_verified"] = driver.is_verified
-                    user_info["is_available"] = driver.is_available
-                    user_info["current_lat"] = driver.current_lat
-                    user_info["current_lng"] = driver.current_lng
-                    # Get driver orders count and earnings
-                    orders = Order.query.filter_by(driver_id=driver.id).all()
-                    user_info["total_deliveries"] = len([order for order in orders if order.status == OrderStatus.DELIVERED.value])
-                    user_info["total_earnings"] = sum(order.driver_share for order in orders if order.status == OrderStatus.DELIVERED.value)
+            if user.role == UserRole.CUSTOMER.value and customer:
+                user_info["customer_id"] = customer.customer_id  # Use 9-digit ID
+                user_info.update(_customer_totals(customer))
+            elif user.role == UserRole.DRIVER.value and driver:
+                user_info["driver_id"] = driver.driver_id  # Use 9-digit ID
+                user_info["is_verified"] = driver.is_verified
+                user_info["is_available"] = driver.is_available
+                user_info["current_lat"], user_info["current_lng"] = location_buffer.position(
+                    driver.id, driver.current_lat, driver.current_lng, driver.location_seq)
+                user_info.update(_driver_totals(driver))
             
             user_data.append(user_info)
         
@@ -115,17 +131,15 @@ def get_user_details(user_id):
                     "fare_total": order.fare_total,
                     "created_at": order.created_at.isoformat() if order.created_at else None
                 } for order in orders]
-                user_info["total_orders"] = len(orders)
-                user_info["total_spent"] = sum(order.fare_total for order in orders)
-                user_info["completed_orders"] = len([order for order in orders if order.status == OrderStatus.DELIVERED.value])
+                user_info.update(_customer_totals(customer))
         elif user.role == UserRole.DRIVER.value:
             driver = Driver.query.filter_by(user_id=user.id).first()
             if driver:
                 user_info["driver_id"] = driver.driver_id  # Use 9-digit ID
                 user_info["is_verified"] = driver.is_verified
                 user_info["is_available"] = driver.is_available
-                user_info["current_lat"] = driver.current_lat
-                user_info["current_lng"] = driver.current_lng
+                user_info["current_lat"], user_info["current_lng"] = location_buffer.position(
+                    driver.id, driver.current_lat, driver.current_lng, driver.location_seq)
                 # Get all driver orders with details
                 orders = Order.query.filter_by(driver_id=driver.id).all()
                 user_info["orders"] = [{
@@ -137,8 +151,7 @@ def get_user_details(user_id):
                     "driver_share": order.driver_share,
                     "created_at": order.created_at.isoformat() if order.created_at else None
                 } for order in orders]
-                user_info["total_deliveries"] = len([order for order in orders if order.status == OrderStatus.DELIVERED.value])
-                user_info["total_earnings"] = sum(order.driver_share for order in orders if order.status == OrderStatus.DELIVERED.value)
+                user_info.update(_driver_totals(driver))
         
         return jsonify(user_info)
     except Exception as e:
@@ -164,6 +177,8 @@ def blacklist_user(user_id):
         user.blacklist_reason = reason
         # Also deactivate the user
         user.is_active = False
+        # Existing tokens stop working within REVOCATION_POLL_INTERVAL
+        revoke_user_tokens(user.id)
         
         db.session.commit()
         
@@ -211,6 +226,37 @@ def unblock_user(user_id):
     # Alias for unblacklist_user
     return unblacklist_user(user_id)
 
+@admin_bp.post('/users/import')
+@role_required('admin', inject_principal=True)
+def import_users_route(principal):
+    """
+    Bulk-create customers/drivers from a CSV or NDJSON upload, sent either as
+    a multipart ``file`` field or as the raw request body. ``?role=driver``
+    fills in rows that have no role column.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, filename, mimetype = upload.stream, upload.filename, upload.mimetype
+    else:
+        stream, filename, mimetype = request.stream, None, request.mimetype
+    fmt = request.args.get('format') or detect_format(filename, mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"message": "Upload a .csv or .ndjson file"}), 400
+
+    default_role = request.args.get('role')
+    try:
+        result = import_users(stream, fmt, default_role=default_role)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({"message": "File must be UTF-8 encoded"}), 400
+    except csv.Error as e:
+        db.session.rollback()
+        return jsonify({"message": f"Malformed CSV: {e}"}), 400
+
+    if result.total_created or result.failed:
+        send_bulk_import_summary(result, admin_email=principal.user.email, source=filename)
+    return jsonify(result.to_dict()), 201 if result.total_created else 200
+
 @admin_bp.get('/orders/export')
 @role_required('admin')
 def export_orders():
@@ -226,4 +272,82 @@ def export_orders():
         return send_file(mem, mimetype='text/csv', as_attachment=True, download_name='orders.csv')
     except Exception as e:
         print(f"Error in export_orders: {str(e)}")
-        return jsonify({"message": "Internal server error"}), 500
\ No newline at end of file
+        return jsonify({"message": "Internal server error"}), 500
+
+@admin_bp.get('/logging')
+@role_required('admin')
+def get_logging():
+    return jsonify({"debug": debug_switch.is_enabled()})
+
+@admin_bp.put('/logging')
+@role_required('admin')
+def set_logging():
+    data = request.get_json() or {}
+    if not isinstance(data.get('debug'), bool):
+        return jsonify({"message": "'debug' must be true or false"}), 400
+    debug_switch.set(data['debug'])
+    return jsonify({"debug": debug_switch.is_enabled()})
+
+@admin_bp.get('/rate-limits')
+@role_required('admin')
+def rate_limit_counters():
+    # e.g. {"login.ip.allowed": 120, "login.ip.rejected": 4, ...}
+    return jsonify(limiter.counters())
+
+@admin_bp.get('/quote-cache')
+@role_required('admin')
+def quote_cache_stats():
+    # Per worker process: {"size", "hits", "misses", "evictions", "hit_rate"}
+    return jsonify(quote_cache.stats())
+
+@admin_bp.get('/tracking-streams')
+@role_required('admin')
+def tracking_stream_stats():
+    # Per worker process: {"streams", "topics", "idle_topics", "watched_drivers", "published"}
+    return jsonify(order_events.stats())
+
+@admin_bp.get('/location-buffer')
+@role_required('admin')
+def location_buffer_stats():
+    # Per worker process: {"buffered", "accepted", "dropped", "flushed", "flushes",
+    # "trail_fixes", "trail_overwritten", "history_segments"}
+    return jsonify(location_buffer.stats())
+
+def _track_range():
+    """``(since, until, step_ms)`` from ``?from=&to=`` (ms since the epoch, default the last day) and ``?step=`` seconds."""
+    until = int(request.args.get('to', now_seq()))
+    since = int(request.args.get('from', until - 24 * HOUR_MS))
+    return since, until, max(int(request.args.get('step', 0)), 0) * 1000
+
+@admin_bp.get('/users/<int:user_id>/locations')
+@role_required('admin')
+def driver_locations(user_id):
+    """A driver's location history, ``[[ms, lat, lng], ...]`` oldest first."""
+    try:
+        since, until, step_ms = _track_range()
+    except ValueError:
+        return jsonify({"message": "from, to and step must be numbers"}), 400
+    driver_id = db.session.query(Driver.id).filter_by(user_id=user_id).scalar()
+    if driver_id is None:
+        return jsonify({"message": "Driver not found"}), 404
+    points = driver_track(driver_id, since, until, step_ms, current_app.config.get('LOCATION_HISTORY_MAX_POINTS', 5000))
+    return jsonify({"driver_id": driver_id, "from": since, "to": until, "points": [list(point) for point in points]})
+
+@admin_bp.get('/orders/<int:order_id>/locations')
+@role_required('admin')
+def order_locations(order_id):
+    """The assigned driver's trail from assignment until delivery or cancellation (or now)."""
+    try:
+        step_ms = max(int(request.args.get('step', 0)), 0) * 1000
+    except ValueError:
+        return jsonify({"message": "step must be a number of seconds"}), 400
+    order = (db.session.query(Order.driver_id, Order.status, Order.assigned_at, Order.created_at, Order.updated_at)
+             .filter(Order.id == order_id).first())
+    if order is None:
+        return jsonify({"message": "Order not found"}), 404
+    if order.driver_id is None:
+        return jsonify({"status": order.status, "driver_id": None, "points": []})
+    since, until = order_window(order.status, order.assigned_at, order.created_at, order.updated_at)
+    points = driver_track(order.driver_id, since, until, step_ms, current_app.config.get('LOCATION_HISTORY_MAX_POINTS', 5000))
+    return jsonify({"status": order.status, "driver_id": order.driver_id, "from": since, "to": until,
+                    "points": [list(point) for point in points]})
@@ -1,28 +1,36 @@
 from flask import Blueprint, request, jsonify, current_app, render_template
 from ..database import db
 from ..models import User, UserRole, Customer, Driver
-from ..utils.security import hash_password, check_password, make_access_token
-from ..utils.validators import require_fields
+from ..utils.security import hash_password, check_password, needs_rehash, make_access_token, too_many_requests
+from ..utils.rate_limit import check_login_rate, login_succeeded
+from ..utils.validators import require_fields, validate_registration, CUSTOMER_PROFILE_FIELDS, DRIVER_PROFILE_FIELDS
 from ..utils.email_utils import send_new_user_notification, send_password_reset_email, send_password_reset_confirmation
-import secrets
-import string
-from datetime import datetime, timedelta
+from ..utils.reset_tokens import issue_reset_token, find_reset_token, consume_reset_token
+from sqlalchemy.orm import joinedload
+from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
 
-# In-memory storage for reset tokens (in production, use database)
-reset_tokens = {}
+
+def _auth_payload(user, profile):
+    """Token and user JSON for a freshly authenticated user, without extra queries."""
+    identity = {"id": user.id, "role": user.role, "token_version": user.token_version}
+    user_data = {"id": user.id, "name": user.name, "email": user.email, "role": user.role}
+    if profile is not None:
+        # Add 9-digit IDs to user data and embed both ids in the token
+        public_id = profile.customer_id if user.role == UserRole.CUSTOMER.value else profile.driver_id
+        identity["profile_id"] = profile.id
+        identity["public_id"] = public_id
+        user_data[f"{user.role}_id"] = public_id
+    return make_access_token(identity), user_data
 
 @auth_bp.post('/register')
 def register():
     data = request.get_json() or {}
-    ok, err = require_fields(data, ["name","email","password","role"])
+    ok, err = validate_registration(data)
     if not ok:
         return jsonify({"message": err}), 400
-
     role = data["role"].lower()
-    if role not in [r.value for r in UserRole]:
-        return jsonify({"message": "Invalid role"}), 400
 
     if User.query.filter_by(email=data["email"]).first():
         return jsonify({"message": "Email already registered"}), 409
@@ -35,35 +43,25 @@ def register():
     db.session.add(user)
     db.session.flush()
 
+    profile = None
     if role == UserRole.CUSTOMER.value:
-        customer = Customer()
-        customer.user_id = user.id
-        # Add additional customer fields if provided
-        if "phone" in data:
-            customer.phone = data["phone"]
-        if "address" in data:
-            customer.address = data["address"]
-        if "city" in data:
-            customer.city = data["city"]
-        if "state" in data:
-            customer.state = data["state"]
-        if "zip_code" in data:
-            customer.zip_code = data["zip_code"]
-        db.session.add(customer)
+        profile = Customer()
+        fields = CUSTOMER_PROFILE_FIELDS
     elif role == UserRole.DRIVER.value:
-        driver = Driver()
-        driver.user_id = user.id
-        # Add additional driver fields if provided
-        if "phone" in data:
-            driver.phone = data["phone"]
-        if "license_number" in data:
-            driver.license_number = data["license_number"]
-        if "vehicle_type" in data:
-            driver.vehicle_type = data["vehicle_type"]
-        if "vehicle_number" in data:
-            driver.vehicle_number = data["vehicle_number"]
-        db.session.add(driver)
+        profile = Driver()
+        fields = DRIVER_PROFILE_FIELDS
+    if profile is not None:
+        profile.user_id = user.id
+        # Add additional profile fields if provided
+        for field in fields:
+            if field in data:
+                setattr(profile, field, data[field])
+        db.session.add(profile)
 
+    # Flush so profile ids exist, then build the response before commit
+    # expires the objects
+    db.session.flush()
+    token, user_data = _auth_payload(user, profile)
     db.session.commit()
     
     # Send email notification to admin
@@ -73,49 +71,44 @@ def register():
         # Log error but don't fail the registration
         current_app.logger.error(f"Failed to send notification email: {str(e)}")
 
-    token = make_access_token({"id": user.id, "role": user.role})
-    user_data = {"id": user.id, "name": user.name, "email": user.email, "role": user.role}
-    
-    # Add 9-digit IDs to user data
-    if role == UserRole.CUSTOMER.value:
-        customer_profile = Customer.query.filter_by(user_id=user.id).first()
-        if customer_profile:
-            user_data["customer_id"] = customer_profile.customer_id
-    elif role == UserRole.DRIVER.value:
-        driver_profile = Driver.query.filter_by(user_id=user.id).first()
-        if driver_profile:
-            user_data["driver_id"] = driver_profile.driver_id
-    
     return jsonify({"token": token, "user": user_data}), 201
 
 @auth_bp.post('/login')
 def login():
     data = request.get_json() or {}
+    # Shed credential-stuffing traffic before any DB or bcrypt work
+    retry_after = check_login_rate(request.remote_addr, data.get("email"))
+    if retry_after:
+        return too_many_requests("Too many login attempts. Please try again later.", retry_after)
+
     ok, err = require_fields(data, ["email","password"])
     if not ok:
         return jsonify({"message": err}), 400
 
-    user = User.query.filter_by(email=data["email"]).first()
+    # Both profiles are joined so the token can carry the profile ids
+    user = (User.query
+            .options(joinedload(User.customer_profile), joinedload(User.driver_profile))
+            .filter_by(email=data["email"]).first())
     if not user or not check_password(data["password"], user.password_hash):
         return jsonify({"message": "Invalid credentials"}), 401
+    login_succeeded(data["email"])
     if not user.is_active:
         return jsonify({"message": "User blocked"}), 403
     # Check if user is blacklisted
     if user.is_blacklisted:
         return jsonify({"message": "User is blacklisted"}), 403
 
-    token = make_access_token({"id": user.id, "role": user.role})
-    user_data = {"id": user.id, "name": user.name, "email": user.email, "role": user.role}
-    
-    # Add 9-digit IDs to user data
+    profile = None
     if user.role == UserRole.CUSTOMER.value:
-        customer_profile = Customer.query.filter_by(user_id=user.id).first()
-        if customer_profile:
-            user_data["customer_id"] = customer_profile.customer_id
+        profile = user.customer_profile
     elif user.role == UserRole.DRIVER.value:
-        driver_profile = Driver.query.filter_by(user_id=user.id).first()
-        if driver_profile:
-            user_data["driver_id"] = driver_profile.driver_id
+        profile = user.driver_profile
+    token, user_data = _auth_payload(user, profile)
+
+    # Upgrade hashes made with an old cost factor while we have the plaintext
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(data["password"])
+        db.session.commit()
     
     return jsonify({"token": token, "user": user_data})
 
@@ -137,18 +130,12 @@ def forgot_password():
         return jsonify({"message": "User is blacklisted"}), 403
     
     try:
-        # Generate reset token
-        reset_token = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
-        # Store token with expiration (1 hour)
-        reset_tokens[reset_token] = {
-            'email': email,
-            'expires_at': datetime.utcnow() + timedelta(hours=1)
-        }
-        
-        # Send password reset email with our token
+        # Store the token; queuing the email commits both together
+        reset_token = issue_reset_token(user)
         send_password_reset_email(user, reset_token)
         return jsonify({"message": "If the email exists, a reset link has been sent"}), 200
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Failed to send password reset email: {str(e)}")
         return jsonify({"message": "Failed to send reset link. Please try again later."}), 500
 
@@ -163,16 +150,14 @@ def reset_password():
         return jsonify({"message": "Token, email, and password are required"}), 400
     
     # Validate token
-    if token not in reset_tokens:
+    token_data = find_reset_token(token)
+    if token_data is None:
         return jsonify({"message": "Invalid or expired reset token"}), 400
     
-    token_data = reset_tokens[token]
-    if token_data['email'] != email:
+    if token_data.email != email:
         return jsonify({"message": "Invalid reset token"}), 400
     
-    if token_data['expires_at'] < datetime.utcnow():
-        # Remove expired token
-        del reset_tokens[token]
+    if token_data.expires_at < datetime.utcnow():
         return jsonify({"message": "Reset token has expired"}), 400
     
     user = User.query.filter_by(email=email).first()
@@ -183,13 +168,17 @@ def reset_password():
     if user.is_blacklisted:
         return jsonify({"message": "User is blacklisted"}), 403
     
+    # Hash outside the try block so a full hashing queue surfaces as a 429
+    password_hash = hash_password(password)
     try:
-        user.password_hash = hash_password(password)
+        # Consume the token in the same transaction as the password change;
+        # losing a race with a concurrent reset leaves the password untouched
+        if not consume_reset_token(token, email):
+            db.session.rollback()
+            return jsonify({"message": "Invalid or expired reset token"}), 400
+        user.password_hash = password_hash
         db.session.commit()
         
-        # Remove used token
-        del reset_tokens[token]
-        
         # Send confirmation email to both user and admin
         try:
             send_password_reset_confirmation(user)
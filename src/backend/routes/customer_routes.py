@@ -1,393 +1,607 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from ..database import db
-from ..models import User, Customer, Driver, Order, OrderStatus, Payment
+from ..models import Customer, Driver, Order, OrderStatus
 from ..utils.security import role_required
-from ..utils.validators import require_fields, validate_lat_lng
-from ..utils.pricing import haversine_km, compute_fare
-from flask_mail import Message
-import logging
+from ..utils.email_utils import send_support_chat
+from ..utils.validators import (parse_order, parse_route, CUSTOMER_PROFILE_SCHEMA,
+                                SIMPLE_ORDER_SCHEMA, SIMPLE_ROUTE_SCHEMA)
+from ..utils.pricing import price_routes
+from ..utils.quote_cache import quote_cache, quote_to_dict
+from ..utils.quote_tokens import sign_quote, verify_quote
+from ..utils.order_changes import orders_version, orders_placed
+from ..utils.order_events import order_events, STATUS
+from ..utils.locations import location_buffer
+from ..utils.location_history import driver_track, order_window
+from ..utils.ids import id_service
+from ..utils.bulk_import import iter_rows, NDJSON_TYPES
+from ..utils.uploads import UploadRejected, store_photo, streams_uploads, thumbnail_url
+from sqlalchemy import insert
 from datetime import datetime
-import random
-import string
+import base64
+import hashlib
+import json
+import time
 
 customer_bp = Blueprint('customer', __name__)
 
+
+def _place_order(order, customer_id):
+    """
+    Insert the order and bump the customer's counters in one transaction.
+    The counters are incremented in SQL so concurrent orders do not lose
+    updates, and the new id is read before commit expires the object.
+    """
+    # last_order_date is the newest order's created_at
+    order.created_at = datetime.utcnow()
+    db.session.add(order)
+    db.session.flush()
+    Customer.query.filter_by(id=customer_id).update(
+        orders_placed(1, order.fare_total, order.created_at), synchronize_session=False)
+    order_id = order.id
+    db.session.commit()
+    return order_id
+
+
+INVALID_QUOTE_MESSAGE = "Quote is invalid or has expired, please request a new quote"
+
+
+def _quote_route(quote):
+    return {"pickup_lat": quote.pickup_lat, "pickup_lng": quote.pickup_lng,
+            "drop_lat": quote.drop_lat, "drop_lng": quote.drop_lng, "weight_kg": quote.weight_kg}
+
+
+def _order_values(parsed, customer_id, distance_km, total, driver_share, commission):
+    """Column values for a new pending order from a ``parse_order`` result."""
+    return {
+        "customer_id": customer_id,
+        "pickup_address": parsed["pickup_address"],
+        "pickup_lat": parsed["pickup_lat"],
+        "pickup_lng": parsed["pickup_lng"],
+        "drop_address": parsed["drop_address"],
+        "drop_lat": parsed["drop_lat"],
+        "drop_lng": parsed["drop_lng"],
+        "material_type": parsed["material_type"],
+        "material_description": parsed["material_description"],
+        "weight_kg": parsed["weight_kg"],
+        "distance_km": distance_km,
+        "fare_total": total,
+        "driver_share": driver_share,
+        "company_commission": commission,
+        "status": OrderStatus.PENDING.value,
+    }
+
+
+def _place_order_chunk(rows, customer_id):
+    """
+    Insert a chunk of order rows with one multi-row INSERT and bump the
+    customer's counters once, in a single transaction. Rows must carry
+    their ``public_id``. Returns the new ids in input order.
+    """
+    now = datetime.utcnow()
+    for row in rows:
+        row["created_at"] = now
+    if db.session.get_bind().dialect.insert_returning:
+        # RETURNING rows need not follow VALUES order; match them on public_id
+        returned = dict(db.session.execute(insert(Order).returning(Order.public_id, Order.id), rows).all())
+        ids = [returned[row["public_id"]] for row in rows]
+    else:
+        # No RETURNING (MySQL): one INSERT per row, each reporting its own id
+        ids = [db.session.execute(Order.__table__.insert(), row).inserted_primary_key[0] for row in rows]
+    Customer.query.filter_by(id=customer_id).update(
+        orders_placed(len(rows), sum(row["fare_total"] for row in rows), now), synchronize_session=False)
+    db.session.commit()
+    return ids
+
+
+def _read_batch_rows(max_rows):
+    """Order payloads from a JSON array body or an NDJSON stream, or an error tuple."""
+    if request.mimetype in NDJSON_TYPES:
+        rows = []
+        for _, row in iter_rows(request.stream, 'ndjson'):
+            if len(rows) >= max_rows:
+                return None, (f"At most {max_rows} orders per batch", 413)
+            rows.append(row)
+        return rows, None
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return None, ("Send a JSON array of orders or an NDJSON stream", 400)
+    if len(data) > max_rows:
+        return None, (f"At most {max_rows} orders per batch", 413)
+    return data, None
+
 # Add chatbot endpoint
 @customer_bp.post('/chat')
-@role_required('customer')
-def customer_chat():
+@role_required('customer', inject_principal=True)
+def customer_chat(principal):
     data = request.get_json() or {}
     message = data.get('message')
     
     if not message:
         return jsonify({"message": "Message is required"}), 400
     
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = principal.user
     
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-    
-    # Send message to admin email
+    # Queue message for the admin mailbox
     try:
-        mail = current_app.extensions['mail']
-        msg = Message(
-            subject=f"Customer Support Chat - {user.email}",
-            recipients=['swiftlogixindia@gmail.com'],
-            body=f"""
-Customer: {user.name} ({user.email})
-Message: {message}
-
-This message was sent from the customer support chatbot.
-            """
-        )
-        mail.send(msg)
-        logging.info(f"Chat message sent from customer {user.email}")
+        send_support_chat(user, 'customer', message)
     except Exception as e:
-        current_app.logger.error(f"Failed to send chat message email: {str(e)}")
+        current_app.logger.error(f"Failed to queue chat message email: {str(e)}")
     
     return jsonify({"message": "Message sent successfully"}), 200
 
+@customer_bp.route('/quote', methods=['GET', 'POST'])
+@role_required('customer', inject_principal=True, claims_only=True)
+def quote(principal):
+    # GET takes query parameters, POST a JSON body; both need the route and weight
+    data = request.args.to_dict() if request.method == 'GET' else (request.get_json(silent=True) or {})
+    route, err = parse_route(data)
+    if err:
+        return jsonify({"message": err}), 400
+    result, cached = quote_cache.get_quote(route['pickup_lat'], route['pickup_lng'],
+                                           route['drop_lat'], route['drop_lng'], route['weight_kg'])
+    response = quote_to_dict(result, cached)
+    # Send this back when ordering to be charged exactly this fare
+    try:
+        response["quote_token"] = sign_quote(result, route['pickup_lat'], route['pickup_lng'],
+                                             route['drop_lat'], route['drop_lng'], route['weight_kg'],
+                                             principal.profile_id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    response["expires_in"] = current_app.config.get('QUOTE_TOKEN_TTL_SECONDS', 900)
+    return jsonify(response)
+
 @customer_bp.post('/orders')
-@role_required('customer')
-def create_order():
+@role_required('customer', inject_principal=True, claims_only=True)
+@streams_uploads
+def create_order(principal):
     try:
-        # Handle both JSON and form data for file uploads
-        material_photo_url = None
-        material_description = None
-        
-        # Check if request contains file data
+        # Multipart form (with an optional photo) or JSON; the schemas
+        # read either
         if request.form:
-            # Get data from form
-            data = {
-                "pickup_lat": request.form.get("pickup_lat"),
-                "pickup_lng": request.form.get("pickup_lng"),
-                "drop_lat": request.form.get("drop_lat"),
-                "drop_lng": request.form.get("drop_lng"),
-                "pickup_address": request.form.get("pickup_address"),
-                "drop_address": request.form.get("drop_address"),
-                "material_type": request.form.get("material_type"),
-                "weight_kg": request.form.get("weight_kg"),
-                "material_description": request.form.get("material_description")
-            }
-            
-            # Handle photo upload (in a real app, you would save the file)
-            # For now, we'll just store a placeholder URL
-            if 'material_photo' in request.files:
-                material_photo = request.files['material_photo']
-                if material_photo.filename != '':
-                    # In a real implementation, you would save the file and generate a URL
-                    # For now, we'll just store the filename as a placeholder
-                    material_photo_url = f"/uploads/{material_photo.filename}"
+            data = request.form
+            # Already streamed to disk and checked while the form was parsed
+            material_photo = request.files.get('material_photo')
         else:
-            # Handle JSON data
-            data = request.get_json() or {}
-        
-        required = [
-            "pickup_lat","pickup_lng","drop_lat","drop_lng",
-            "pickup_address","drop_address","material_type","weight_kg"
-        ]
-        ok, err = require_fields(data, required)
-        if not ok:
-            return jsonify({"message": err}), 400
-
-        # Validate coordinates
-        try:
-            # Check if all required fields are present and not None
-            for field in required:
-                if data.get(field) is None or data.get(field) == '':
-                    return jsonify({"message": f"Missing required field: {field}"}), 400
-                    
-            # Convert to float with proper validation
-            pickup_lat_str = data['pickup_lat']
-            pickup_lng_str = data['pickup_lng']
-            drop_lat_str = data['drop_lat']
-            drop_lng_str = data['drop_lng']
-            weight_kg_str = data['weight_kg']
-            
-            # Ensure they are strings before converting
-            if not isinstance(pickup_lat_str, (str, int, float)):
-                return jsonify({"message": "Invalid pickup_lat value"}), 400
-            if not isinstance(pickup_lng_str, (str, int, float)):
-                return jsonify({"message": "Invalid pickup_lng value"}), 400
-            if not isinstance(drop_lat_str, (str, int, float)):
-                return jsonify({"message": "Invalid drop_lat value"}), 400
-            if not isinstance(drop_lng_str, (str, int, float)):
-                return jsonify({"message": "Invalid drop_lng value"}), 400
-            if not isinstance(weight_kg_str, (str, int, float)):
-                return jsonify({"message": "Invalid weight_kg value"}), 400
-                
-            pickup_lat = float(pickup_lat_str)
-            pickup_lng = float(pickup_lng_str)
-            drop_lat = float(drop_lat_str)
-            drop_lng = float(drop_lng_str)
-            weight_kg = float(weight_kg_str)
-        except (ValueError, TypeError) as e:
-            return jsonify({"message": f"Invalid numeric values provided: {str(e)}"}), 400
-
-        if not (validate_lat_lng(pickup_lat, pickup_lng) and validate_lat_lng(drop_lat, drop_lng)):
-            return jsonify({"message": "Invalid coordinates"}), 400
-
-        # Get user ID from JWT identity (now a string)
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({"message": "User not found"}), 404
-            
-        customer = user.customer_profile
+            data = request.get_json(silent=True)
+            material_photo = None
         
-        if not customer:
-            return jsonify({"message": "Customer profile not found"}), 404
+        quote_token = data.get('quote_token') if isinstance(data, dict) else None
+        if quote_token:
+            # A signed quote already carries a validated route and its price
+            quote = verify_quote(quote_token, principal.profile_id)
+            if quote is None:
+                return jsonify({"message": INVALID_QUOTE_MESSAGE}), 400
+            parsed, err = parse_order(data, route=_quote_route(quote))
+            if err:
+                return jsonify({"message": err}), 400
+        else:
+            parsed, err = parse_order(data)
+            if err:
+                return jsonify({"message": err}), 400
 
-        distance = haversine_km(pickup_lat, pickup_lng, drop_lat, drop_lng)
-        total, driver_share, commission = compute_fare(distance, weight_kg)
+            # Same cached quote the customer was shown on /quote
+            quote, _ = quote_cache.get_quote(parsed['pickup_lat'], parsed['pickup_lng'],
+                                             parsed['drop_lat'], parsed['drop_lng'], parsed['weight_kg'])
 
         # Create the order object
-        order = Order()
-        order.customer_id = customer.id
-        order.pickup_address = data['pickup_address']
-        order.pickup_lat = pickup_lat
-        order.pickup_lng = pickup_lng
-        order.drop_address = data['drop_address']
-        order.drop_lat = drop_lat
-        order.drop_lng = drop_lng
-        order.material_type = data['material_type']
-        order.weight_kg = weight_kg
-        order.distance_km = round(distance, 2)
-        order.fare_total = total
-        order.driver_share = driver_share
-        order.company_commission = commission
-        order.status = OrderStatus.PENDING.value
-        order.material_photo_url = material_photo_url
-        order.material_description = data.get('material_description')
-        
-        db.session.add(order)
-        db.session.commit()
+        order = Order(**_order_values(parsed, principal.profile_id, quote.distance_km,
+                                      quote.fare_total, quote.driver_share, quote.company_commission))
+        order.public_id = id_service.order_id()
+        order.material_photo_url = store_photo(material_photo)
 
-        # Update customer stats
-        customer.total_orders += 1
-        customer.total_spent += total
-        customer.last_order_date = datetime.utcnow()
-        db.session.commit()
+        order_id = _place_order(order, principal.profile_id)
 
-        return jsonify({"order_id": order.id, "fare_total": total, "distance_km": round(distance,2) }), 201
+        return jsonify({"order_id": order_id, "public_id": order.public_id,
+                        "fare_total": quote.fare_total, "distance_km": quote.distance_km}), 201
         
+    except UploadRejected:
+        raise
     except Exception as e:
+        db.session.rollback()
         # Log the error for debugging
         current_app.logger.error(f"Error creating order: {str(e)}")
         return jsonify({"message": f"Error creating order: {str(e)}"}), 500
 
+@customer_bp.post('/orders/batch')
+@role_required('customer', inject_principal=True, claims_only=True)
+def create_order_batch(principal):
+    """
+    Create many orders in one request. Every row is validated and priced,
+    valid rows are inserted in chunks, and the response carries one result
+    per input row; invalid rows are reported without failing the batch.
+    """
+    config = current_app.config
+    rows, err = _read_batch_rows(config.get('ORDER_BATCH_MAX_ROWS', 1000))
+    if err:
+        return jsonify({"message": err[0]}), err[1]
+
+    results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        parsed, err = parse_order(row) if row is not None else (None, "Invalid JSON object")
+        if err:
+            results[index] = {"index": index, "error": err}
+        else:
+            valid.append((index, parsed))
+
+    # Price the whole batch in one call
+    distances, totals, driver_shares, commissions = price_routes(
+        [p['pickup_lat'] for _, p in valid], [p['pickup_lng'] for _, p in valid],
+        [p['drop_lat'] for _, p in valid], [p['drop_lng'] for _, p in valid],
+        [p['weight_kg'] for _, p in valid])
+
+    chunk_size = config.get('ORDER_BATCH_CHUNK_SIZE', 200)
+    for start in range(0, len(valid), chunk_size):
+        chunk = range(start, min(start + chunk_size, len(valid)))
+        values = [_order_values(valid[i][1], principal.profile_id, distances[i],
+                                totals[i], driver_shares[i], commissions[i]) for i in chunk]
+        try:
+            for row, public_id in zip(values, id_service.order_ids(len(values))):
+                row["public_id"] = public_id
+            ids = _place_order_chunk(values, principal.profile_id)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error creating order batch chunk: {str(e)}")
+            for i in chunk:
+                results[valid[i][0]] = {"index": valid[i][0], "error": "Could not save order, please retry"}
+            continue
+        for i, row, order_id in zip(chunk, values, ids):
+            results[valid[i][0]] = {"index": valid[i][0], "order_id": order_id, "public_id": row["public_id"],
+                                    "fare_total": totals[i], "distance_km": distances[i]}
+
+    created = sum(1 for r in results if "order_id" in r)
+    status = 201 if created else 400
+    return jsonify({"created": created, "failed": len(results) - created, "results": results}), status
+
 @customer_bp.post('/orders/simple')
-@role_required('customer')
-def create_simple_order():
+@role_required('customer', inject_principal=True, claims_only=True)
+@streams_uploads
+def create_simple_order(principal):
     try:
-        # Get form data
-        pickup_location = request.form.get('pickup_location')
-        drop_location = request.form.get('drop_location')
-        pickup_lat = request.form.get('pickup_lat')
-        pickup_lng = request.form.get('pickup_lng')
-        drop_lat = request.form.get('drop_lat')
-        drop_lng = request.form.get('drop_lng')
-        material_type = request.form.get('material_type')
-        material_description = request.form.get('material_description')
-        material_weight = request.form.get('material_weight')
-        distance_km = request.form.get('distance_km')
-        fare_total = request.form.get('fare_total')
-        
-        # Validate required fields
-        if not pickup_location:
-            return jsonify({"message": "Pickup location is required"}), 400
-        if not drop_location:
-            return jsonify({"message": "Drop location is required"}), 400
-        if not pickup_lat or not pickup_lng:
-            return jsonify({"message": "Pickup coordinates are required"}), 400
-        if not drop_lat or not drop_lng:
-            return jsonify({"message": "Drop coordinates are required"}), 400
-        if not material_type:
-            return jsonify({"message": "Material type is required"}), 400
-        if not material_weight:
-            return jsonify({"message": "Material weight is required"}), 400
-        if not distance_km:
-            return jsonify({"message": "Distance is required"}), 400
-        if not fare_total:
-            return jsonify({"message": "Price is required"}), 400
-            
-        # Validate coordinates are numbers
-        try:
-            pickup_lat_float = float(pickup_lat)
-            pickup_lng_float = float(pickup_lng)
-            drop_lat_float = float(drop_lat)
-            drop_lng_float = float(drop_lng)
-            distance_km_float = float(distance_km)
-            fare_total_float = float(fare_total)
-        except ValueError:
-            return jsonify({"message": "Coordinates, distance, and price must be valid numbers"}), 400
-            
-        # Validate weight is a number
-        try:
-            weight_kg = float(material_weight)
-            if weight_kg <= 0:
-                return jsonify({"message": "Material weight must be greater than 0"}), 400
-        except ValueError:
-            return jsonify({"message": "Material weight must be a valid number"}), 400
-            
-        # Validate distance and fare
-        if distance_km_float < 0:
-            return jsonify({"message": "Distance cannot be negative"}), 400
-        if fare_total_float < 0:
-            return jsonify({"message": "Price cannot be negative"}), 400
-            
-        # Generate a unique order ID
-        order_id = generate_unique_order_id()
-        
-        # Get user ID from JWT identity
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({"message": "User not found"}), 404
-            
-        customer = user.customer_profile
-        
-        if not customer:
-            return jsonify({"message": "Customer profile not found"}), 404
+        details, err = SIMPLE_ORDER_SCHEMA.parse(request.form)
+        if err:
+            return jsonify({"message": err}), 400
+
+        quote_token = request.form.get('quote_token')
+        if quote_token:
+            # The signed quote the customer accepted carries a validated
+            # route and its price, so there is nothing to re-check
+            quote = verify_quote(quote_token, principal.profile_id)
+            if quote is None:
+                return jsonify({"message": INVALID_QUOTE_MESSAGE}), 400
+            route = _quote_route(quote)
+        else:
+            route, err = SIMPLE_ROUTE_SCHEMA.parse(request.form)
+            if err:
+                return jsonify({"message": err}), 400
+
+            # Price on the server; any distance_km/fare_total sent by the
+            # client is ignored
+            quote, _ = quote_cache.get_quote(route['pickup_lat'], route['pickup_lng'],
+                                             route['drop_lat'], route['drop_lng'], route['weight_kg'])
             
-        # Handle photo upload (in a real app, you would save the file)
-        material_photo_url = None
-        if 'material_photo' in request.files:
-            material_photo = request.files['material_photo']
-            if material_photo.filename != '':
-                # In a real implementation, you would save the file and generate a URL
-                # For now, we'll just store the filename as a placeholder
-                material_photo_url = f"/uploads/{material_photo.filename}"
+        # Streamed to disk and checked while the form was parsed; stored
+        # under its content hash
+        material_photo_url = store_photo(request.files.get('material_photo'))
         
         # Create the order object with simplified data
         order = Order()
-        order.customer_id = customer.id
-        order.pickup_address = pickup_location
-        order.pickup_lat = pickup_lat_float
-        order.pickup_lng = pickup_lng_float
-        order.drop_address = drop_location
-        order.drop_lat = drop_lat_float
-        order.drop_lng = drop_lng_float
-        order.material_type = material_type
-        order.material_description = material_description
+        order.customer_id = principal.profile_id
+        order.public_id = id_service.order_id()
+        order.pickup_address = details['pickup_address']
+        order.pickup_lat = route['pickup_lat']
+        order.pickup_lng = route['pickup_lng']
+        order.drop_address = details['drop_address']
+        order.drop_lat = route['drop_lat']
+        order.drop_lng = route['drop_lng']
+        order.material_type = details['material_type']
+        order.material_description = details['material_description']
         order.material_photo_url = material_photo_url
-        order.weight_kg = weight_kg
-        order.distance_km = distance_km_float
-        order.fare_total = fare_total_float
+        order.weight_kg = route['weight_kg']
+        order.distance_km = quote.distance_km
+        order.fare_total = quote.fare_total
         order.status = OrderStatus.PENDING.value
         order.driver_share = 0  # Will be calculated when assigned to driver
         order.company_commission = 0  # Will be calculated when assigned to driver
-        
-        db.session.add(order)
-        db.session.commit()
 
-        # Update customer stats
-        customer.total_orders += 1
-        customer.total_spent += fare_total_float
-        customer.last_order_date = datetime.utcnow()
-        db.session.commit()
+        public_id = order.public_id
+        _place_order(order, principal.profile_id)
 
         return jsonify({
-            "order_id": f"ORD{order_id}",
-            "distance_km": distance_km_float,
-            "material_weight": weight_kg,
-            "fare_total": fare_total_float,
+            "order_id": public_id,
+            "distance_km": quote.distance_km,
+            "material_weight": route['weight_kg'],
+            "fare_total": quote.fare_total,
             "message": "Order created successfully!"
         }), 201
         
+    except UploadRejected:
+        raise
     except Exception as e:
+        db.session.rollback()
         # Log the error for debugging
         current_app.logger.error(f"Error creating simple order: {str(e)}")
         return jsonify({"message": f"Error creating order: {str(e)}"}), 500
 
-def generate_unique_order_id():
-    """Generate a unique order ID in the format ORD20251102XXXX"""
-    # Get current date in YYYYMMDD format
-    date_str = datetime.now().strftime("%Y%m%d")
-    
-    # Generate 4 random digits
-    random_digits = ''.join(random.choices(string.digits, k=4))
-    
-    # Combine date and random digits
-    order_id = f"{date_str}{random_digits}"
-    
-    # Check if this ID already exists (very unlikely but good to be safe)
-    # In a production environment, you might want to check against the database
-    return order_id
+def _encode_cursor(created_at, order_id):
+    raw = f"{created_at.isoformat()}|{order_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, order_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _history_etag(customer_id, version, *params):
+    # The version covers every write to the customer's orders; the params
+    # tell apart pages and filters of the same version
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return f"{customer_id}-{version}-{digest}"
+
+
+def _not_modified(etag):
+    """A 304 response if the client already holds ``etag``, else None."""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+
+def _conditional_json(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # Browsers keep the copy but revalidate every time, which is what
+    # turns the dashboard's polling into cheap 304s
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @customer_bp.get('/orders')
-@role_required('customer')
-def my_orders():
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    customer = user.customer_profile
-    
-    if not customer:
-        return jsonify({"message": "Customer profile not found"}), 404
-        
+@role_required('customer', inject_principal=True, claims_only=True)
+def my_orders(principal):
+    """
+    Newest-first order history, one page at a time. Pass the ``X-Next-Cursor``
+    response header back as ``?cursor=`` for the next page; ``?status=`` takes
+    one or more comma-separated statuses. Responses carry an ETag derived
+    from the customer's order version, so an unchanged history costs one
+    primary-key lookup and a 304.
+    """
+    config = current_app.config
+    try:
+        limit = int(request.args.get('limit', config.get('ORDER_HISTORY_PAGE_SIZE', 50)))
+    except ValueError:
+        return jsonify({"message": "limit must be a number"}), 400
+    limit = max(1, min(limit, config.get('ORDER_HISTORY_MAX_PAGE_SIZE', 200)))
+
+    statuses = sorted({s for s in request.args.get('status', '').split(',') if s})
+    if any(s not in [st.value for st in OrderStatus] for s in statuses):
+        return jsonify({"message": "Invalid status"}), 400
+
+    cursor = request.args.get('cursor')
+    position = _decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        return jsonify({"message": "Invalid cursor"}), 400
+
+    version = orders_version(principal.profile_id)
+    etag = _history_etag(principal.profile_id, version, limit, statuses, cursor)
+    cached = _not_modified(etag)
+    if cached is not None:
+        return cached
+
+    query = (db.session.query(Order.id, Order.public_id, Order.status, Order.fare_total, Order.driver_id,
+                              Order.distance_km, Order.created_at, Order.material_photo_url)
+             .filter(Order.customer_id == principal.profile_id))
+    if statuses:
+        query = query.filter(Order.status.in_(statuses))
+    if position is not None:
+        created_at, order_id = position
+        query = query.filter(db.or_(Order.created_at < created_at,
+                                    db.and_(Order.created_at == created_at, Order.id < order_id)))
+    rows = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+
     orders = [
         {
             "id": o.id,
+            "public_id": o.public_id,
             "status": o.status,
             "fare_total": o.fare_total,
             "driver_id": o.driver_id,
             "distance_km": o.distance_km,
-            "created_at": o.created_at.isoformat()
-        } for o in customer.orders
+            "created_at": o.created_at.isoformat(),
+            "material_photo_url": o.material_photo_url,
+            "material_photo_thumbnail_url": thumbnail_url(o.material_photo_url)
+        } for o in rows[:limit]
     ]
-    return jsonify(orders)
+    response = _conditional_json(orders, etag)
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers['X-Next-Cursor'] = _encode_cursor(last.created_at, last.id)
+    return response
+
+@customer_bp.get('/orders/summary')
+@role_required('customer', inject_principal=True, claims_only=True)
+def order_summary(principal):
+    """Order counts per status, for dashboard stats without paging through the history."""
+    version = orders_version(principal.profile_id)
+    etag = _history_etag(principal.profile_id, version, 'summary')
+    cached = _not_modified(etag)
+    if cached is not None:
+        return cached
+
+    counts = dict(db.session.query(Order.status, db.func.count(Order.id))
+                  .filter(Order.customer_id == principal.profile_id)
+                  .group_by(Order.status).all())
+    return _conditional_json({"total": sum(counts.values()), "by_status": counts}, etag)
+
+TERMINAL_STATUSES = {OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value}
+
+
+def _tracking_state(order_id):
+    """``(customer_id, status, driver)`` for an order in one query, or None."""
+    row = (db.session.query(Order.customer_id, Order.status, Order.driver_id,
+                            Driver.current_lat, Driver.current_lng, Driver.location_seq)
+           .outerjoin(Driver, Driver.id == Order.driver_id)
+           .filter(Order.id == order_id).first())
+    if row is None:
+        return None
+    customer_id, status, driver_id, lat, lng, seq = row
+    driver = None
+    if driver_id is not None:
+        # A fix this worker has buffered but not written yet wins
+        lat, lng = location_buffer.position(driver_id, lat, lng, seq)
+        driver = {"id": driver_id, "lat": lat, "lng": lng}
+    return customer_id, status, driver
+
+
+def _resync_tracking(order_id):
+    """
+    Publish the order's stored state so writes handled by other workers
+    reach this worker's streams; unchanged values are dropped by the bus.
+    """
+    state = _tracking_state(order_id)
+    db.session.close()
+    if state is None:
+        return
+    _, status, driver = state
+    order_events.publish_status(order_id, status, driver and driver["id"])
+    if driver is not None and driver["lat"] is not None:
+        order_events.publish_driver_location(driver["id"], driver["lat"], driver["lng"])
+
+
+def _sse(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
 
 @customer_bp.get('/orders/<int:order_id>/track')
-@role_required('customer')
-def track_order(order_id):
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    customer = user.customer_profile
-    
-    if not customer:
-        return jsonify({"message": "Customer profile not found"}), 404
-    
-    order = Order.query.get_or_404(order_id)
-    if not order.driver:
-        return jsonify({"status": order.status, "driver": None})
-    return jsonify({
-        "status": order.status,
-        "driver": {
-            "id": order.driver.id,
-            "lat": order.driver.current_lat,
-            "lng": order.driver.current_lng
-        }
-    })
+@role_required('customer', inject_principal=True, claims_only=True)
+def track_order(order_id, principal):
+    state = _tracking_state(order_id)
+    if state is None or state[0] != principal.profile_id:
+        return jsonify({"message": "Order not found"}), 404
+    _, status, driver = state
+    return jsonify({"status": status, "driver": driver})
+
+@customer_bp.get('/orders/<int:order_id>/track/history')
+@role_required('customer', inject_principal=True, claims_only=True)
+def track_order_history(order_id, principal):
+    """
+    The driver's trail while on the order, ``[[ms, lat, lng], ...]`` oldest
+    first; ``?step=`` seconds keeps one fix per step. The last
+    ``LOCATION_HISTORY_FLUSH_INTERVAL`` seconds may not be in it yet; the
+    live stream covers those.
+    """
+    try:
+        step = int(request.args.get('step', 0))
+    except ValueError:
+        return jsonify({"message": "step must be a number of seconds"}), 400
+    order = (db.session.query(Order.customer_id, Order.driver_id, Order.status,
+                              Order.assigned_at, Order.created_at, Order.updated_at)
+             .filter(Order.id == order_id).first())
+    if order is None or order.customer_id != principal.profile_id:
+        return jsonify({"message": "Order not found"}), 404
+    if order.driver_id is None:
+        return jsonify({"status": order.status, "driver_id": None, "points": []})
+    since, until = order_window(order.status, order.assigned_at, order.created_at, order.updated_at)
+    points = driver_track(order.driver_id, since, until, max(step, 0) * 1000,
+                          current_app.config.get('LOCATION_HISTORY_MAX_POINTS', 5000))
+    return jsonify({"status": order.status, "driver_id": order.driver_id, "from": since, "to": until,
+                    "points": [list(point) for point in points]})
+
+@customer_bp.get('/orders/<int:order_id>/track/stream')
+@role_required('customer', inject_principal=True, claims_only=True)
+def track_order_stream(order_id, principal):
+    """
+    Server-sent events for one order: a ``snapshot`` (same shape as
+    ``/track``) and then ``status`` and ``location`` events as the driver
+    endpoints publish them. ``Last-Event-ID`` resumes without a snapshot
+    when this worker still has the order's events. The stream ends when the
+    order is delivered or cancelled, or after ``TRACK_STREAM_MAX_SECONDS``;
+    when this worker is at its stream limit the client gets a 503 and falls
+    back to polling ``/track``.
+    """
+    config = current_app.config
+    state = _tracking_state(order_id)
+    if state is None or state[0] != principal.profile_id:
+        return jsonify({"message": "Order not found"}), 404
+    _, status, driver = state
+    if status in TERMINAL_STATUSES:
+        return jsonify({"message": "Order is no longer active", "status": status}), 409
+
+    if not order_events.try_open_stream(config.get('TRACK_STREAM_MAX_CONNECTIONS', 4)):
+        response = jsonify({"message": "Live tracking is busy, poll the track endpoint instead",
+                            "poll": f"/api/customer/orders/{order_id}/track"})
+        response.headers['Retry-After'] = str(config.get('TRACK_STREAM_BUSY_RETRY_SECONDS', 5))
+        return response, 503
+
+    # The stream must not hold a pooled connection between resyncs
+    db.session.close()
+    subscription = order_events.subscribe(order_id, status, driver,
+                                          keep_for=config.get('TRACK_STREAM_RESUME_SECONDS', 60))
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    heartbeat = config.get('TRACK_STREAM_HEARTBEAT_SECONDS', 15)
+    resync_every = config.get('TRACK_STREAM_RESYNC_SECONDS', 30)
+    max_seconds = config.get('TRACK_STREAM_MAX_SECONDS', 300)
+
+    def events():
+        yield f"retry: {config.get('TRACK_STREAM_RETRY_MS', 3000)}\n\n"
+        current = status
+        sent = 0
+        replay = order_events.replay_since(subscription, last_event_id)
+        if replay is None:
+            sent, snapshot = order_events.snapshot(subscription)
+            current = snapshot["status"]
+            yield _sse("snapshot", snapshot, subscription.event_id(sent))
+        else:
+            # Nothing new since the client's id still means it is up to date
+            for seq, kind, data in replay:
+                yield _sse(kind, data, subscription.event_id(seq))
+                sent = seq
+                if kind == STATUS:
+                    current = data["status"]
+
+        started = next_resync = time.monotonic()
+        while current not in TERMINAL_STATUSES:
+            now = time.monotonic()
+            if now - started >= max_seconds:
+                return
+            if now >= next_resync:
+                next_resync = now + resync_every
+                try:
+                    _resync_tracking(order_id)
+                except Exception as e:
+                    current_app.logger.error(f"Tracking resync failed for order {order_id}: {str(e)}")
+            fresh = [event for event in subscription.wait(min(heartbeat, next_resync - now))
+                     if event[0] > sent]
+            if not fresh:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, kind, data in fresh:
+                yield _sse(kind, data, subscription.event_id(seq))
+                if kind == STATUS:
+                    current = data["status"]
+            sent = fresh[-1][0]
+
+    def close():
+        order_events.unsubscribe(subscription)
+        order_events.close_stream()
+
+    response = current_app.response_class(stream_with_context(events()), mimetype='text/event-stream')
+    # Runs even if the client goes away before the first chunk is sent
+    response.call_on_close(close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @customer_bp.get('/profile')
-@role_required('customer')
-def get_profile():
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    customer = user.customer_profile
-    
-    if not customer:
-        return jsonify({"message": "Customer profile not found"}), 404
+@role_required('customer', inject_principal=True)
+def get_profile(principal):
+    user, customer = principal.user, principal.profile
 
     profile_data = {
         "id": user.id,
@@ -410,38 +624,20 @@ def get_profile():
     return jsonify(profile_data)
 
 @customer_bp.put('/profile')
-@role_required('customer')
-def update_profile():
-    data = request.get_json() or {}
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    customer = user.customer_profile
-    
-    if not customer:
-        return jsonify({"message": "Customer profile not found"}), 404
+@role_required('customer', inject_principal=True)
+def update_profile(principal):
+    changes, err = CUSTOMER_PROFILE_SCHEMA.parse(request.get_json(silent=True) or {})
+    if err:
+        return jsonify({"message": err}), 400
+    user, customer = principal.user, principal.profile
 
     # Update user information
-    if "name" in data:
-        user.name = data["name"]
-    
+    if "name" in changes:
+        user.name = changes.pop("name")
+
     # Update customer information
-    if "phone" in data:
-        customer.phone = data["phone"]
-    if "address" in data:
-        customer.address = data["address"]
-    if "city" in data:
-        customer.city = data["city"]
-    if "state" in data:
-        customer.state = data["state"]
-    if "zip_code" in data:
-        customer.zip_code = data["zip_code"]
-    if "country" in data:
-        customer.country = data["country"]
+    for field, value in changes.items():
+        setattr(customer, field, value)
 
     db.session.commit()
     
@@ -1,28 +1,24 @@
+import heapq
+import math
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import and_, literal, or_
 from ..database import db
-from ..models import User, Customer, Driver, Order, OrderStatus
+from ..models import Driver, Order, OrderStatus
 from ..utils.security import role_required
-from ..utils.validators import validate_lat_lng
-from flask_mail import Message
-import logging
+from ..utils.email_utils import send_support_chat
+from ..utils.validators import DRIVER_PROFILE_SCHEMA, LOCATION_SCHEMA
+from ..utils.order_changes import transition_order
+from ..utils.order_events import order_events
+from ..utils.locations import location_buffer
+from ..utils.pricing import haversine_km
+from ..utils import geo
 
 driver_bp = Blueprint('driver', __name__)
 
 @driver_bp.get('/profile')
-@role_required('driver')
-def get_profile():
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    driver = user.driver_profile
-    
-    if not driver:
-        return jsonify({"message": "Driver profile not found"}), 404
+@role_required('driver', inject_principal=True)
+def get_profile(principal):
+    user, driver = principal.user, principal.profile
 
     profile_data = {
         "id": user.id,
@@ -43,63 +39,86 @@ def get_profile():
     return jsonify(profile_data)
 
 @driver_bp.put('/profile')
-@role_required('driver')
-def update_profile():
-    data = request.get_json() or {}
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    driver = user.driver_profile
-    
-    if not driver:
-        return jsonify({"message": "Driver profile not found"}), 404
+@role_required('driver', inject_principal=True)
+def update_profile(principal):
+    changes, err = DRIVER_PROFILE_SCHEMA.parse(request.get_json(silent=True) or {})
+    if err:
+        return jsonify({"message": err}), 400
+    user, driver = principal.user, principal.profile
 
     # Update user information
-    if "name" in data:
-        user.name = data["name"]
-    
+    if "name" in changes:
+        user.name = changes.pop("name")
+
     # Update driver information
-    if "phone" in data:
-        driver.phone = data["phone"]
-    if "license_number" in data:
-        driver.license_number = data["license_number"]
-    if "vehicle_type" in data:
-        driver.vehicle_type = data["vehicle_type"]
-    if "vehicle_number" in data:
-        driver.vehicle_number = data["vehicle_number"]
+    for field, value in changes.items():
+        setattr(driver, field, value)
 
     db.session.commit()
     
     return jsonify({"message": "Profile updated successfully"})
 
+def _nearby_pending_orders(lat, lng, radius_km, limit):
+    """
+    Up to ``limit`` pending orders whose pickup is within ``radius_km`` of
+    the point, nearest first, as ``(distance_km, row)``. The geohash ranges
+    use the partial index on pending orders; the bounding box and then the
+    haversine distance trim what the cells cover beyond the circle.
+    """
+    south, north, lng_ranges = geo.bounding_box(lat, lng, radius_km)
+    # Status is repeated in every branch, inlined, so SQLite matches the
+    # partial index and seeks each range (a "MULTI-INDEX OR")
+    pending = Order.status == literal(OrderStatus.PENDING.value, literal_execute=True)
+    cells = [and_(pending, Order.pickup_cell >= low, Order.pickup_cell < high)
+             for low, high in geo.covering_ranges(lat, lng, radius_km)]
+    rows = (db.session.query(Order.id, Order.pickup_lat, Order.pickup_lng,
+                             Order.drop_lat, Order.drop_lng, Order.fare_total)
+            .filter(or_(*cells),
+                    Order.pickup_lat.between(south, north),
+                    or_(*[Order.pickup_lng.between(west, east) for west, east in lng_ranges]))
+            .all())
+    nearby = ((haversine_km(lat, lng, row.pickup_lat, row.pickup_lng), row) for row in rows)
+    return heapq.nsmallest(limit, (item for item in nearby if item[0] <= radius_km), key=lambda item: item[0])
+
 @driver_bp.get('/orders/available')
-@role_required('driver')
-def available_orders():
-    # simple: list pending orders
-    orders = Order.query.filter_by(status=OrderStatus.PENDING.value).all()
-    return jsonify([{ "id": order.id, "pickup": [order.pickup_lat, order.pickup_lng], "drop": [order.drop_lat, order.drop_lng], "fare_total": order.fare_total } for order in orders] )
+@role_required('driver', inject_principal=True, claims_only=True)
+def available_orders(principal):
+    """
+    Pending orders nearest the driver's last reported position, closest
+    first. ``?radius_km=`` and ``?limit=`` default to and are capped by the
+    ``AVAILABLE_ORDERS_*`` settings.
+    """
+    config = current_app.config
+    try:
+        radius_km = float(request.args.get('radius_km', config.get('AVAILABLE_ORDERS_RADIUS_KM', 10)))
+        limit = int(request.args.get('limit', config.get('AVAILABLE_ORDERS_LIMIT', 50)))
+    except ValueError:
+        return jsonify({"message": "radius_km and limit must be numbers"}), 400
+    if not math.isfinite(radius_km) or radius_km <= 0:
+        return jsonify({"message": "radius_km must be greater than 0"}), 400
+    radius_km = min(radius_km, config.get('AVAILABLE_ORDERS_MAX_RADIUS_KM', 50))
+    limit = max(1, min(limit, config.get('AVAILABLE_ORDERS_MAX_LIMIT', 200)))
+
+    stored = (db.session.query(Driver.current_lat, Driver.current_lng, Driver.location_seq)
+              .filter_by(id=principal.profile_id).first())
+    lat, lng = location_buffer.position(principal.profile_id, *stored) if stored else (None, None)
+    if lat is None or lng is None:
+        return jsonify({"message": "Update your location to see nearby orders"}), 409
+
+    nearby = _nearby_pending_orders(lat, lng, radius_km, limit)
+    return jsonify([{
+        "id": order.id,
+        "pickup": [order.pickup_lat, order.pickup_lng],
+        "drop": [order.drop_lat, order.drop_lng],
+        "fare_total": order.fare_total,
+        "pickup_distance_km": round(distance, 2),
+    } for distance, order in nearby])
 
 @driver_bp.get('/orders')
-@role_required('driver')
-def all_orders():
+@role_required('driver', inject_principal=True, claims_only=True)
+def all_orders(principal):
     # Get all orders assigned to this driver
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    driver = user.driver_profile
-    
-    if not driver:
-        return jsonify({"message": "Driver profile not found"}), 404
-
-    orders = Order.query.filter_by(driver_id=driver.id).all()
+    orders = Order.query.filter_by(driver_id=principal.profile_id).all()
     return jsonify([{
         "id": order.id,
         "status": order.status,
@@ -112,49 +131,32 @@ def all_orders():
     } for order in orders])
 
 @driver_bp.post('/orders/<int:order_id>/accept')
-@role_required('driver')
-def accept_order(order_id):
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    driver = user.driver_profile
-    
-    if not driver:
-        return jsonify({"message": "Driver profile not found"}), 404
-
-    order = Order.query.get_or_404(order_id)
-    if order.status != OrderStatus.PENDING.value:
+@role_required('driver', inject_principal=True, claims_only=True)
+def accept_order(order_id, principal):
+    # Conditional UPDATE: of two drivers accepting at once, only one wins
+    change = transition_order(order_id, OrderStatus.ASSIGNED.value, driver_id=principal.profile_id,
+                              from_statuses=(OrderStatus.PENDING.value,))
+    if change is None:
+        return jsonify({"message": "Order not found"}), 404
+    if not change.applied:
         return jsonify({"message": "Order not available"}), 400
-    order.driver_id = driver.id
-    order.status = OrderStatus.ASSIGNED.value
     db.session.commit()
-    return jsonify({"message": "Accepted", "order_id": order.id})
+    order_events.publish_status(order_id, OrderStatus.ASSIGNED.value, principal.profile_id)
+    return jsonify({"message": "Accepted", "order_id": order_id})
 
 @driver_bp.post('/location')
-@role_required('driver')
-def update_location():
-    data = request.get_json() or {}
-    if not validate_lat_lng(data.get('lat'), data.get('lng')):
-        return jsonify({"message": "Invalid coordinates"}), 400
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    driver = user.driver_profile
-    
-    if not driver:
-        return jsonify({"message": "Driver profile not found"}), 404
-    driver.current_lat = float(data['lat'])
-    driver.current_lng = float(data['lng'])
-    db.session.commit()
-    return jsonify({"message": "Location updated"})
+@role_required('driver', inject_principal=True, claims_only=True)
+def update_location(principal):
+    location, err = LOCATION_SCHEMA.parse(request.get_json(silent=True) or {})
+    if err:
+        return jsonify({"message": err}), 400
+    lat, lng = location['lat'], location['lng']
+    # Buffered and written in bulk every LOCATION_FLUSH_INTERVAL seconds
+    if not location_buffer.record(principal.profile_id, lat, lng, location['seq']):
+        return jsonify({"message": "A newer location was already received"}), 202
+    # Pushed to customers with an open tracking stream on this worker
+    order_events.publish_driver_location(principal.profile_id, lat, lng)
+    return jsonify({"message": "Location updated"}), 202
 
 @driver_bp.post('/orders/<int:order_id>/status')
 @role_required('driver')
@@ -163,61 +165,39 @@ def update_status(order_id):
     status = data.get('status')
     if status not in [s.value for s in OrderStatus]:
         return jsonify({"message": "Invalid status"}), 400
-    order = Order.query.get_or_404(order_id)
-    order.status = status
+    # Customer and driver totals move in the same transaction
+    change = transition_order(order_id, status)
+    if change is None:
+        return jsonify({"message": "Order not found"}), 404
+    if not change.applied:
+        return jsonify({"message": "Order was changed by another request, try again"}), 409
     db.session.commit()
+    order_events.publish_status(order_id, status, change.driver_id)
     return jsonify({"message": "Status updated"})
 
 @driver_bp.get('/earnings')
-@role_required('driver')
-def earnings():
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-        
-    driver = user.driver_profile
-    
-    if not driver:
-        return jsonify({"message": "Driver profile not found"}), 404
-    delivered = [o for o in driver.orders if o.status == OrderStatus.DELIVERED.value]
-    total = sum(o.driver_share for o in delivered)
-    return jsonify({"delivered_count": len(delivered), "total_earnings": round(total,2)})
+@role_required('driver', inject_principal=True, claims_only=True)
+def earnings(principal):
+    # Maintained with every status change (see utils/order_changes.py)
+    delivered, total = (db.session.query(Driver.total_deliveries, Driver.total_earnings)
+                        .filter_by(id=principal.profile_id).one())
+    return jsonify({"delivered_count": delivered or 0, "total_earnings": round(total or 0, 2)})
 
 @driver_bp.post('/chat')
-@role_required('driver')
-def driver_chat():
+@role_required('driver', inject_principal=True)
+def driver_chat(principal):
     data = request.get_json() or {}
     message = data.get('message')
     
     if not message:
         return jsonify({"message": "Message is required"}), 400
     
-    # Get user ID from JWT identity (now a string)
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = principal.user
     
-    # Send message to admin email
+    # Queue message for the admin mailbox
     try:
-        mail = current_app.extensions['mail']
-        msg = Message(
-            subject=f"Driver Support Chat - {user.email}",
-            recipients=['swiftlogixindia@gmail.com'],
-            body=f"""
-Driver: {user.name} ({user.email})
-Message: {message}
-
-This message was sent from the driver support chatbot.
-            """
-        )
-        mail.send(msg)
-        logging.info(f"Chat message sent from driver {user.email}")
+        send_support_chat(user, 'driver', message)
     except Exception as e:
-        current_app.logger.error(f"Failed to send chat message email: {str(e)}")
+        current_app.logger.error(f"Failed to queue chat message email: {str(e)}")
     
     return jsonify({"message": "Message sent successfully"}), 200
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Admin bulk user import.
+
+Rows are streamed from a CSV or NDJSON upload and processed in batches of
+``BULK_IMPORT_BATCH_SIZE``: each batch is validated with the same rules as
+``/api/auth/register``, checked against existing emails with one query,
+hashed in parallel on the password hashing pool and inserted in a single
+transaction. A bad row is reported and skipped; it never aborts the import.
+"""
+import codecs
+import csv
+import json
+import logging
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from ..database import db
+from ..models import User, UserRole, Customer, Driver
+from .security import hash_passwords
+from .validators import validate_registration, CUSTOMER_PROFILE_FIELDS, DRIVER_PROFILE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+CSV_TYPES = {"text/csv", "application/csv", "application/vnd.ms-excel"}
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+
+_PROFILES = {
+    UserRole.CUSTOMER.value: (Customer, CUSTOMER_PROFILE_FIELDS),
+    UserRole.DRIVER.value: (Driver, DRIVER_PROFILE_FIELDS),
+}
+
+
+def detect_format(filename, mimetype):
+    """'csv', 'ndjson' or None, from the upload's file extension or content type."""
+    name = (filename or "").lower()
+    if name.endswith(".csv") or mimetype in CSV_TYPES:
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or mimetype in NDJSON_TYPES:
+        return "ndjson"
+    return None
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield ``(line_number, row)`` pairs without reading the whole upload into
+    memory. Unparseable NDJSON lines yield ``row=None``.
+    """
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Blank cells mean "not provided", like a missing JSON key
+            yield reader.line_num, {k.strip(): v.strip() for k, v in row.items()
+                                    if k and isinstance(v, str) and v.strip()}
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+class ImportResult:
+    def __init__(self, max_errors):
+        self.created = {role: 0 for role in _PROFILES}
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def fail(self, line, email, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "email": email, "message": message})
+
+    @property
+    def total_created(self):
+        return sum(self.created.values())
+
+    def to_dict(self):
+        return {
+            "created": self.total_created,
+            "created_by_role": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _insert_batch(batch, result):
+    emails = [data["email"] for _, data in batch]
+    existing = {email for (email,) in db.session.query(User.email).filter(User.email.in_(emails))}
+    pending = []
+    for line, data in batch:
+        if data["email"] in existing:
+            result.fail(line, data["email"], "Email already registered")
+        else:
+            pending.append((line, data))
+    if not pending:
+        return
+
+    hashes = hash_passwords([data["password"] for _, data in pending])
+    users = []
+    for (_, data), pw_hash in zip(pending, hashes):
+        user = User()
+        user.name = data["name"]
+        user.email = data["email"]
+        user.password_hash = pw_hash
+        user.role = data["role"]
+        users.append(user)
+
+    try:
+        db.session.add_all(users)
+        db.session.flush()
+
+        profiles = {role: [] for role in _PROFILES}
+        for (_, data), user in zip(pending, users):
+            if user.role not in _PROFILES:
+                continue
+            model, fields = _PROFILES[user.role]
+            profile = model()
+            profile.user_id = user.id
+            for field in fields:
+                if field in data:
+                    setattr(profile, field, data[field])
+            profiles[user.role].append(profile)
+        for items in profiles.values():
+            db.session.add_all(items)
+        db.session.commit()
+    except IntegrityError as e:
+        # A concurrent registration took one of the emails or ids; the whole
+        # batch is rolled back and reported rather than retried row by row
+        db.session.rollback()
+        logger.warning(f"Bulk import batch rolled back: {e.orig}")
+        for line, data in pending:
+            result.fail(line, data["email"], "Conflicts with an existing user, retry this row")
+        return
+
+    for user in users:
+        if user.role in result.created:
+            result.created[user.role] += 1
+
+
+def import_users(stream, fmt, default_role=None):
+    """Import users from a byte stream. Returns an ``ImportResult``."""
+    config = current_app.config
+    batch_size = config.get('BULK_IMPORT_BATCH_SIZE', 200)
+    result = ImportResult(config.get('BULK_IMPORT_MAX_ERRORS', 100))
+    seen_emails = set()
+    batch = []
+
+    for line, row in iter_rows(stream, fmt):
+        if row is None:
+            result.fail(line, None, "Invalid JSON object")
+            continue
+        if default_role and not row.get("role"):
+            row["role"] = default_role
+        ok, err = validate_registration(row)
+        if not ok:
+            result.fail(line, row.get("email"), err)
+            continue
+        if row["role"].lower() == UserRole.ADMIN.value:
+            result.fail(line, row["email"], "Admin accounts cannot be bulk imported")
+            continue
+        row["role"] = row["role"].lower()
+        row["email"] = row["email"].strip()
+        if row["email"] in seen_emails:
+            result.fail(line, row["email"], "Duplicate email in upload")
+            continue
+        seen_emails.add(row["email"])
+
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            _insert_batch(batch, result)
+            batch = []
+    if batch:
+        _insert_batch(batch, result)
+    return result
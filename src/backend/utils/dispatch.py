@@ -0,0 +1,271 @@
+"""
+Batch dispatch: assign pending orders to idle drivers.
+
+``flask dispatch`` takes the oldest ``DISPATCH_MAX_ORDERS`` pending orders
+and the drivers that are available, verified, have a position and no
+active order, and solves one assignment problem over them:
+
+- The cost of a pair is the haversine distance from the driver to the
+  pickup, computed for the whole matrix at once with NumPy (in row blocks,
+  so the temporaries stay small).
+- Pairs more than ``DISPATCH_MAX_PICKUP_KM`` apart get a penalty larger
+  than any sum of real costs. The optimum therefore gives as many orders
+  as possible a driver, and among those assignments has the shortest total
+  pickup distance. Penalised pairs are dropped from the result.
+- Orders and drivers that cannot reach each other (different cities) are
+  split into groups on a grid of cells at least ``DISPATCH_MAX_PICKUP_KM``
+  wide, and each group is solved on its own.
+- Each group is solved with SciPy's ``linear_sum_assignment`` (a
+  Jonker-Volgenant shortest augmenting path solver, i.e. Hungarian). Without
+  SciPy a NumPy auction algorithm with epsilon scaling finds the optimum for
+  the costs rounded to metres.
+
+The assignments are written in one transaction by
+``order_changes.assign_orders``, which skips orders that were accepted by
+hand in the meantime.
+"""
+import logging
+import time
+from math import asin, cos, degrees, radians, sin
+
+import numpy as np
+from flask import current_app
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # the auction fallback below is used instead
+    linear_sum_assignment = None
+
+from ..database import db
+from ..models import Driver, Order, OrderStatus, User
+from .order_changes import ACTIVE_STATUSES, assign_orders
+from .pricing import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+# Rows of the cost matrix computed per NumPy pass
+_BLOCK_ROWS = 1024
+
+
+def haversine_matrix_km(lats_a, lngs_a, lats_b, lngs_b, out=None):
+    """``(len(a), len(b))`` matrix of great-circle distances in km."""
+    lat_a, lng_a = np.radians(lats_a)[:, None], np.radians(lngs_a)[:, None]
+    lat_b, lng_b = np.radians(lats_b)[None, :], np.radians(lngs_b)[None, :]
+    cos_a, cos_b = np.cos(lat_a), np.cos(lat_b)
+    if out is None:
+        out = np.empty((lat_a.shape[0], lat_b.shape[1]))
+    for start in range(0, out.shape[0], _BLOCK_ROWS):
+        rows = slice(start, start + _BLOCK_ROWS)
+        block = out[rows]
+        np.subtract(lat_b, lat_a[rows], out=block)
+        np.sin(block / 2, out=block)
+        np.square(block, out=block)
+        across = np.sin((lng_b - lng_a[rows]) / 2)
+        np.square(across, out=across)
+        across *= cos_a[rows]
+        across *= cos_b
+        block += across
+        np.sqrt(block, out=block)
+        np.minimum(block, 1.0, out=block)
+        np.arcsin(block, out=block)
+        block *= 2 * EARTH_RADIUS_KM
+    return out
+
+
+def reachable_groups(order_lats, order_lngs, driver_lats, driver_lngs, max_km):
+    """
+    Split orders and drivers into ``[(order_indices, driver_indices), ...]``
+    such that no order is within ``max_km`` of a driver in another group.
+    Points go into grid cells at least ``max_km`` tall and wide; cells that
+    touch (including diagonally) are merged. Groups with no orders or no
+    drivers are left out.
+    """
+    lats = np.concatenate([order_lats, driver_lats])
+    lngs = np.concatenate([order_lngs, driver_lngs])
+    if lats.size == 0:
+        return []
+    angle = max_km / EARTH_RADIUS_KM
+    cell_lat = degrees(angle)
+    # Degrees of longitude widen towards the poles; size for the worst row
+    # (same bound as geo.bounding_box)
+    widest = min(89.0, float(np.abs(lats).max()) + cell_lat)
+    min_lng = degrees(asin(min(1.0, sin(angle) / cos(radians(widest)))))
+    # Whole columns around the globe, so the wrap at the antimeridian is
+    # one more neighbouring column
+    n_columns = max(1, int(360 // min_lng))
+    rows = np.floor((lats + 90) / cell_lat).astype(np.int64)
+    columns = np.floor((lngs + 180) / (360 / n_columns)).astype(np.int64) % n_columns
+
+    cells = {}
+    for index, key in enumerate(zip(rows.tolist(), columns.tolist())):
+        cells.setdefault(key, []).append(index)
+    parent = {key: key for key in cells}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for row, column in cells:
+        for d_row in (-1, 0, 1):
+            for d_column in (-1, 0, 1):
+                other = (row + d_row, (column + d_column) % n_columns)
+                if other in parent:
+                    a, b = find((row, column)), find(other)
+                    if a != b:
+                        parent[a] = b
+
+    members = {}
+    for key, indices in cells.items():
+        members.setdefault(find(key), []).extend(indices)
+    n_orders = len(order_lats)
+    groups = []
+    for indices in members.values():
+        indices = np.sort(np.asarray(indices))
+        orders = indices[indices < n_orders]
+        drivers = indices[indices >= n_orders] - n_orders
+        if orders.size and drivers.size:
+            groups.append((orders, drivers))
+    return groups
+
+
+def _auction(cost):
+    """
+    Minimum-cost assignment of a square integer matrix by the auction
+    algorithm (Jacobi bidding, epsilon scaling down to below ``1/n``, which
+    makes the result optimal). Returns the column of every row.
+    """
+    n = cost.shape[0]
+    benefit = -cost.astype(np.float64)
+    prices = np.zeros(n)
+    eps = max(1.0, float(np.ptp(cost))) / 4
+    final_eps = 1.0 / (n + 1)
+    rows = np.arange(n)
+    while True:
+        owner = np.full(n, -1)
+        assigned = np.full(n, -1)
+        bidders = rows
+        while bidders.size:
+            values = benefit[bidders] - prices
+            best = values.argmax(axis=1)
+            picks = np.arange(bidders.size)
+            top = values[picks, best]
+            values[picks, best] = -np.inf
+            second = values.max(axis=1) if n > 1 else top
+            bids = prices[best] + (top - second) + eps
+            # Highest bid for each object wins it
+            ranked = np.lexsort((-bids, best))
+            first = np.ones(ranked.size, dtype=bool)
+            first[1:] = best[ranked][1:] != best[ranked][:-1]
+            winners = ranked[first]
+            objects = best[winners]
+            displaced = owner[objects]
+            prices[objects] = bids[winners]
+            owner[objects] = bidders[winners]
+            assigned[bidders[winners]] = objects
+            displaced = displaced[displaced >= 0]
+            assigned[displaced] = -1
+            losing = np.ones(bidders.size, dtype=bool)
+            losing[winners] = False
+            bidders = np.concatenate([bidders[losing], displaced])
+        if eps <= final_eps:
+            return assigned
+        eps = max(eps / 5, final_eps)
+
+
+def solve_assignment(cost, max_cost):
+    """
+    Optimal pairs ``(rows, columns)`` for a cost matrix, leaving out pairs
+    that cost more than ``max_cost``. Those entries of ``cost`` are
+    overwritten; the ones of the returned pairs are not.
+    """
+    n_rows, n_columns = cost.shape
+    if n_rows == 0 or n_columns == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    infeasible = cost > max_cost
+    # Bigger than any sum of feasible costs: the count of feasible pairs
+    # comes first, their total distance second
+    penalty = max_cost * (min(n_rows, n_columns) + 1) + 1
+    if linear_sum_assignment is not None:
+        cost[infeasible] = penalty
+        rows, columns = linear_sum_assignment(cost)
+    else:
+        size = max(n_rows, n_columns)
+        metres = np.zeros((size, size), dtype=np.int64)
+        penalty_metres = int(np.ceil(penalty * 1000))
+        metres[:n_rows, :n_columns] = np.rint(cost * 1000)
+        metres[:n_rows, :n_columns][infeasible] = penalty_metres
+        # Padding columns stand for "no driver", which is never cheaper
+        # than a real one; padding rows take any driver for free
+        metres[:n_rows, n_columns:] = penalty_metres
+        columns = _auction(metres)[:n_rows]
+        rows = np.arange(n_rows)
+        keep = columns < n_columns
+        rows, columns = rows[keep], columns[keep]
+    keep = ~infeasible[rows, columns]
+    return rows[keep], columns[keep]
+
+
+def plan_dispatch(order_ids, order_lats, order_lngs, driver_ids, driver_lats, driver_lngs, max_km):
+    """``[(order_id, driver_id, pickup_km), ...]`` for the optimal assignment."""
+    order_lats, order_lngs = np.asarray(order_lats, float), np.asarray(order_lngs, float)
+    driver_lats, driver_lngs = np.asarray(driver_lats, float), np.asarray(driver_lngs, float)
+    plan = []
+    for orders, drivers in reachable_groups(order_lats, order_lngs, driver_lats, driver_lngs, max_km):
+        cost = haversine_matrix_km(order_lats[orders], order_lngs[orders],
+                                   driver_lats[drivers], driver_lngs[drivers])
+        rows, columns = solve_assignment(cost, max_km)
+        plan.extend((order_ids[orders[r]], driver_ids[drivers[c]], float(cost[r, c]))
+                    for r, c in zip(rows.tolist(), columns.tolist()))
+    return plan
+
+
+def _candidates(max_orders, max_drivers):
+    orders = (db.session.query(Order.id, Order.pickup_lat, Order.pickup_lng)
+              .filter(Order.status == OrderStatus.PENDING.value,
+                      Order.pickup_lat.isnot(None), Order.pickup_lng.isnot(None))
+              # Oldest first, so a backlog is worked off in order
+              .order_by(Order.created_at, Order.id)
+              .limit(max_orders).all())
+    busy = (db.select(Order.id)
+            .where(Order.driver_id == Driver.id, Order.status.in_(ACTIVE_STATUSES))
+            .exists())
+    drivers = (db.session.query(Driver.id, Driver.current_lat, Driver.current_lng)
+               .join(User, User.id == Driver.user_id)
+               .filter(Driver.is_available.is_(True), Driver.is_verified.is_(True),
+                       Driver.current_lat.isnot(None), Driver.current_lng.isnot(None),
+                       User.is_active.isnot(False), ~busy)
+               .order_by(Driver.id)
+               .limit(max_drivers).all())
+    return orders, drivers
+
+
+def run_dispatch(max_km=None, max_orders=None, max_drivers=None):
+    """
+    One dispatch round inside an app context; commits the assignments.
+    Returns ``{"orders", "drivers", "planned", "assigned", "seconds"}``.
+    """
+    config = current_app.config
+    max_km = max_km or config.get('DISPATCH_MAX_PICKUP_KM', 15)
+    started = time.perf_counter()
+    orders, drivers = _candidates(max_orders or config.get('DISPATCH_MAX_ORDERS', 10000),
+                                  max_drivers or config.get('DISPATCH_MAX_DRIVERS', 10000))
+    plan = []
+    if orders and drivers:
+        order_ids, order_lats, order_lngs = zip(*orders)
+        driver_ids, driver_lats, driver_lngs = zip(*drivers)
+        plan = plan_dispatch(order_ids, order_lats, order_lngs, driver_ids, driver_lats, driver_lngs, max_km)
+    # Release the read snapshot before writing
+    db.session.commit()
+
+    changes = assign_orders([(order_id, driver_id) for order_id, driver_id, _ in plan])
+    db.session.commit()
+    # This runs in its own process, which has no tracking streams to notify:
+    # customers see the assignment on their stream's periodic resync from
+    # the database, or when polling /track
+
+    stats = {"orders": len(orders), "drivers": len(drivers), "planned": len(plan),
+             "assigned": len(changes), "seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"Dispatch round: {stats}")
+    return stats
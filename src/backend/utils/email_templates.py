@@ -0,0 +1,32 @@
+"""
+Email bodies rendered from Jinja templates in ``backend/templates/email``.
+
+Every template is parsed and compiled once when this module is imported;
+rendering afterwards only runs the compiled code. Each email has a ``.txt``
+body and, optionally, an ``.html`` alternative (autoescaped).
+"""
+import os
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "email")
+
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    # Templates never change at runtime, so skip the mtime checks
+    auto_reload=False,
+    cache_size=-1,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=False,
+    undefined=StrictUndefined,
+)
+_templates = {name: _env.get_template(name) for name in _env.list_templates(extensions=["txt", "html"])}
+
+
+def render_email(name: str, **context):
+    """Render ``name.txt`` and ``name.html``. Returns ``(body, html)``; html is None if absent."""
+    html = _templates.get(f"{name}.html")
+    return (_templates[f"{name}.txt"].render(context),
+            html.render(context) if html is not None else None)
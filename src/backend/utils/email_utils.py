@@ -1,142 +1,154 @@
 from flask import current_app
 from flask_mail import Message
+from urllib.parse import urlencode
+from ..database import db
+from .email_templates import render_email
+from .outbox import enqueue_message
 import logging
-import secrets
-import string
 
-def send_new_user_notification(user):
+def _as_list(value):
+    # Every send_* helper takes one item or a list of them
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+def _admin_address():
+    return current_app.config.get('MAIL_DEFAULT_SENDER', 'swiftlogixindia@gmail.com')
+
+def _queue_all(messages):
+    """Queue messages for the outbox worker in one transaction"""
+    for msg in messages:
+        enqueue_message(msg, commit=False)
+    db.session.commit()
+
+def _expires_in():
+    minutes = current_app.config.get('PASSWORD_RESET_TTL_MINUTES', 60)
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        return f"{hours} hour" if hours == 1 else f"{hours} hours"
+    return f"{minutes} minutes"
+
+def send_new_user_notification(users):
     """
-    Send email notification to admin when a new user registers
+    Send email notification to admin when one or more new users register
     """
     try:
-        mail = current_app.extensions['mail']
-        
-        # Create email message
-        msg = Message(
-            subject=f"New User Registration - {user.name}",
-            recipients=[current_app.config.get('MAIL_DEFAULT_SENDER', 'swiftlogixindia@gmail.com')],
-            body=f"""
-A new user has registered on SwiftLogix:
-
-Name: {user.name}
-Email: {user.email}
-Role: {user.role}
-Registration Date: {user.created_at}
-
-Please review this user in the admin panel.
-            """,
-            html=f"""
-            <h2>New User Registration</h2>
-            <p>A new user has registered on SwiftLogix:</p>
-            <ul>
-                <li><strong>Name:</strong> {user.name}</li>
-                <li><strong>Email:</strong> {user.email}</li>
-                <li><strong>Role:</strong> {user.role}</li>
-                <li><strong>Registration Date:</strong> {user.created_at}</li>
-            </ul>
-            <p>Please review this user in the <a href="http://localhost:5000/admin/manage_users">admin panel</a>.</p>
-            """
-        )
-        
-        # Send email
-        mail.send(msg)
-        logging.info(f"New user notification sent for {user.email}")
-        
+        base_url = current_app.config.get('APP_BASE_URL', 'http://localhost:5000')
+        messages = []
+        for user in _as_list(users):
+            body, html = render_email('new_user', user=user, base_url=base_url)
+            messages.append(Message(
+                subject=f"New User Registration - {user.name}",
+                recipients=[_admin_address()],
+                body=body,
+                html=html,
+            ))
+
+        # Queue emails for the outbox worker
+        _queue_all(messages)
+        logging.info(f"{len(messages)} new user notification(s) queued")
+
     except Exception as e:
         logging.error(f"Failed to send new user notification: {str(e)}")
 
-def send_password_reset_email(user, reset_token=None):
+def send_password_reset_email(users, reset_tokens):
     """
-    Send password reset email to user
+    Send password reset email to one or more users; ``reset_tokens`` lines up
+    with ``users`` and must already be stored (see auth_routes.forgot_password)
     """
     try:
-        mail = current_app.extensions['mail']
-        
-        # Use provided token or generate a new one
-        if reset_token is None:
-            reset_token = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
-        
-        # In a real application, you would store this token in the database
-        # associated with the user and set an expiration time
-        
-        reset_link = f"http://localhost:5000/reset-password?token={reset_token}&email={user.email}"
-        
-        # Create email message
-        msg = Message(
-            subject="Password Reset Request - SwiftLogix",
-            recipients=[user.email],
-            bcc=[current_app.config.get('MAIL_DEFAULT_SENDER', 'swiftlogixindia@gmail.com')],
-            body=f"""
-Hello {user.name},
-
-You have requested to reset your password for your SwiftLogix account.
-
-Please click the link below to reset your password:
-{reset_link}
-
-If you did not request this, please ignore this email.
-
-This link will expire in 1 hour.
-
-Thank you,
-SwiftLogix Team
-            """,
-            html=f"""
-            <h2>Password Reset Request</h2>
-            <p>Hello {user.name},</p>
-            <p>You have requested to reset your password for your SwiftLogix account.</p>
-            <p><a href="{reset_link}" style="background-color: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Reset Password</a></p>
-            <p>If you did not request this, please ignore this email.</p>
-            <p><strong>Note:</strong> This link will expire in 1 hour.</p>
-            <br>
-            <p>Thank you,<br>SwiftLogix Team</p>
-            """
-        )
-        
-        # Send email
-        mail.send(msg)
-        logging.info(f"Password reset email sent to {user.email}")
-        
+        users = _as_list(users)
+        reset_tokens = _as_list(reset_tokens)
+        if len(reset_tokens) != len(users):
+            raise ValueError("Need one reset token per user")
+
+        base_url = current_app.config.get('APP_BASE_URL', 'http://localhost:5000')
+        expires_in = _expires_in()
+        messages = []
+        for user, reset_token in zip(users, reset_tokens):
+            reset_link = f"{base_url}/reset-password?{urlencode({'token': reset_token, 'email': user.email})}"
+            body, html = render_email('password_reset', user=user, reset_link=reset_link, expires_in=expires_in)
+            messages.append(Message(
+                subject="Password Reset Request - SwiftLogix",
+                recipients=[user.email],
+                bcc=[_admin_address()],
+                body=body,
+                html=html,
+            ))
+
+        # Queue emails for the outbox worker
+        _queue_all(messages)
+        logging.info(f"Password reset email queued for {', '.join(u.email for u in users)}")
+
     except Exception as e:
         logging.error(f"Failed to send password reset email: {str(e)}")
         raise
 
-def send_password_reset_confirmation(user):
+def send_password_reset_confirmation(users):
     """
-    Send password reset confirmation email to user and admin
+    Send password reset confirmation email to one or more users and the admin
     """
     try:
-        mail = current_app.extensions['mail']
-        
-        # Create email message to user
-        msg_to_user = Message(
-            subject="Password Reset Confirmation - SwiftLogix",
-            recipients=[user.email],
-            bcc=[current_app.config.get('MAIL_DEFAULT_SENDER', 'swiftlogixindia@gmail.com')],
-            body=f"""
-Hello {user.name},
-
-Your password for your SwiftLogix account has been successfully reset.
-
-If you did not request this change, please contact our support team immediately.
-
-Thank you,
-SwiftLogix Team
-            """,
-            html=f"""
-            <h2>Password Reset Confirmation</h2>
-            <p>Hello {user.name},</p>
-            <p>Your password for your SwiftLogix account has been successfully reset.</p>
-            <p>If you did not request this change, please contact our support team immediately.</p>
-            <br>
-            <p>Thank you,<br>SwiftLogix Team</p>
-            """
-        )
-        
-        # Send email to user
-        mail.send(msg_to_user)
-        logging.info(f"Password reset confirmation sent to {user.email}")
-        
+        users = _as_list(users)
+        messages = []
+        for user in users:
+            body, html = render_email('password_reset_confirmation', user=user)
+            messages.append(Message(
+                subject="Password Reset Confirmation - SwiftLogix",
+                recipients=[user.email],
+                bcc=[_admin_address()],
+                body=body,
+                html=html,
+            ))
+
+        # Queue emails to users for the outbox worker
+        _queue_all(messages)
+        logging.info(f"Password reset confirmation queued for {', '.join(u.email for u in users)}")
+
     except Exception as e:
         logging.error(f"Failed to send password reset confirmation: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def send_support_chat(user, role, message):
+    """
+    Forward a support chatbot message from a customer or driver to the admin mailbox
+    """
+    body, _ = render_email('support_chat', user=user, role=role, message=message)
+    msg = Message(
+        subject=f"{role.capitalize()} Support Chat - {user.email}",
+        recipients=['swiftlogixindia@gmail.com'],
+        body=body,
+    )
+    enqueue_message(msg)
+    logging.info(f"Chat message queued from {role} {user.email}")
+
+
+def send_bulk_import_summary(result, admin_email=None, source=None):
+    """
+    Send one summary email to the admins after a bulk user import, instead
+    of a new-user notification per imported row
+    """
+    try:
+        summary = result.to_dict()
+        by_role = ", ".join(f"{role}: {count}" for role, count in summary["created_by_role"].items())
+        body, html = render_email(
+            'bulk_import_summary',
+            summary=summary,
+            errors=summary["errors"][:20],
+            by_role=by_role,
+            admin_email=admin_email,
+            source=source,
+            base_url=current_app.config.get('APP_BASE_URL', 'http://localhost:5000'),
+        )
+
+        msg = Message(
+            subject=f"Bulk User Import - {summary['created']} created, {summary['failed']} failed",
+            recipients=[_admin_address()],
+            body=body,
+            html=html,
+        )
+
+        # Queue email for the outbox worker
+        enqueue_message(msg)
+        logging.info(f"Bulk import summary queued: created={summary['created']} failed={summary['failed']}")
+
+    except Exception as e:
+        logging.error(f"Failed to send bulk import summary: {str(e)}")
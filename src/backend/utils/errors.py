@@ -0,0 +1,8 @@
+"""
+Exceptions that app-level error handlers turn into responses (see app.py).
+``role_required`` re-raises these instead of answering 401.
+"""
+
+
+class HandledError(Exception):
+    """Base for errors that have an app-level handler."""
@@ -0,0 +1,123 @@
+"""
+Geohash cells for proximity queries.
+
+Every order stores the geohash of its pickup point (``Order.pickup_cell``,
+``CELL_PRECISION`` characters, about 1.2 x 0.6 km). All points in a cell
+share the cell's prefixes, so the orders in a coarser cell are one index
+range: ``prefix <= pickup_cell < prefix + "{"`` ("{" sorts right after "z").
+
+``covering_prefixes`` picks the finest precision at which at most
+``max_cells`` cells cover the bounding box of a circle; ``covering_ranges``
+merges neighbouring cells into contiguous key ranges. The driver feed scans
+those ranges, keeps the rows inside the box and ranks them by haversine
+distance.
+"""
+from math import asin, cos, degrees, floor, radians, sin
+
+from .pricing import EARTH_RADIUS_KM
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+CELL_PRECISION = 6
+# Sorts after every geohash character, closing a prefix range
+RANGE_END = "{"
+
+
+def encode(lat: float, lng: float, precision: int = CELL_PRECISION) -> str:
+    """Geohash of a point; longitude and latitude bits interleave, longitude first."""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value, lng_lo = value * 2 + 1, mid
+            else:
+                value, lng_hi = value * 2, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value, lat_lo = value * 2 + 1, mid
+            else:
+                value, lat_hi = value * 2, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value = bits = 0
+    return "".join(chars)
+
+
+def pickup_cell(lat, lng):
+    """``Order.pickup_cell`` for a pickup point, or None without coordinates."""
+    if lat is None or lng is None:
+        return None
+    return encode(lat, lng)
+
+
+def cell_size(precision: int):
+    """``(height, width)`` of a cell in degrees."""
+    bits = 5 * precision
+    return 180.0 / (1 << (bits // 2)), 360.0 / (1 << ((bits + 1) // 2))
+
+
+def bounding_box(lat: float, lng: float, radius_km: float):
+    """
+    ``(south, north, lng_ranges)`` enclosing the circle; ``lng_ranges`` is
+    one ``(west, east)`` pair, or two where the box crosses the antimeridian.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    south, north = lat - degrees(angle), lat + degrees(angle)
+    if south <= -90 or north >= 90:
+        # The circle contains a pole: every longitude is in range
+        return max(south, -90.0), min(north, 90.0), [(-180.0, 180.0)]
+    delta = degrees(asin(min(1.0, sin(angle) / cos(radians(lat)))))
+    west, east = lng - delta, lng + delta
+    if west < -180:
+        return south, north, [(west + 360, 180.0), (-180.0, east)]
+    if east > 180:
+        return south, north, [(west, 180.0), (-180.0, east - 360)]
+    return south, north, [(west, east)]
+
+
+def _cell_centres(low, high, size, origin):
+    """Centres of the cells (``size`` degrees wide from ``origin``) overlapping ``[low, high]``."""
+    first = floor((low - origin) / size)
+    # The top edge (90 or 180 degrees) belongs to the last cell
+    last = min(floor((high - origin) / size), round(-2 * origin / size) - 1)
+    return [origin + (step + 0.5) * size for step in range(first, last + 1)]
+
+
+def covering_prefixes(lat: float, lng: float, radius_km: float, max_cells: int = 32):
+    """Sorted geohash prefixes whose cells together cover the circle's bounding box."""
+    south, north, lng_ranges = bounding_box(lat, lng, radius_km)
+    for precision in range(CELL_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = _cell_centres(south, north, height, -90.0)
+        columns = [c for west, east in lng_ranges for c in _cell_centres(west, east, width, -180.0)]
+        if len(rows) * len(columns) <= max_cells:
+            break
+    return sorted({encode(row, column, precision) for row in rows for column in columns})
+
+
+def _successor(prefix):
+    """The next geohash of the same length, or None after "zzz..."."""
+    position = BASE32.index(prefix[-1]) + 1
+    if position < len(BASE32):
+        return prefix[:-1] + BASE32[position]
+    if len(prefix) == 1:
+        return None
+    head = _successor(prefix[:-1])
+    return None if head is None else head + BASE32[0]
+
+
+def covering_ranges(lat: float, lng: float, radius_km: float, max_cells: int = 32):
+    """``covering_prefixes`` as ``[(low, high), ...]`` key ranges, ``low <= cell < high``."""
+    ranges = []
+    for prefix in covering_prefixes(lat, lng, radius_km, max_cells):
+        if ranges and _successor(ranges[-1][1]) == prefix:
+            ranges[-1][1] = prefix
+        else:
+            ranges.append([prefix, prefix])
+    return [(first, last + RANGE_END) for first, last in ranges]
@@ -0,0 +1,257 @@
+"""
+Public identifiers: 9-digit customer/driver ids and ``ORDyyyymmddNNNN``
+order ids.
+
+Each process claims one of ``ID_WORKER_SLOTS`` worker slots by locking a
+slot file under ``ID_STATE_DIR``, and ids are partitioned by slot, so two
+workers can never produce the same id and nothing has to be retried against
+the database.
+
+The slot file keeps a high-water mark that is written ``ID_RESERVE_BLOCK``
+sequences ahead (one fsync per block), so a restarted worker resumes above
+anything it may have issued. The state directory may not survive a
+redeploy, so the first time a worker uses a slot it also seeds the sequence
+from the highest id of that slot already stored in the database.
+
+- 9-digit ids: 100000000 + sequence * ID_WORKER_SLOTS + slot. The per-worker
+  sequence is a logical clock, ``max(previous + 1, ticks since the epoch)``
+  with a 10 s tick from 2025-01-01, which lasts until about 2042 with 16
+  slots. Ids therefore follow creation time across workers (k-sortable) and
+  stay monotonic within a worker even if the wall clock steps back. A burst
+  runs the worker's clock ahead, by at most ``PUBLIC_ID_MAX_LEAD`` ticks;
+  that bound is also how far ahead the database seed looks. Ids issued by
+  the old random generator are spread over the same range; the unique
+  constraint still guards against the (very unlikely) clash with one of
+  them.
+- Order ids: the UTC date plus four digits. Slot ``s`` owns the ``s``-th
+  share of each day's 0000-9999 range (625 numbers with 16 slots) and
+  counts up from the bottom of it. A worker that fills its share locks
+  another free slot and carries on in that one's share; when none is left
+  :class:`IdSpaceExhausted` is raised rather than widening the suffix.
+  Order ids ascend within a share, not across workers.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import func
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+PUBLIC_ID_MIN = 100_000_000
+PUBLIC_ID_MAX = 999_999_999
+PUBLIC_ID_TICK = 10.0
+PUBLIC_ID_MAX_LEAD = 7 * 86400 // int(PUBLIC_ID_TICK)
+ORDER_DIGITS = 4
+
+
+class IdSpaceExhausted(RuntimeError):
+    """No id of the fixed width is left for this worker."""
+
+
+def _settings():
+    if has_app_context():
+        config = current_app.config
+    else:
+        from ..config import BaseConfig
+        config = {k: getattr(BaseConfig, k) for k in dir(BaseConfig) if k.startswith("ID_")}
+    return (config.get("ID_STATE_DIR"), config.get("ID_WORKER_SLOTS", 16),
+            config.get("ID_WORKER_RANGE"), config.get("ID_RESERVE_BLOCK", 64))
+
+
+def _try_lock(fd) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _stored_max(column, low, high, *criteria):
+    """Highest stored ``column`` value in ``[low, high]``, or None."""
+    if not has_app_context():
+        return None
+    from ..database import db
+    # Ids are drawn while rows are being built; don't flush them half-done
+    with db.session.no_autoflush:
+        return (db.session.query(func.max(column))
+                .filter(column >= low, column <= high, *criteria).scalar())
+
+
+class _Slot:
+    """A locked slot file holding this worker's high-water marks."""
+
+    def __init__(self, fd, number, reserve_block):
+        self.fd = fd
+        self.number = number
+        self.reserve_block = reserve_block
+        os.lseek(fd, 0, os.SEEK_SET)
+        raw = os.read(fd, 4096)
+        try:
+            self.state = json.loads(raw.decode() or "{}")
+        except ValueError:
+            self.state = {}
+        # Everything up to the stored marks may have been issued already
+        self.reserved = dict(self.state)
+
+    def reserve(self, key, sequence):
+        """Make sure ``sequence`` is covered by the persisted mark for ``key``."""
+        if sequence < self.reserved.get(key, 0):
+            return
+        self.state[key] = self.reserved[key] = sequence + self.reserve_block
+        data = json.dumps(self.state).encode()
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.write(self.fd, data)
+        os.ftruncate(self.fd, len(data))
+        os.fsync(self.fd)
+
+
+class IdService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slot = None
+        self._pid = None
+        self._slots = None
+        self._last = {}
+        # Slots whose share of ``_order_day`` this worker fills, current last
+        self._order_slots = []
+        self._order_day = None
+
+    def _open_slot(self):
+        """Lock the first free slot file in this worker's range, or None."""
+        state_dir, slots, worker_range, reserve_block = _settings()
+        first, last = 0, slots - 1
+        if worker_range:
+            first, _, last = str(worker_range).partition("-")
+            first, last = int(first), int(last or first)
+        os.makedirs(state_dir, exist_ok=True)
+        for number in range(first, last + 1):
+            fd = os.open(os.path.join(state_dir, f"slot-{number:02d}"), os.O_RDWR | os.O_CREAT, 0o644)
+            if _try_lock(fd):
+                return _Slot(fd, number, reserve_block)
+            os.close(fd)
+        return None
+
+    def _claim(self):
+        # Locks are per process; a forked worker claims a slot of its own
+        if self._pid == os.getpid():
+            return self._slot
+        slot = self._open_slot()
+        if slot is None:
+            state_dir, _, worker_range, _ = _settings()
+            raise RuntimeError(f"No free id worker slot in {state_dir} ({worker_range or 'all'}); "
+                               "raise ID_WORKER_SLOTS or ID_WORKER_RANGE")
+        self._slot = slot
+        self._slots = _settings()[1]
+        self._pid = os.getpid()
+        self._last = {}
+        self._order_slots, self._order_day = [slot], None
+        return slot
+
+    def _next(self, slot, key, count, floor, limit, seed):
+        """Up to ``count`` consecutive sequences of ``slot`` for ``key``, none
+        below ``floor`` and all below ``limit``.
+
+        On first use the sequence resumes above the slot file's mark and above
+        ``seed()``, the first sequence the database shows to be unused.
+        """
+        last = self._last.get((slot.number, key))
+        if last is None:
+            last = max(slot.reserved.get(key, 0), seed()) - 1
+        start = max(last + 1, floor)
+        end = min(start + count, limit) - 1
+        if end < start:
+            return []
+        slot.reserve(key, end)
+        self._last[(slot.number, key)] = end
+        return list(range(start, end + 1))
+
+    def _public_seed(self, slot, ticks):
+        from ..models import Customer, Driver
+        # Only this slot's ids ahead of the clock matter; the floor covers the rest
+        low = PUBLIC_ID_MIN + ticks * self._slots
+        high = PUBLIC_ID_MIN + (ticks + PUBLIC_ID_MAX_LEAD + 1) * self._slots
+        highest = max(_stored_max(column, low, high, (column - PUBLIC_ID_MIN) % self._slots == slot.number) or 0
+                      for column in (Customer.customer_id, Driver.driver_id))
+        return (highest - PUBLIC_ID_MIN) // self._slots + 1 if highest else 0
+
+    def public_ids(self, count=1, now=None):
+        """``count`` 9-digit ids for customers or drivers, in ascending order."""
+        ticks = int(((now or time.time()) - _EPOCH) / PUBLIC_ID_TICK)
+        with self._lock:
+            slot = self._claim()
+            limit = min(ticks + PUBLIC_ID_MAX_LEAD,
+                        (PUBLIC_ID_MAX - PUBLIC_ID_MIN - slot.number) // self._slots) + 1
+            sequences = self._next(slot, "public", count, ticks, limit,
+                                   lambda: self._public_seed(slot, ticks))
+            if len(sequences) < count:
+                raise IdSpaceExhausted(f"Worker slot {slot.number} is out of 9-digit ids "
+                                       f"{PUBLIC_ID_MAX_LEAD * PUBLIC_ID_TICK / 86400:g} days ahead of the clock")
+            return [PUBLIC_ID_MIN + s * self._slots + slot.number for s in sequences]
+
+    def public_id(self, now=None):
+        return self.public_ids(1, now)[0]
+
+    def _start_order_day(self, day):
+        # A new day starts over in this worker's own slot
+        for slot in self._order_slots[1:]:
+            os.close(slot.fd)
+        self._order_slots, self._order_day = [self._slot], day
+        # Only today's mark is worth keeping in the slot file
+        key = f"order:{day}"
+        for stale in [k for k in self._slot.state if k.startswith("order:") and k != key]:
+            del self._slot.state[stale]
+            self._slot.reserved.pop(stale, None)
+        self._last = {k: v for k, v in self._last.items() if not (k[1].startswith("order:") and k[1] != key)}
+
+    def _order_seed(self, slot, day, share):
+        from ..models import Order
+        low = f"ORD{day}{slot.number * share:0{ORDER_DIGITS}d}"
+        high = f"ORD{day}{slot.number * share + share - 1:0{ORDER_DIGITS}d}"
+        highest = _stored_max(Order.public_id, low, high, func.length(Order.public_id) == len(low))
+        return int(highest[-ORDER_DIGITS:]) - slot.number * share + 1 if highest else 0
+
+    def order_ids(self, count=1, now=None):
+        """``count`` ``ORDyyyymmddNNNN`` ids, unique and always 15 characters."""
+        day = datetime.fromtimestamp(now or time.time(), tz=timezone.utc).strftime("%Y%m%d")
+        key = f"order:{day}"
+        numbers = []
+        with self._lock:
+            self._claim()
+            if self._order_day != day:
+                self._start_order_day(day)
+            share = 10 ** ORDER_DIGITS // self._slots
+            while True:
+                slot = self._order_slots[-1]
+                sequences = self._next(slot, key, count - len(numbers), 0, share,
+                                       lambda: self._order_seed(slot, day, share))
+                numbers.extend(slot.number * share + s for s in sequences)
+                if len(numbers) == count:
+                    break
+                extra = self._open_slot()
+                if extra is None:
+                    raise IdSpaceExhausted(f"Order ids for {day} are used up in every free worker slot")
+                self._order_slots.append(extra)
+        return [f"ORD{day}{n:0{ORDER_DIGITS}d}" for n in numbers]
+
+    def order_id(self, now=None):
+        return self.order_ids(1, now)[0]
+
+    @property
+    def worker(self):
+        with self._lock:
+            return self._claim().number
+
+
+id_service = IdService()
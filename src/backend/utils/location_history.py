@@ -0,0 +1,233 @@
+"""
+Compact history of driver locations.
+
+Every fix the location buffer receives (utils/locations.py) is also appended
+to a per-driver ring buffer of fixed-width 16-byte records (``FIX``). Every
+``LOCATION_HISTORY_FLUSH_INTERVAL`` seconds the buffered fixes are written
+to ``LocationTrack``, an append-only table of segments: one row per driver
+and clock hour, with the span, the number of fixes and the fixes packed as
+12-byte ``POINT`` records
+
+    uint32  ms since the segment's start_seq
+    int32   latitude in 1e-7 degrees (about 1 cm)
+    int32   longitude in 1e-7 degrees
+
+so a day of pings every 4 seconds is about 260 KB per driver. A segment
+never spans more than an hour, which bounds the offsets and lets range
+queries use the ``(driver_id, start_seq)`` index alone.
+
+Segments with ``resolution`` 0 hold every fix. ``sweep_history`` (``flask
+location-history-sweep``) merges the ones older than
+``LOCATION_HISTORY_FULL_HOURS`` into one segment per driver and hour that
+keeps the first fix of every ``LOCATION_HISTORY_DOWNSAMPLE_SECONDS``, and
+deletes segments older than ``LOCATION_HISTORY_RETENTION_DAYS``.
+"""
+import struct
+import time
+from datetime import timezone
+
+from ..database import db
+from ..models import LocationTrack, OrderStatus
+
+# One buffered fix: ms since the epoch, then latitude and longitude
+FIX = struct.Struct("<qii")
+# One stored fix: ms since the segment's start_seq, then the same coordinates
+POINT = struct.Struct("<Iii")
+SCALE = 10_000_000
+HOUR_MS = 3_600_000
+
+_TERMINAL = (OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value)
+
+
+def pack_fix(seq, lat, lng) -> bytes:
+    return FIX.pack(seq, round(lat * SCALE), round(lng * SCALE))
+
+
+def _unique(fixes):
+    """Sorted ``fixes`` with one fix per timestamp."""
+    kept, last = [], None
+    for fix in fixes:
+        if fix[0] != last:
+            kept.append(fix)
+            last = fix[0]
+    return kept
+
+
+def downsample(fixes, step_ms: int):
+    """The first of sorted ``fixes`` in every ``step_ms`` window."""
+    if step_ms <= 0:
+        return fixes
+    kept, window = [], None
+    for fix in fixes:
+        if fix[0] // step_ms != window:
+            kept.append(fix)
+            window = fix[0] // step_ms
+    return kept
+
+
+def _segments(driver_id, fixes, resolution=0):
+    """``LocationTrack`` rows for sorted, unique ``fixes``, one per clock hour."""
+    rows = []
+    hour = start = None
+    points = []
+    for seq, lat, lng in fixes:
+        if seq // HOUR_MS != hour:
+            if points:
+                rows.append(_segment(driver_id, start, end, resolution, points))
+            hour, start, points = seq // HOUR_MS, seq, []
+        points.append(POINT.pack(seq - start, lat, lng))
+        end = seq
+    if points:
+        rows.append(_segment(driver_id, start, end, resolution, points))
+    return rows
+
+
+def _segment(driver_id, start, end, resolution, points):
+    return {"driver_id": driver_id, "start_seq": start, "end_seq": end, "resolution": resolution,
+            "count": len(points), "points": b"".join(points)}
+
+
+def _decode(start_seq, points):
+    return [(start_seq + offset, lat, lng) for offset, lat, lng in POINT.iter_unpack(points)]
+
+
+def append_segments(trails):
+    """
+    Insert the fixes of ``{driver_id: packed FIX records}`` as
+    full-resolution segments; the caller commits.
+    """
+    rows = []
+    for driver_id, buffer in trails.items():
+        rows.extend(_segments(driver_id, _unique(sorted(FIX.iter_unpack(buffer)))))
+    if rows:
+        db.session.execute(LocationTrack.__table__.insert(), rows)
+    return len(rows)
+
+
+def driver_track(driver_id, since_seq: int, until_seq: int, step_ms: int = 0, max_points=None):
+    """
+    ``[(seq, lat, lng), ...]`` of the driver between two times in ms
+    (inclusive), oldest first, at most one per ``step_ms``. Above
+    ``max_points`` fixes an evenly spaced subset is returned.
+    """
+    rows = db.session.execute(
+        db.select(LocationTrack.start_seq, LocationTrack.points)
+        .where(LocationTrack.driver_id == driver_id,
+               # Segments never span an hour
+               LocationTrack.start_seq > since_seq - HOUR_MS, LocationTrack.start_seq <= until_seq,
+               LocationTrack.end_seq >= since_seq)).all()
+    fixes = _unique(sorted(fix for start, points in rows for fix in _decode(start, points)
+                           if since_seq <= fix[0] <= until_seq))
+    fixes = downsample(fixes, step_ms)
+    if max_points and len(fixes) > max_points:
+        stride = len(fixes) / max_points
+        fixes = [fixes[int(i * stride)] for i in range(max_points)]
+    return [(seq, lat / SCALE, lng / SCALE) for seq, lat, lng in fixes]
+
+
+def to_seq(value) -> int:
+    """ms since the epoch for a naive UTC datetime (as the models store them)."""
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def order_window(status, assigned_at, created_at, updated_at):
+    """
+    ``(since, until)`` in ms during which the order's driver was on it: from
+    the assignment (or creation, for orders assigned before that was stored)
+    until delivery or cancellation, or now.
+    """
+    since = to_seq(assigned_at or created_at)
+    until = to_seq(updated_at) if status in _TERMINAL and updated_at else int(time.time() * 1000)
+    return since, max(since, until)
+
+
+# -- tiering and retention ----------------------------------------------------
+
+def _raw_hours(cutoff):
+    """Start of every hour before ``cutoff`` that has full-resolution segments."""
+    while True:
+        first = db.session.scalar(db.select(db.func.min(LocationTrack.start_seq))
+                                  .where(LocationTrack.resolution == 0, LocationTrack.start_seq < cutoff))
+        if first is None:
+            return
+        yield first - first % HOUR_MS
+
+
+def _compact_hour(hour, step_ms, chunk_size):
+    """Downsample one hour of full-resolution segments, ``chunk_size`` drivers per transaction."""
+    in_hour = (LocationTrack.resolution == 0, LocationTrack.start_seq >= hour,
+               LocationTrack.start_seq < hour + HOUR_MS)
+    merged = written = 0
+    last_driver = 0
+    while True:
+        drivers = db.session.scalars(
+            db.select(LocationTrack.driver_id).distinct()
+            .where(*in_hour, LocationTrack.driver_id > last_driver)
+            .order_by(LocationTrack.driver_id).limit(chunk_size)).all()
+        if not drivers:
+            return merged, written
+        last_driver = drivers[-1]
+        segments = db.session.execute(
+            db.select(LocationTrack.id, LocationTrack.driver_id, LocationTrack.start_seq, LocationTrack.points)
+            .where(*in_hour, LocationTrack.driver_id.in_(drivers))).all()
+        fixes = {}
+        for _, driver_id, start, points in segments:
+            fixes.setdefault(driver_id, []).extend(_decode(start, points))
+        rows = []
+        for driver_id, driver_fixes in fixes.items():
+            rows.extend(_segments(driver_id, downsample(_unique(sorted(driver_fixes)), step_ms),
+                                  step_ms // 1000))
+        db.session.execute(LocationTrack.__table__.insert(), rows)
+        ids = [segment.id for segment in segments]
+        for start in range(0, len(ids), 500):
+            db.session.execute(db.delete(LocationTrack).where(LocationTrack.id.in_(ids[start:start + 500])))
+        db.session.commit()
+        merged += len(segments)
+        written += len(rows)
+
+
+def _resolutions():
+    """Distinct ``resolution`` values, one index seek each."""
+    value = -1
+    while True:
+        value = db.session.scalar(db.select(db.func.min(LocationTrack.resolution))
+                                  .where(LocationTrack.resolution > value))
+        if value is None:
+            return
+        yield value
+
+
+def _expire(cutoff, chunk_size):
+    deleted = 0
+    for resolution in list(_resolutions()):
+        while True:
+            ids = db.session.scalars(
+                db.select(LocationTrack.id)
+                .where(LocationTrack.resolution == resolution, LocationTrack.start_seq < cutoff)
+                .limit(chunk_size)).all()
+            if not ids:
+                break
+            db.session.execute(db.delete(LocationTrack).where(LocationTrack.id.in_(ids)))
+            db.session.commit()
+            deleted += len(ids)
+    return deleted
+
+
+def sweep_history(full_hours: float, step_seconds: int, retention_days: float, chunk_size: int = 200):
+    """
+    Downsample full-resolution segments of whole hours older than
+    ``full_hours`` and delete segments older than ``retention_days``.
+    Returns ``{"merged", "written", "deleted"}`` segment counts.
+    """
+    now = int(time.time() * 1000)
+    full_cutoff = now - int(full_hours * HOUR_MS)
+    # Whole hours only, so each driver-hour becomes one segment
+    full_cutoff -= full_cutoff % HOUR_MS
+    merged = written = 0
+    if step_seconds > 0:
+        for hour in _raw_hours(full_cutoff):
+            hour_merged, hour_written = _compact_hour(hour, step_seconds * 1000, chunk_size)
+            merged += hour_merged
+            written += hour_written
+    deleted = _expire(now - int(retention_days * 24 * HOUR_MS), chunk_size)
+    return {"merged": merged, "written": written, "deleted": deleted}
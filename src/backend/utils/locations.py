@@ -0,0 +1,195 @@
+"""
+Write-behind buffer for driver GPS pings.
+
+``POST /api/driver/location`` only records the fix here. The buffer keeps
+the newest fix per driver, and a background thread in each worker writes
+everything buffered every ``LOCATION_FLUSH_INTERVAL`` seconds with one
+executemany UPDATE in one transaction. Thousands of drivers pinging every
+few seconds then cost one short write transaction per interval per worker
+instead of a commit per ping.
+
+Every fix carries a sequence number: the time the fix was taken, in ms
+since the epoch. Clients may send it as ``seq`` (the browser's
+``position.timestamp``); otherwise the time the ping arrived is used. A fix
+older than the newest one seen for the driver is dropped. The same number
+is stored in ``Driver.location_seq``, and the UPDATE only applies to rows
+holding an older one, so workers flushing out of order cannot move a
+driver back either.
+
+Reads that show a driver's position go through ``position()``, which
+prefers a buffered fix newer than the stored one. Fixes buffered by other
+workers become visible once they flush.
+
+Every fix, including late ones, is also kept for the driver's location
+history (utils/location_history.py) in a per-driver ring of
+``LOCATION_HISTORY_RING_SIZE`` packed records, written out every
+``LOCATION_HISTORY_FLUSH_INTERVAL`` seconds.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import bindparam, or_
+
+from ..database import db
+from ..models import Driver
+from . import location_history
+
+logger = logging.getLogger(__name__)
+
+_UPDATE = (Driver.__table__.update()
+           .where(Driver.id == bindparam("b_id"),
+                  or_(Driver.location_seq.is_(None), Driver.location_seq < bindparam("b_seq")))
+           .values(current_lat=bindparam("b_lat"), current_lng=bindparam("b_lng"),
+                   location_seq=bindparam("b_seq")))
+
+
+def now_seq() -> int:
+    return int(time.time() * 1000)
+
+
+class LocationBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}   # driver_id -> (seq, lat, lng), not written yet
+        self._flushing = {}  # the batch being written right now
+        self._seen = {}      # driver_id -> newest seq accepted
+        self._trails = {}    # driver_id -> bytearray of FIX records, oldest first
+        self._history_due = 0.0
+        self._pid = None
+        self.accepted = self.dropped = self.flushed = self.flushes = 0
+        self.trail_overwritten = self.history_segments = 0
+
+    def record(self, driver_id, lat, lng, seq=None) -> bool:
+        """
+        Buffer a fix. Returns False if it is older than one already seen for
+        the driver. A ``seq`` ahead of this server's clock is treated as now.
+        """
+        seq = now_seq() if seq is None else min(int(seq), now_seq())
+        config = current_app.config
+        ring_bytes = config.get('LOCATION_HISTORY_RING_SIZE', 256) * location_history.FIX.size
+        fix = location_history.pack_fix(seq, lat, lng)
+        with self._lock:
+            # A late fix still belongs in the history
+            self._append_trail(driver_id, fix, ring_bytes)
+            if seq < self._seen.get(driver_id, -1):
+                self.dropped += 1
+                return False
+            self._seen[driver_id] = seq
+            self._pending[driver_id] = (seq, lat, lng)
+            self.accepted += 1
+        interval = config.get('LOCATION_FLUSH_INTERVAL', 2.0)
+        if interval <= 0:
+            # Write-through, e.g. for a single-process setup that wants it
+            self.flush()
+        # Still needed for the history in write-through mode
+        self._ensure_started(current_app._get_current_object(),
+                             interval if interval > 0 else config.get('LOCATION_HISTORY_FLUSH_INTERVAL', 30.0))
+        return True
+
+    def _append_trail(self, driver_id, fix, ring_bytes):
+        # Called with the lock held; the oldest records go once the ring is full
+        trail = self._trails.setdefault(driver_id, bytearray())
+        trail += fix
+        if len(trail) > ring_bytes:
+            overflow = len(trail) - ring_bytes
+            del trail[:overflow]
+            self.trail_overwritten += overflow // location_history.FIX.size
+
+    def position(self, driver_id, lat, lng, seq=None):
+        """``(lat, lng)``: a buffered fix newer than the stored ``seq``, else the stored one."""
+        with self._lock:
+            fix = self._pending.get(driver_id) or self._flushing.get(driver_id)
+        if fix is not None and (seq is None or fix[0] > seq):
+            return fix[1], fix[2]
+        return lat, lng
+
+    def flush(self, history=None) -> int:
+        """
+        Write the buffered fixes; needs an app context. Returns how many were
+        written. The history trails go along when ``history`` is True, or
+        when None and ``LOCATION_HISTORY_FLUSH_INTERVAL`` has passed.
+        """
+        config = current_app.config
+        with self._flush_lock:
+            if history is None:
+                history = time.monotonic() >= self._history_due
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+                trails = {}
+                if history:
+                    trails, self._trails = self._trails, {}
+            if history:
+                self._history_due = time.monotonic() + config.get('LOCATION_HISTORY_FLUSH_INTERVAL', 30.0)
+            if not batch and not trails:
+                return 0
+            try:
+                if batch:
+                    db.session.execute(_UPDATE, [{"b_id": driver_id, "b_seq": seq, "b_lat": lat, "b_lng": lng}
+                                                 for driver_id, (seq, lat, lng) in batch.items()])
+                segments = location_history.append_segments(trails)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                ring_bytes = config.get('LOCATION_HISTORY_RING_SIZE', 256) * location_history.FIX.size
+                with self._lock:
+                    # Keep them for the next attempt unless a newer fix arrived
+                    for driver_id, fix in batch.items():
+                        current = self._pending.get(driver_id)
+                        if current is None or current[0] < fix[0]:
+                            self._pending[driver_id] = fix
+                    for driver_id, trail in trails.items():
+                        self._append_trail(driver_id, trail + self._trails.pop(driver_id, b""), ring_bytes)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            with self._lock:
+                self.flushed += len(batch)
+                self.flushes += 1
+                self.history_segments += segments
+            return len(batch)
+
+    def _ensure_started(self, app, interval):
+        # Threads do not survive fork(); each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, args=(app, interval), name="location-flush", daemon=True).start()
+        atexit.register(self._flush_at_exit, app)
+
+    def _run(self, app, interval):
+        while True:
+            time.sleep(interval)
+            self._flush_in(app)
+
+    def _flush_in(self, app, history=None):
+        with app.app_context():
+            try:
+                self.flush(history)
+            except Exception as e:
+                logger.error(f"Location flush failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def _flush_at_exit(self, app):
+        if self._pid == os.getpid():
+            self._flush_in(app, history=True)
+
+    def stats(self):
+        with self._lock:
+            return {"buffered": len(self._pending), "accepted": self.accepted, "dropped": self.dropped,
+                    "flushed": self.flushed, "flushes": self.flushes,
+                    "trail_fixes": sum(len(trail) for trail in self._trails.values()) // location_history.FIX.size,
+                    "trail_overwritten": self.trail_overwritten, "history_segments": self.history_segments}
+
+
+location_buffer = LocationBuffer()
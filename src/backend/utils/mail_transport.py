@@ -0,0 +1,162 @@
+"""
+Pooled SMTP sessions for the outbox worker.
+
+Opening a session costs a TCP connect, STARTTLS and AUTH, which dwarfs the
+cost of sending one message. ``smtp_pool`` keeps up to ``SMTP_POOL_SIZE``
+authenticated Flask-Mail connections alive between batches. A session idle
+for longer than ``SMTP_HEALTHCHECK_AFTER`` seconds is probed with NOOP before
+reuse, sessions older than ``SMTP_MAX_SESSION_AGE`` are retired, and a
+session the server dropped mid-batch is reopened once and the message retried.
+"""
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    __slots__ = ("connection", "opened_at", "last_used", "broken")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.opened_at = self.last_used = time.monotonic()
+        self.broken = False
+
+    def close(self):
+        host = getattr(self.connection, "host", None)
+        if host is None:
+            return
+        try:
+            host.quit()
+        except Exception:
+            # The server may already have hung up; make sure the socket goes
+            try:
+                host.close()
+            except Exception:
+                pass
+
+
+class SMTPSessionPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._slots = None
+        self._pid = None
+
+    def _reset_for_process(self, size):
+        # Sockets inherited across fork() are shared with the parent; start fresh
+        if self._pid != os.getpid():
+            self._idle = deque()
+            self._slots = threading.BoundedSemaphore(size)
+            self._pid = os.getpid()
+
+    def _open(self):
+        connection = current_app.extensions["mail"].connect()
+        connection.__enter__()
+        return _Session(connection)
+
+    def _healthy(self, session, config) -> bool:
+        now = time.monotonic()
+        if now - session.opened_at > config.get("SMTP_MAX_SESSION_AGE", 300):
+            return False
+        host = session.connection.host
+        if host is None:
+            # Sending is suppressed (tests); there is nothing to probe
+            return True
+        if now - session.last_used > config.get("SMTP_HEALTHCHECK_AFTER", 30):
+            try:
+                return host.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                return False
+        return True
+
+    def _acquire(self):
+        config = current_app.config
+        with self._lock:
+            self._reset_for_process(config.get("SMTP_POOL_SIZE", 2))
+            slots = self._slots
+        slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    return self._open()
+                if self._healthy(session, config):
+                    return session
+                session.close()
+        except Exception:
+            slots.release()
+            raise
+
+    def _release(self, session, reusable):
+        slots = self._slots
+        session.last_used = time.monotonic()
+        if reusable and not session.broken:
+            with self._lock:
+                self._idle.append(session)
+        else:
+            session.close()
+        slots.release()
+
+    @contextmanager
+    def session(self):
+        """Borrow a live session; it goes back to the pool unless it broke."""
+        session = self._acquire()
+        reusable = False
+        try:
+            yield session
+            reusable = True
+        finally:
+            self._release(session, reusable)
+
+    def send_messages(self, messages):
+        """
+        Send ``messages`` back to back over one pooled session. Returns one
+        entry per message: None if it was sent, else the exception.
+        Only failing to open the first session raises.
+        """
+        results = []
+        with self.session() as session:
+            for index, msg in enumerate(messages):
+                try:
+                    session.connection.send(msg)
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    # The server dropped an idle or overused session
+                    logger.info(f"SMTP session lost ({e}), reconnecting")
+                    session.close()
+                    try:
+                        fresh = self._open()
+                    except Exception as connect_error:
+                        session.broken = True
+                        results.extend([connect_error] * (len(messages) - index))
+                        break
+                    session.connection, session.opened_at = fresh.connection, fresh.opened_at
+                    try:
+                        session.connection.send(msg)
+                    except Exception as retry_error:
+                        results.append(retry_error)
+                        continue
+                except Exception as e:
+                    results.append(e)
+                    continue
+                results.append(None)
+        return results
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for session in idle:
+            session.close()
+
+
+smtp_pool = SMTPSessionPool()
+atexit.register(smtp_pool.close_all)
@@ -0,0 +1,293 @@
+"""
+Bookkeeping for changes to orders.
+
+Every write that changes what a customer sees in their order history bumps
+``Customer.orders_version`` in the same transaction. The history endpoint
+uses that version as its ETag, so polling clients get a 304 without any
+order rows being read.
+
+The same writes keep the stored aggregates in step with the orders, so read
+endpoints never have to add up order rows:
+
+- ``Customer.total_orders`` / ``total_spent``: orders that are not
+  cancelled, and their fares. ``completed_orders``: delivered orders.
+  ``last_order_date``: when the newest order was placed.
+- ``Driver.total_deliveries`` / ``total_earnings``: delivered orders
+  assigned to the driver, and their driver shares.
+
+Each status change applies the difference between the order's old and new
+contribution as SQL increments, after a conditional UPDATE of the order
+that fails if another request changed it first. ``reconcile_customers`` and
+``reconcile_drivers`` recompute everything from the orders table in chunks
+and repair any drift (``flask reconcile-aggregates``).
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func
+
+from ..database import db
+from ..models import Customer, Driver, Order, OrderStatus
+
+# Totals are compared to the cent; float sums differ in the last bits
+_MONEY_TOLERANCE = 0.005
+# Ids per IN (...) list
+_IN_CHUNK = 500
+
+# A driver with an order in one of these is busy
+ACTIVE_STATUSES = (OrderStatus.ASSIGNED.value, OrderStatus.PICKED.value, OrderStatus.DELIVERING.value)
+
+OrderTransition = namedtuple("OrderTransition", "order_id customer_id old_status status driver_id applied")
+
+
+def orders_version_bump():
+    """Column expression for use in an existing ``Customer`` UPDATE."""
+    return db.func.coalesce(Customer.orders_version, 0) + 1
+
+
+def record_order_change(customer_id: int):
+    """Bump the customer's order-history version; the caller commits."""
+    Customer.query.filter_by(id=customer_id).update(
+        {Customer.orders_version: orders_version_bump()}, synchronize_session=False)
+
+
+def orders_version(customer_id: int):
+    """Current order-history version, or None if the customer does not exist."""
+    return db.session.query(Customer.orders_version).filter_by(id=customer_id).scalar()
+
+
+def orders_placed(count: int, fare_total: float, placed_at):
+    """``Customer`` UPDATE values for ``count`` new pending orders worth ``fare_total``."""
+    return {
+        Customer.total_orders: func.coalesce(Customer.total_orders, 0) + count,
+        Customer.total_spent: func.coalesce(Customer.total_spent, 0) + fare_total,
+        Customer.last_order_date: placed_at,
+        Customer.orders_version: orders_version_bump(),
+    }
+
+
+def _customer_share(status, fare_total):
+    """What one order adds to ``(total_orders, total_spent, completed_orders)``."""
+    if status == OrderStatus.CANCELLED.value:
+        return 0, 0.0, 0
+    return 1, fare_total or 0.0, int(status == OrderStatus.DELIVERED.value)
+
+
+def _driver_share(status, driver_id, driver_share):
+    """What one order adds to its driver's ``(total_deliveries, total_earnings)``."""
+    if driver_id is None or status != OrderStatus.DELIVERED.value:
+        return 0, 0.0
+    return 1, driver_share or 0.0
+
+
+def _bump_driver(driver_id, deliveries, earnings):
+    if driver_id is None or not (deliveries or earnings):
+        return
+    Driver.query.filter_by(id=driver_id).update({
+        Driver.total_deliveries: func.coalesce(Driver.total_deliveries, 0) + deliveries,
+        Driver.total_earnings: func.coalesce(Driver.total_earnings, 0) + earnings,
+    }, synchronize_session=False)
+
+
+def transition_order(order_id: int, status: str, driver_id=None, from_statuses=None):
+    """
+    Move an order to ``status`` (and to ``driver_id`` when given) and apply
+    the change to the customer's and drivers' aggregates. The caller commits.
+
+    Returns None if the order does not exist. ``applied`` is False when the
+    order is not in one of ``from_statuses`` or a concurrent request changed
+    it between the read and the conditional UPDATE; nothing is written then.
+    """
+    row = (db.session.query(Order.customer_id, Order.status, Order.driver_id,
+                            Order.fare_total, Order.driver_share)
+           .filter(Order.id == order_id).first())
+    if row is None:
+        return None
+    customer_id, old_status, old_driver, fare_total, share = row
+    new_driver = old_driver if driver_id is None else driver_id
+    rejected = OrderTransition(order_id, customer_id, old_status, old_status, old_driver, False)
+    if from_statuses is not None and old_status not in from_statuses:
+        return rejected
+
+    values = {Order.status: status, Order.driver_id: new_driver}
+    if status == OrderStatus.ASSIGNED.value:
+        values[Order.assigned_at] = datetime.utcnow()
+    updated = Order.query.filter(
+        Order.id == order_id,
+        Order.status == old_status,
+        Order.driver_id.is_(None) if old_driver is None else Order.driver_id == old_driver,
+    ).update(values, synchronize_session=False)
+    if updated != 1:
+        return rejected
+
+    old_orders, old_spent, old_completed = _customer_share(old_status, fare_total)
+    new_orders, new_spent, new_completed = _customer_share(status, fare_total)
+    Customer.query.filter_by(id=customer_id).update({
+        Customer.total_orders: func.coalesce(Customer.total_orders, 0) + (new_orders - old_orders),
+        Customer.total_spent: func.coalesce(Customer.total_spent, 0) + (new_spent - old_spent),
+        Customer.completed_orders: func.coalesce(Customer.completed_orders, 0) + (new_completed - old_completed),
+        Customer.orders_version: orders_version_bump(),
+    }, synchronize_session=False)
+
+    old_deliveries, old_earnings = _driver_share(old_status, old_driver, share)
+    new_deliveries, new_earnings = _driver_share(status, new_driver, share)
+    if old_driver == new_driver:
+        _bump_driver(new_driver, new_deliveries - old_deliveries, new_earnings - old_earnings)
+    else:
+        _bump_driver(old_driver, -old_deliveries, -old_earnings)
+        _bump_driver(new_driver, new_deliveries, new_earnings)
+    return OrderTransition(order_id, customer_id, old_status, status, new_driver, True)
+
+
+def assign_orders(pairs):
+    """
+    Assign pending orders to drivers, ``[(order_id, driver_id), ...]``, in
+    the caller's transaction. Orders that are no longer pending and drivers
+    who took an order in the meantime are skipped. Returns the
+    ``OrderTransition`` of every assignment made.
+
+    Pending -> assigned moves none of the totals, so besides the orders only
+    each affected customer's ``orders_version`` is bumped, once.
+    """
+    if not pairs:
+        return []
+    busy = set()
+    driver_ids = sorted({driver_id for _, driver_id in pairs})
+    for start in range(0, len(driver_ids), _IN_CHUNK):
+        busy.update(db.session.scalars(
+            db.select(Order.driver_id).where(Order.driver_id.in_(driver_ids[start:start + _IN_CHUNK]),
+                                             Order.status.in_(ACTIVE_STATUSES))))
+
+    assign = (Order.__table__.update()
+              .where(Order.id == bindparam("b_id"), Order.status == OrderStatus.PENDING.value,
+                     Order.driver_id.is_(None))
+              .values(status=OrderStatus.ASSIGNED.value, driver_id=bindparam("b_driver"),
+                      assigned_at=datetime.utcnow()))
+    assigned = {}
+    for order_id, driver_id in pairs:
+        if driver_id in busy:
+            continue
+        # One conditional UPDATE per order: its row count says whether it won
+        if db.session.execute(assign, {"b_id": order_id, "b_driver": driver_id}).rowcount == 1:
+            assigned[order_id] = driver_id
+            busy.add(driver_id)
+
+    changes, customers = [], set()
+    order_ids = sorted(assigned)
+    for start in range(0, len(order_ids), _IN_CHUNK):
+        for order_id, customer_id in db.session.execute(
+                db.select(Order.id, Order.customer_id).where(Order.id.in_(order_ids[start:start + _IN_CHUNK]))):
+            customers.add(customer_id)
+            changes.append(OrderTransition(order_id, customer_id, OrderStatus.PENDING.value,
+                                           OrderStatus.ASSIGNED.value, assigned[order_id], True))
+    customers = sorted(customers)
+    for start in range(0, len(customers), _IN_CHUNK):
+        Customer.query.filter(Customer.id.in_(customers[start:start + _IN_CHUNK])).update(
+            {Customer.orders_version: orders_version_bump()}, synchronize_session=False)
+    return changes
+
+
+# -- reconciliation -----------------------------------------------------------
+
+def _id_chunks(column, chunk_size):
+    """``(low, high]`` id ranges of at most ``chunk_size`` rows, by keyset."""
+    last = 0
+    while True:
+        ids = db.session.scalars(db.select(column).where(column > last)
+                                 .order_by(column).limit(chunk_size)).all()
+        if not ids:
+            return
+        yield last, ids[-1]
+        last = ids[-1]
+
+
+def _money_differs(stored, actual):
+    return abs((stored or 0.0) - actual) >= _MONEY_TOLERANCE
+
+
+def reconcile_customers(chunk_size: int = 500, dry_run: bool = False):
+    """
+    Recompute customer aggregates from the orders table, one chunk of
+    customers per statement and transaction, and repair rows that drifted.
+    A row whose ``orders_version`` moved since it was read is left for the
+    next run. Returns ``(checked, drifted)``, with drift counted from the
+    comparison rather than the rowcount of the repair, which drivers do not
+    report reliably for executemany.
+    """
+    not_cancelled = Order.status != OrderStatus.CANCELLED.value
+    repair = (Customer.__table__.update()
+              .where(Customer.id == bindparam("b_id"), Customer.orders_version == bindparam("b_version"))
+              .values(total_orders=bindparam("b_orders"), total_spent=bindparam("b_spent"),
+                      completed_orders=bindparam("b_completed"), last_order_date=bindparam("b_last")))
+    checked = drift = 0
+    for low, high in _id_chunks(Customer.id, chunk_size):
+        totals = (db.select(
+                      Order.customer_id.label("customer_id"),
+                      func.count(case((not_cancelled, 1))).label("orders"),
+                      func.coalesce(func.sum(case((not_cancelled, Order.fare_total), else_=0)), 0).label("spent"),
+                      func.count(case((Order.status == OrderStatus.DELIVERED.value, 1))).label("completed"),
+                      func.max(Order.created_at).label("last"))
+                  .where(Order.customer_id > low, Order.customer_id <= high)
+                  .group_by(Order.customer_id).subquery())
+        # Stored and actual values come from one statement, so one snapshot
+        rows = db.session.execute(
+            db.select(Customer.id, Customer.orders_version, Customer.total_orders, Customer.total_spent,
+                      Customer.completed_orders, Customer.last_order_date,
+                      totals.c.orders, totals.c.spent, totals.c.completed, totals.c.last)
+            .outerjoin(totals, totals.c.customer_id == Customer.id)
+            .where(Customer.id > low, Customer.id <= high)).all()
+        drifted = []
+        for (customer_id, version, total_orders, total_spent, completed, last_date,
+             orders, spent, actual_completed, actual_last) in rows:
+            orders, spent, actual_completed = orders or 0, round(spent or 0.0, 2), actual_completed or 0
+            if ((total_orders or 0) != orders or _money_differs(total_spent, spent)
+                    or (completed or 0) != actual_completed or last_date != actual_last):
+                drifted.append({"b_id": customer_id, "b_version": version or 0, "b_orders": orders,
+                                "b_spent": spent, "b_completed": actual_completed, "b_last": actual_last})
+        checked += len(rows)
+        drift += len(drifted)
+        if drifted and not dry_run:
+            db.session.execute(repair, drifted)
+        db.session.commit()
+    return checked, drift
+
+
+def reconcile_drivers(chunk_size: int = 500, dry_run: bool = False):
+    """
+    Recompute driver aggregates from delivered orders; see
+    ``reconcile_customers``. Drivers carry no version, so a repair only
+    applies if the stored counters are still the ones that were read.
+    Returns ``(checked, drifted)``.
+    """
+    delivered = Order.status == OrderStatus.DELIVERED.value
+    repair = (Driver.__table__.update()
+              .where(Driver.id == bindparam("b_id"),
+                     func.coalesce(Driver.total_deliveries, 0) == bindparam("b_seen_deliveries"),
+                     func.coalesce(Driver.total_earnings, 0) == bindparam("b_seen_earnings"))
+              .values(total_deliveries=bindparam("b_deliveries"), total_earnings=bindparam("b_earnings")))
+    checked = drift = 0
+    for low, high in _id_chunks(Driver.id, chunk_size):
+        totals = (db.select(
+                      Order.driver_id.label("driver_id"),
+                      func.count(Order.id).label("deliveries"),
+                      func.coalesce(func.sum(Order.driver_share), 0).label("earnings"))
+                  .where(Order.driver_id > low, Order.driver_id <= high, delivered)
+                  .group_by(Order.driver_id).subquery())
+        rows = db.session.execute(
+            db.select(Driver.id, Driver.total_deliveries, Driver.total_earnings,
+                      totals.c.deliveries, totals.c.earnings)
+            .outerjoin(totals, totals.c.driver_id == Driver.id)
+            .where(Driver.id > low, Driver.id <= high)).all()
+        drifted = []
+        for driver_id, total_deliveries, total_earnings, deliveries, earnings in rows:
+            deliveries, earnings = deliveries or 0, round(earnings or 0.0, 2)
+            if (total_deliveries or 0) != deliveries or _money_differs(total_earnings, earnings):
+                drifted.append({"b_id": driver_id, "b_seen_deliveries": total_deliveries or 0,
+                                "b_seen_earnings": total_earnings or 0.0,
+                                "b_deliveries": deliveries, "b_earnings": earnings})
+        checked += len(rows)
+        drift += len(drifted)
+        if drifted and not dry_run:
+            db.session.execute(repair, drifted)
+        db.session.commit()
+    return checked, drift
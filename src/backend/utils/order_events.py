@@ -0,0 +1,219 @@
+"""
+In-process pub/sub for live order tracking.
+
+The driver endpoints publish status changes and driver positions here after
+they commit, and ``/api/customer/orders/<id>/track/stream`` relays them to
+the customer as server-sent events.
+
+Every event carries a full value (the latest status, the latest position),
+not a delta, so the bus only keeps the newest event of each kind per order.
+A slow subscriber therefore never queues more than one pending event per
+kind, and a client resuming with ``Last-Event-ID`` is sent whatever changed
+since that id. Event ids are ``<epoch>-<seq>``; the epoch is random per
+topic, so an id from another worker or from a topic that has since been
+dropped is recognised as stale and the client gets a fresh snapshot.
+
+The bus is per process. Writes handled by another gunicorn worker reach
+this worker's streams through the periodic resync in the stream route.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+STATUS = "status"
+LOCATION = "location"
+
+
+class _Topic:
+    __slots__ = ("order_id", "epoch", "seq", "latest", "driver_id", "subscribers")
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.latest = {}  # kind -> (seq, data)
+        self.driver_id = None
+        self.subscribers = set()
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+
+class Subscription:
+    """One stream's view of a topic; ``wait`` hands back coalesced events."""
+
+    def __init__(self, topic, lock):
+        self.topic = topic
+        self._condition = threading.Condition(lock)
+        self._pending = {}
+        self.closed = False
+
+    def event_id(self, seq):
+        return self.topic.event_id(seq)
+
+    def _push(self, kind, seq, data):
+        # Called with the bus lock held
+        self._pending[kind] = (seq, data)
+        self._condition.notify()
+
+    def wait(self, timeout):
+        """Return ``[(seq, kind, data), ...]`` in publish order, or [] on timeout."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self.closed, timeout)
+            pending, self._pending = self._pending, {}
+        return sorted((seq, kind, data) for kind, (seq, data) in pending.items())
+
+
+class OrderEventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._by_driver = {}
+        self._idle = OrderedDict()  # order_id -> monotonic time the last subscriber left
+        self._streams = 0
+        self.published = 0
+
+    # -- connection slots ---------------------------------------------------
+
+    def try_open_stream(self, limit: int) -> bool:
+        """Reserve one of ``limit`` stream slots in this worker."""
+        with self._lock:
+            if self._streams >= limit:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    # -- subscriptions ------------------------------------------------------
+
+    def _watch_driver(self, topic, driver_id):
+        if topic.driver_id == driver_id:
+            return
+        if topic.driver_id is not None:
+            orders = self._by_driver.get(topic.driver_id)
+            if orders is not None:
+                orders.discard(topic.order_id)
+                if not orders:
+                    del self._by_driver[topic.driver_id]
+        topic.driver_id = driver_id
+        if driver_id is not None:
+            self._by_driver.setdefault(driver_id, set()).add(topic.order_id)
+
+    def _drop_expired(self, keep_for):
+        now = time.monotonic()
+        while self._idle:
+            order_id, since = next(iter(self._idle.items()))
+            if now - since < keep_for:
+                break
+            del self._idle[order_id]
+            topic = self._topics.pop(order_id)
+            self._watch_driver(topic, None)
+
+    def subscribe(self, order_id, status, driver, keep_for=60):
+        """
+        Subscribe to ``order_id``. ``status`` and ``driver`` (``{"id", "lat",
+        "lng"}`` or None) come from the database and seed the topic only
+        where it has nothing newer.
+        """
+        with self._lock:
+            self._drop_expired(keep_for)
+            topic = self._topics.get(order_id)
+            if topic is None:
+                topic = self._topics[order_id] = _Topic(order_id)
+            self._idle.pop(order_id, None)
+            if STATUS not in topic.latest:
+                self._record(topic, STATUS, {"status": status, "driver_id": driver and driver["id"]})
+            if driver is not None and LOCATION not in topic.latest and driver["lat"] is not None:
+                self._record(topic, LOCATION, {"driver_id": driver["id"], "lat": driver["lat"], "lng": driver["lng"]})
+            if topic.driver_id is None and driver is not None:
+                self._watch_driver(topic, driver["id"])
+            subscription = Subscription(topic, self._lock)
+            topic.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscription.closed = True
+            topic = subscription.topic
+            topic.subscribers.discard(subscription)
+            if not topic.subscribers and self._topics.get(topic.order_id) is topic:
+                # Kept for a while so a reconnecting client can resume
+                self._idle[topic.order_id] = time.monotonic()
+
+    def snapshot(self, subscription):
+        """Latest state as ``(seq, {"status", "driver"})``."""
+        with self._lock:
+            topic = subscription.topic
+            status = topic.latest[STATUS][1]
+            location = topic.latest.get(LOCATION, (None, None))[1]
+            driver = None
+            if status["driver_id"] is not None:
+                driver = {"id": status["driver_id"], "lat": None, "lng": None}
+                if location is not None and location["driver_id"] == status["driver_id"]:
+                    driver["lat"], driver["lng"] = location["lat"], location["lng"]
+            return topic.seq, {"status": status["status"], "driver": driver}
+
+    def replay_since(self, subscription, last_event_id):
+        """
+        Events newer than ``last_event_id`` as ``wait`` returns them, or None
+        if the id does not belong to this topic and a snapshot is needed.
+        """
+        with self._lock:
+            topic = subscription.topic
+            epoch, _, seq = (last_event_id or "").partition("-")
+            if epoch != topic.epoch or not seq.isdigit() or int(seq) > topic.seq:
+                return None
+            since = int(seq)
+            return sorted((s, kind, data) for kind, (s, data) in topic.latest.items() if s > since)
+
+    # -- publishing ---------------------------------------------------------
+
+    def _record(self, topic, kind, data):
+        current = topic.latest.get(kind)
+        if current is not None and current[1] == data:
+            return False
+        topic.seq += 1
+        topic.latest[kind] = (topic.seq, data)
+        for subscription in topic.subscribers:
+            subscription._push(kind, topic.seq, data)
+        return True
+
+    def publish_status(self, order_id, status, driver_id=None):
+        """Record a status change; a no-op unless someone is watching the order."""
+        with self._lock:
+            topic = self._topics.get(order_id)
+            if topic is None:
+                return
+            self._watch_driver(topic, driver_id)
+            if self._record(topic, STATUS, {"status": status, "driver_id": driver_id}):
+                self.published += 1
+
+    def publish_driver_location(self, driver_id, lat, lng):
+        """Fan a driver's position out to every watched order they are assigned to."""
+        with self._lock:
+            order_ids = self._by_driver.get(driver_id)
+            if not order_ids:
+                return
+            data = {"driver_id": driver_id, "lat": lat, "lng": lng}
+            changed = False
+            for order_id in order_ids:
+                changed |= self._record(self._topics[order_id], LOCATION, data)
+            if changed:
+                self.published += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "streams": self._streams,
+                "topics": len(self._topics),
+                "idle_topics": len(self._idle),
+                "watched_drivers": len(self._by_driver),
+                "published": self.published,
+            }
+
+
+order_events = OrderEventBus()
@@ -0,0 +1,164 @@
+"""
+Persistent email outbox.
+
+Request handlers never talk to SMTP directly. They call ``enqueue_message``,
+which stores the message in the ``email_outbox`` table, and a separate worker
+process (``flask outbox-worker``) drains the table in batches over pooled SMTP
+sessions (see ``mail_transport``), retrying failures with exponential backoff.
+"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.utils import formataddr
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import and_, or_
+
+from ..database import db
+from ..models import EmailOutbox, OutboxStatus
+from .mail_transport import smtp_pool
+
+logger = logging.getLogger(__name__)
+
+
+def _address(value):
+    if isinstance(value, (tuple, list)):
+        return formataddr(tuple(value))
+    return value
+
+
+def _dump_addresses(values):
+    if not values:
+        return None
+    return json.dumps([_address(v) for v in values])
+
+
+def _load_addresses(value):
+    return json.loads(value) if value else []
+
+
+def enqueue_message(msg: Message, commit: bool = True) -> EmailOutbox:
+    """Store a Flask-Mail message in the outbox instead of sending it."""
+    entry = EmailOutbox()
+    entry.subject = msg.subject or ""
+    entry.sender = _address(msg.sender)
+    entry.recipients = _dump_addresses(msg.recipients) or "[]"
+    entry.cc = _dump_addresses(msg.cc)
+    entry.bcc = _dump_addresses(msg.bcc)
+    entry.body = msg.body
+    entry.html = msg.html
+    entry.status = OutboxStatus.PENDING.value
+    entry.next_attempt_at = datetime.utcnow()
+    db.session.add(entry)
+    if commit:
+        db.session.commit()
+    return entry
+
+
+def to_message(entry: EmailOutbox) -> Message:
+    return Message(
+        subject=entry.subject,
+        sender=entry.sender or current_app.config.get('MAIL_DEFAULT_SENDER'),
+        recipients=_load_addresses(entry.recipients),
+        cc=_load_addresses(entry.cc),
+        bcc=_load_addresses(entry.bcc),
+        body=entry.body,
+        html=entry.html,
+    )
+
+
+def claim_batch(batch_size: int, lease_seconds: int):
+    """
+    Lease up to ``batch_size`` due messages to this worker.
+
+    Rows whose lease expired (a worker died mid-batch) are due again, so
+    several workers can drain the same table without double delivery.
+    """
+    now = datetime.utcnow()
+    due = or_(
+        and_(EmailOutbox.status == OutboxStatus.PENDING.value,
+             EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == OutboxStatus.SENDING.value,
+             EmailOutbox.locked_until < now),
+    )
+    ids = [row_id for (row_id,) in db.session.query(EmailOutbox.id)
+           .filter(due)
+           .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+           .limit(batch_size)]
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    EmailOutbox.query.filter(EmailOutbox.id.in_(ids), due).update({
+        EmailOutbox.status: OutboxStatus.SENDING.value,
+        EmailOutbox.claimed_by: token,
+        EmailOutbox.locked_until: now + timedelta(seconds=lease_seconds),
+    }, synchronize_session=False)
+    db.session.commit()
+    return EmailOutbox.query.filter_by(claimed_by=token).order_by(EmailOutbox.id).all()
+
+
+def _backoff(attempts: int) -> timedelta:
+    config = current_app.config
+    delay = config['OUTBOX_BACKOFF_SECONDS'] * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, config['OUTBOX_BACKOFF_MAX_SECONDS']))
+
+
+def _mark_failed(entry: EmailOutbox, error: Exception):
+    entry.attempts += 1
+    entry.last_error = str(error)[:500]
+    entry.claimed_by = None
+    entry.locked_until = None
+    if entry.attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+        entry.status = OutboxStatus.FAILED.value
+        logger.error(f"Giving up on outbox message {entry.id} after {entry.attempts} attempts: {error}")
+    else:
+        entry.status = OutboxStatus.PENDING.value
+        entry.next_attempt_at = datetime.utcnow() + _backoff(entry.attempts)
+
+
+def deliver_batch(batch_size: int = None):
+    """Send one batch of due messages over one pooled SMTP session."""
+    config = current_app.config
+    batch = claim_batch(batch_size or config['OUTBOX_BATCH_SIZE'], config['OUTBOX_LEASE_SECONDS'])
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        results = smtp_pool.send_messages([to_message(entry) for entry in batch])
+    except Exception as e:
+        # Connecting or authenticating failed; nothing in the batch went out
+        logger.error(f"Outbox SMTP connection failed: {e}")
+        results = [e] * len(batch)
+    for entry, error in zip(batch, results):
+        if error is not None:
+            _mark_failed(entry, error)
+            failed += 1
+            continue
+        entry.status = OutboxStatus.SENT.value
+        entry.sent_at = datetime.utcnow()
+        entry.claimed_by = None
+        entry.locked_until = None
+        sent += 1
+    db.session.commit()
+    return sent, failed
+
+
+def run_worker(once: bool = False, batch_size: int = None, poll_interval: float = None):
+    """Drain the outbox until interrupted. Must run inside an app context."""
+    poll_interval = poll_interval if poll_interval is not None else current_app.config['OUTBOX_POLL_INTERVAL']
+    totals = [0, 0]
+    while True:
+        sent, failed = deliver_batch(batch_size)
+        totals[0] += sent
+        totals[1] += failed
+        if sent or failed:
+            logger.info(f"Outbox batch delivered: sent={sent} failed={failed}")
+            continue
+        if once:
+            return tuple(totals)
+        time.sleep(poll_interval)
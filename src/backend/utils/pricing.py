@@ -1,14 +1,26 @@
 from math import radians, sin, cos, asin, sqrt
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
 BASE_FARE = 30
 PER_KM = 10
 PER_KG = 5
 COMMISSION_RATE = 0.10
+EARTH_RADIUS_KM = 6371.0
+# Below this many routes the plain loop beats building arrays
+VECTORIZE_MIN_ROUTES = 32
+# A value whose hundredths digit sits this close to .5 may round differently
+# from the scalar path (ulp-level differences in sin/cos); such rows are
+# re-priced with the scalar functions so results always match exactly
+_HALF_CENT_TOLERANCE = 1e-6
 
 
 def haversine_km(lat1, lon1, lat2, lon2):
     # Earth radius in km
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     dlat = radians(lat2 - lat1)
     dlon = radians(lon2 - lon1)
     a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
@@ -21,3 +33,67 @@ def compute_fare(distance_km: float, weight_kg: float):
     commission = round(total * COMMISSION_RATE, 2)
     driver_share = round(total - commission, 2)
     return round(total, 2), driver_share, commission
+
+
+def _price_routes_loop(pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights):
+    distances, totals, driver_shares, commissions = [], [], [], []
+    for lat1, lon1, lat2, lon2, weight in zip(pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights):
+        distance = haversine_km(lat1, lon1, lat2, lon2)
+        total, driver_share, commission = compute_fare(distance, weight)
+        distances.append(round(distance, 2))
+        totals.append(total)
+        driver_shares.append(driver_share)
+        commissions.append(commission)
+    return distances, totals, driver_shares, commissions
+
+
+def _near_half_cent(values):
+    scaled = np.abs(values) * 100
+    return np.abs(scaled - np.floor(scaled) - 0.5) < _HALF_CENT_TOLERANCE
+
+
+def price_route_arrays(pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights):
+    """
+    NumPy version of ``price_routes``: takes array-likes and returns float64
+    arrays ``(distance_km, total, driver_share, commission)``. Every value
+    equals what ``haversine_km``/``compute_fare`` give for that route.
+    """
+    if np is None:
+        raise RuntimeError("price_route_arrays needs NumPy; use price_routes instead")
+    plat = np.asarray(pickup_lats, dtype=np.float64)
+    plng = np.asarray(pickup_lngs, dtype=np.float64)
+    dlat_deg = np.asarray(drop_lats, dtype=np.float64)
+    dlng_deg = np.asarray(drop_lngs, dtype=np.float64)
+    weight = np.asarray(weights, dtype=np.float64)
+
+    # Same operation order as haversine_km and compute_fare
+    dlat = np.radians(dlat_deg - plat)
+    dlon = np.radians(dlng_deg - plng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(np.radians(plat)) * np.cos(np.radians(dlat_deg)) * np.sin(dlon / 2) ** 2
+    distance = EARTH_RADIUS_KM * (2 * np.arcsin(np.sqrt(a)))
+    total = BASE_FARE + (distance * PER_KM) + (weight * PER_KG)
+    commission = np.round(total * COMMISSION_RATE, 2)
+    driver_share = np.round(total - commission, 2)
+
+    suspect = (_near_half_cent(distance) | _near_half_cent(total)
+               | _near_half_cent(total * COMMISSION_RATE) | _near_half_cent(total - commission))
+    distance = np.round(distance, 2)
+    total = np.round(total, 2)
+
+    for i in np.flatnonzero(suspect):
+        exact = _price_routes_loop([plat[i]], [plng[i]], [dlat_deg[i]], [dlng_deg[i]], [weight[i]])
+        distance[i], total[i], driver_share[i], commission[i] = (column[0] for column in exact)
+    return distance, total, driver_share, commission
+
+
+def price_routes(pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights):
+    """
+    Price many routes in one call. Returns parallel lists of
+    (distance_km rounded to 2 places, total, driver_share, commission),
+    identical to calling ``haversine_km`` and ``compute_fare`` per route.
+    Uses NumPy when it is installed and the batch is big enough to pay off.
+    """
+    if np is None or len(weights) < VECTORIZE_MIN_ROUTES:
+        return _price_routes_loop(pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights)
+    return tuple(column.tolist() for column in
+                 price_route_arrays(pickup_lats, pickup_lngs, drop_lats, drop_lngs, weights))
@@ -0,0 +1,89 @@
+"""
+Fare quotes backed by a bounded, per-process LRU cache.
+
+Quotes are keyed on coordinates quantized to 4 decimal places (about 11 m of
+latitude) and on the weight rounded to ``QUOTE_WEIGHT_BUCKET_KG``, and the
+fare is computed from those quantized values. Two requests for the same
+pickup/drop pair therefore get the same fare, and ``create_order`` charges
+exactly what ``/api/customer/quote`` showed.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+
+from .pricing import haversine_km, compute_fare
+
+COORD_DECIMALS = 4
+
+Quote = namedtuple("Quote", "pickup_lat pickup_lng drop_lat drop_lng weight_kg "
+                            "distance_km fare_total driver_share company_commission")
+
+
+def quantize_route(pickup_lat, pickup_lng, drop_lat, drop_lng, weight_kg, weight_bucket):
+    buckets = round(weight_kg / weight_bucket)
+    return (round(pickup_lat, COORD_DECIMALS), round(pickup_lng, COORD_DECIMALS),
+            round(drop_lat, COORD_DECIMALS), round(drop_lng, COORD_DECIMALS),
+            round(max(buckets, 1) * weight_bucket, 3))
+
+
+class QuoteCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_quote(self, pickup_lat, pickup_lng, drop_lat, drop_lng, weight_kg):
+        """Return ``(Quote, cached)`` for a validated route."""
+        config = current_app.config
+        key = quantize_route(pickup_lat, pickup_lng, drop_lat, drop_lng, weight_kg,
+                             config.get('QUOTE_WEIGHT_BUCKET_KG', 0.1))
+        with self._lock:
+            quote = self._entries.get(key)
+            if quote is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return quote, True
+            self.misses += 1
+
+        distance = haversine_km(*key[:4])
+        quote = Quote(*key, round(distance, 2), *compute_fare(distance, key[4]))
+        with self._lock:
+            self._entries[key] = quote
+            self._entries.move_to_end(key)
+            max_size = config.get('QUOTE_CACHE_SIZE', 10000)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return quote, False
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+quote_cache = QuoteCache()
+
+
+def quote_to_dict(quote: Quote, cached: bool = False) -> dict:
+    return {
+        "distance_km": quote.distance_km,
+        "weight_kg": quote.weight_kg,
+        "fare_total": quote.fare_total,
+        "driver_share": quote.driver_share,
+        "company_commission": quote.company_commission,
+        "cached": cached,
+    }
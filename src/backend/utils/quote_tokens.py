@@ -0,0 +1,99 @@
+"""
+Compact HMAC-signed fare quotes.
+
+``/api/customer/quote`` hands out a token that encodes the route, weight,
+priced amounts, the customer it was issued to and an expiry. Order creation
+can then trust those values without re-validating or re-pricing them, and
+the customer is charged exactly what they were quoted.
+
+Layout (big-endian, 45 bytes) followed by a 16-byte truncated HMAC-SHA256,
+base64url encoded without padding (82 characters):
+
+    version:B  customer:I  pickup_lat,pickup_lng,drop_lat,drop_lng:4i (micro-degrees)
+    weight:I (grams)  distance:I (10 m)  fare,driver_share,commission:3I (paise)
+    expires:I (unix seconds)
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+
+from flask import current_app
+
+from .quote_cache import Quote
+
+TOKEN_VERSION = 1
+_LAYOUT = struct.Struct(">BI4iII3II")
+_MAC_BYTES = 16
+_UINT32_MAX = 0xFFFFFFFF
+
+
+def _key() -> bytes:
+    # Derived so a leaked quote key never doubles as the session secret
+    secret = current_app.config['SECRET_KEY']
+    return hashlib.sha256(b"swiftlogix-quote-token:" + secret.encode('utf-8')).digest()
+
+
+def _mac(payload: bytes) -> bytes:
+    return hmac.new(_key(), payload, hashlib.sha256).digest()[:_MAC_BYTES]
+
+
+def _micro(degrees: float) -> int:
+    return int(round(degrees * 1_000_000))
+
+
+def _cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def _uint32(value: int, name: str) -> int:
+    if not 0 <= value <= _UINT32_MAX:
+        raise ValueError(f"{name} is out of range for a quote")
+    return value
+
+
+def sign_quote(quote: Quote, pickup_lat, pickup_lng, drop_lat, drop_lng, weight_kg, customer_id: int) -> str:
+    """
+    Token for ``quote`` bound to the customer's profile id and the exact
+    route they asked for. Raises ``ValueError`` if a value does not fit the
+    token's fields.
+    """
+    expires = int(time.time()) + current_app.config.get('QUOTE_TOKEN_TTL_SECONDS', 900)
+    # Coordinates are range-checked by the schema and always fit an int32
+    payload = _LAYOUT.pack(
+        TOKEN_VERSION, _uint32(customer_id, "customer"),
+        _micro(pickup_lat), _micro(pickup_lng), _micro(drop_lat), _micro(drop_lng),
+        _uint32(int(round(weight_kg * 1000)), "weight_kg"), _uint32(_cents(quote.distance_km), "distance"),
+        _uint32(_cents(quote.fare_total), "fare"), _uint32(_cents(quote.driver_share), "driver_share"),
+        _uint32(_cents(quote.company_commission), "commission"),
+        expires,
+    )
+    return base64.urlsafe_b64encode(payload + _mac(payload)).rstrip(b"=").decode('ascii')
+
+
+def verify_quote(token, customer_id: int):
+    """
+    Return the signed ``Quote`` (with the exact route the customer asked
+    for), or None if the token is malformed, forged, expired or was issued
+    to another customer.
+    """
+    if not isinstance(token, str) or len(token) > 128:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) != _LAYOUT.size + _MAC_BYTES:
+        return None
+    payload, mac = raw[:_LAYOUT.size], raw[_LAYOUT.size:]
+    if not hmac.compare_digest(mac, _mac(payload)):
+        return None
+
+    (version, token_customer, plat, plng, dlat, dlng,
+     weight_g, distance, fare, driver_share, commission, expires) = _LAYOUT.unpack(payload)
+    if version != TOKEN_VERSION or token_customer != customer_id or expires < time.time():
+        return None
+    return Quote(plat / 1_000_000, plng / 1_000_000, dlat / 1_000_000, dlng / 1_000_000,
+                 weight_g / 1000, distance / 100, fare / 100, driver_share / 100, commission / 100)
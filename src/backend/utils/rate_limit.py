@@ -0,0 +1,212 @@
+"""
+Token-bucket rate limiting with state shared across workers.
+
+Each bucket holds up to ``burst`` tokens and refills at ``burst / period``
+tokens per second; a request spends one token or is rejected with the time
+until the next token arrives, and ``refund`` gives a spent token back.
+Buckets and shed/allowed counters live in a pluggable backend chosen by
+``RATE_LIMIT_STORAGE``:
+
+* ``sqlite:///path/to/file.db`` (default) - shared by every worker on a host
+* ``memory://`` - per-process, for tests and single-worker setups
+* ``package.module:ClassName`` - any class implementing
+  ``take``/``refund``/``incr``/``counters``
+"""
+import hashlib
+import importlib
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+# Buckets idle for this long are full again, so their rows can be dropped
+IDLE_BUCKET_TTL = 3600
+PRUNE_PROBABILITY = 0.001
+
+
+def parse_limit(spec: str):
+    """'10/60' -> (burst=10, period=60.0)."""
+    burst, period = spec.split('/', 1)
+    return int(burst), float(period)
+
+
+def _refill(tokens, updated, now, burst, period):
+    if tokens is None:
+        return float(burst)
+    return min(float(burst), tokens + (now - updated) * burst / period)
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._counters = {}
+
+    def take(self, key, burst, period, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            tokens = _refill(tokens, updated, now, burst, period)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) * period / burst
+
+    def refund(self, key, burst, period, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            self._buckets[key] = (min(float(burst), _refill(tokens, updated, now, burst, period) + 1), now)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+class SQLiteBackend:
+    """Buckets in a small SQLite file; BEGIN IMMEDIATE serialises updates across processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counter (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing a few refills on power failure is harmless
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, burst, period, now=None):
+        now = now if now is not None else time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0] if row else None, row[1] if row else now, now, burst, period)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) * period / burst
+            conn.execute("INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            if random.random() < PRUNE_PROBABILITY:
+                conn.execute("DELETE FROM bucket WHERE updated < ?", (now - IDLE_BUCKET_TTL,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def refund(self, key, burst, period, now=None):
+        now = now if now is not None else time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            if row:
+                tokens = min(float(burst), _refill(row[0], row[1], now, burst, period) + 1)
+                conn.execute("UPDATE bucket SET tokens = ?, updated = ? WHERE key = ?", (tokens, now, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def incr(self, name, amount=1):
+        self._connect().execute(
+            "INSERT INTO counter (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount))
+
+    def counters(self):
+        return dict(self._connect().execute("SELECT name, value FROM counter").fetchall())
+
+
+def create_backend(spec: str):
+    if spec.startswith('memory://'):
+        return MemoryBackend()
+    if spec.startswith('sqlite:///'):
+        return SQLiteBackend(spec[len('sqlite:///'):])
+    module_name, _, class_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class RateLimiter:
+    def __init__(self):
+        self._backend = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        # Built lazily per process so forked workers do not share sockets/handles
+        if self._backend is None or self._pid != os.getpid():
+            with self._lock:
+                if self._backend is None or self._pid != os.getpid():
+                    self._backend = create_backend(current_app.config['RATE_LIMIT_STORAGE'])
+                    self._pid = os.getpid()
+        return self._backend
+
+    def hit(self, scope: str, key: str, limit: str) -> float:
+        """Spend one token from ``scope:key``. Returns 0 if allowed, else seconds to wait."""
+        burst, period = parse_limit(limit)
+        retry_after = self.backend.take(f"{scope}:{key}", burst, period)
+        self.backend.incr(f"{scope}.{'rejected' if retry_after else 'allowed'}")
+        return retry_after
+
+    def refund(self, scope: str, key: str, limit: str):
+        """Give back the token a ``hit`` on ``scope:key`` spent."""
+        burst, period = parse_limit(limit)
+        self.backend.refund(f"{scope}:{key}", burst, period)
+
+    def counters(self):
+        return self.backend.counters()
+
+
+limiter = RateLimiter()
+
+
+def _email_key(email: str) -> str:
+    # Hash so the limiter store never holds raw email addresses
+    return hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:32]
+
+
+def check_login_rate(ip: str, email) -> float:
+    """
+    Throttle login attempts per client IP and per target email before any
+    database or bcrypt work happens. Returns seconds to wait, or 0.
+    """
+    config = current_app.config
+    if not config.get('RATE_LIMIT_ENABLED', True):
+        return 0.0
+    retry_after = limiter.hit('login.ip', ip or 'unknown', config['LOGIN_RATE_LIMIT_PER_IP'])
+    if retry_after:
+        return retry_after
+    if isinstance(email, str) and email:
+        return limiter.hit('login.email', _email_key(email), config['LOGIN_RATE_LIMIT_PER_EMAIL'])
+    return 0.0
+
+
+def login_succeeded(email: str):
+    """
+    Refund the per-email token of a login with the right password, so only
+    failed attempts count against the account.
+    """
+    config = current_app.config
+    if config.get('RATE_LIMIT_ENABLED', True):
+        limiter.refund('login.email', _email_key(email), config['LOGIN_RATE_LIMIT_PER_EMAIL'])
@@ -0,0 +1,189 @@
+"""
+Structured, non-blocking request logging.
+
+Handlers only put records on an in-memory queue; a QueueListener thread
+formats them as JSON lines and writes them out, so request threads never
+block on stdout. Successful requests are sampled per endpoint, errors are
+always logged, and secrets (auth headers, passwords, tokens, uploaded file
+bytes) are redacted before anything reaches the queue.
+
+Debug mode adds headers and bodies to each record. It can be flipped at
+runtime through ``PUT /api/admin/logging``; when ``LOG_DEBUG_FLAG_FILE`` is
+set the flag is shared by every worker on the host through that file.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+logger = logging.getLogger("swiftlogix.requests")
+
+REDACTED = "[redacted]"
+SENSITIVE_HEADERS = {"authorization", "cookie", "set-cookie", "proxy-authorization", "x-api-key"}
+SENSITIVE_FIELDS = {"password", "new_password", "token", "reset_token", "quote_token", "jwt", "secret"}
+FLAG_CHECK_INTERVAL = 1.0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DebugSwitch:
+    """Runtime debug flag, optionally mirrored to a file shared by workers."""
+
+    def __init__(self):
+        self.enabled = False
+        self.flag_file = None
+        # Level of the "swiftlogix" loggers while debug is off
+        self.level = logging.INFO
+        self._checked_at = 0.0
+
+    def is_enabled(self) -> bool:
+        if self.flag_file:
+            now = time.monotonic()
+            if now - self._checked_at >= FLAG_CHECK_INTERVAL:
+                self._checked_at = now
+                self._apply(os.path.exists(self.flag_file))
+        return self.enabled
+
+    def set(self, enabled: bool):
+        if self.flag_file:
+            if enabled:
+                with open(self.flag_file, "w") as f:
+                    f.write("1")
+            elif os.path.exists(self.flag_file):
+                os.remove(self.flag_file)
+            self._checked_at = time.monotonic()
+        self._apply(enabled)
+
+    def _apply(self, enabled: bool):
+        self.enabled = enabled
+        logging.getLogger("swiftlogix").setLevel(logging.DEBUG if enabled else self.level)
+
+
+debug_switch = _DebugSwitch()
+_listener = None
+
+
+def redact_mapping(data) -> dict:
+    return {k: (REDACTED if k.lower() in SENSITIVE_FIELDS else v) for k, v in data.items()}
+
+
+def _headers():
+    return {k: (REDACTED if k.lower() in SENSITIVE_HEADERS else v) for k, v in request.headers.items()}
+
+
+def _body():
+    if request.files or request.form:
+        body = redact_mapping(request.form.to_dict())
+        for name, storage in request.files.items():
+            body[name] = f"<file {storage.filename!r} {storage.mimetype}>"
+        return body
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            return redact_mapping(data)
+        if isinstance(data, list):
+            return f"<json array of {len(data)} items>"
+        return data
+    if request.content_length:
+        return f"<{request.content_length} bytes {request.mimetype}>"
+    return None
+
+
+def _parse_rates(spec) -> dict:
+    """Accepts a dict or an 'endpoint=rate,endpoint=rate' string."""
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        return {k: float(v) for k, v in spec.items()}
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            endpoint, rate = item.split("=", 1)
+            rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+def init_logging(app):
+    global _listener
+
+    if _listener is None:
+        log_queue = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        queue_handler = QueueHandler(log_queue)
+        root = logging.getLogger("swiftlogix")
+        root.handlers = [queue_handler]
+        root.propagate = False
+        app.logger.handlers = [queue_handler]
+
+    # Set explicitly: left unset the loggers inherit the root logger's
+    # WARNING and every sampled request record is dropped
+    debug_switch.level = logging.getLevelName(str(app.config.get("LOG_LEVEL", "INFO")).upper())
+    if not isinstance(debug_switch.level, int):
+        raise ValueError(f"Unknown LOG_LEVEL {app.config.get('LOG_LEVEL')!r}")
+    # Without LOG_DEBUG an existing flag file decides, so restarting one
+    # worker does not switch debug logging off for the others.
+    debug_switch.flag_file = app.config.get("LOG_DEBUG_FLAG_FILE")
+    if app.config.get("LOG_DEBUG"):
+        debug_switch.set(True)
+    else:
+        debug_switch._apply(debug_switch.enabled)
+
+    default_rate = float(app.config.get("LOG_SAMPLE_RATE", 1.0))
+    rates = _parse_rates(app.config.get("LOG_SAMPLE_RATES"))
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        debug = debug_switch.is_enabled()
+        if response.status_code < 400 and not debug:
+            rate = rates.get(request.endpoint, default_rate)
+            if rate <= 0 or (rate < 1 and random.random() >= rate):
+                return response
+
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "remote_addr": request.remote_addr,
+        }
+        started = g.get("request_started")
+        if started is not None:
+            fields["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if debug:
+            fields["query"] = redact_mapping(request.args.to_dict())
+            fields["headers"] = _headers()
+            fields["body"] = _body()
+
+        level = logging.WARNING if response.status_code >= 500 else logging.INFO
+        logger.log(level, "request", extra={"fields": fields})
+        return response
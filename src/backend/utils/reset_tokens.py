@@ -0,0 +1,61 @@
+"""
+Password-reset tokens shared by every worker through the database.
+
+Only a SHA-256 digest of each token is stored, keyed as the primary key, so
+validation is a single indexed lookup and consumption is one conditional
+DELETE whose row count tells the caller whether it won the token.
+"""
+import hashlib
+import secrets
+import string
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from ..database import db
+from ..models import PasswordResetToken
+
+TOKEN_ALPHABET = string.ascii_letters + string.digits
+TOKEN_LENGTH = 32
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_reset_token(user) -> str:
+    """Create a token for ``user``. The caller commits."""
+    token = ''.join(secrets.choice(TOKEN_ALPHABET) for _ in range(TOKEN_LENGTH))
+    entry = PasswordResetToken()
+    entry.token_hash = _digest(token)
+    entry.user_id = user.id
+    entry.email = user.email
+    entry.expires_at = datetime.utcnow() + timedelta(minutes=current_app.config['PASSWORD_RESET_TTL_MINUTES'])
+    db.session.add(entry)
+    return token
+
+
+def find_reset_token(token: str):
+    return db.session.get(PasswordResetToken, _digest(token))
+
+
+def consume_reset_token(token: str, email: str) -> bool:
+    """
+    Atomically delete a live token. Returns False if it expired, belongs to
+    another email or was already used by a concurrent request. The caller
+    commits, so the delete lands in the same transaction as the password change.
+    """
+    deleted = PasswordResetToken.query.filter(
+        PasswordResetToken.token_hash == _digest(token),
+        PasswordResetToken.email == email,
+        PasswordResetToken.expires_at > datetime.utcnow(),
+    ).delete(synchronize_session=False)
+    return deleted == 1
+
+
+def sweep_expired_reset_tokens() -> int:
+    deleted = PasswordResetToken.query.filter(
+        PasswordResetToken.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
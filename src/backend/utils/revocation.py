@@ -0,0 +1,65 @@
+"""
+Token revocation without a per-request database check.
+
+Every user has a ``token_version``; tokens carry the version they were
+issued with and are rejected once the user's version moves past it.
+Each worker mirrors the non-zero versions into a dict and only re-reads
+them when the single-row ``revocation_counter`` changes, which it polls at
+most every ``REVOCATION_POLL_INTERVAL`` seconds. The per-request cost is
+a dict lookup.
+"""
+import threading
+import time
+
+from flask import current_app
+
+from ..database import db
+from ..models import RevocationCounter, User
+
+COUNTER_ID = 1
+
+
+class RevocationCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._min_versions = {}
+        self._counter = None
+        self._checked_at = 0.0
+
+    def _current_counter(self):
+        return db.session.query(RevocationCounter.version).filter_by(id=COUNTER_ID).scalar() or 0
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < current_app.config['REVOCATION_POLL_INTERVAL']:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < current_app.config['REVOCATION_POLL_INTERVAL']:
+                return
+            counter = self._current_counter()
+            if counter != self._counter:
+                rows = db.session.query(User.id, User.token_version).filter(User.token_version > 0).all()
+                self._min_versions = {user_id: version for user_id, version in rows}
+                self._counter = counter
+            self._checked_at = now
+
+    def is_revoked(self, jwt_payload) -> bool:
+        self.refresh()
+        required = self._min_versions.get(int(jwt_payload["sub"]), 0)
+        return jwt_payload.get("token_version", 0) < required
+
+
+revocation_cache = RevocationCache()
+
+
+def revoke_user_tokens(user_id: int):
+    """
+    Invalidate every token issued to ``user_id`` so far. Both updates are
+    SQL-side increments; the caller commits.
+    """
+    User.query.filter_by(id=user_id).update(
+        {User.token_version: User.token_version + 1}, synchronize_session=False)
+    bumped = RevocationCounter.query.filter_by(id=COUNTER_ID).update(
+        {RevocationCounter.version: RevocationCounter.version + 1}, synchronize_session=False)
+    if not bumped:
+        db.session.add(RevocationCounter(id=COUNTER_ID, version=1))
@@ -1,82 +1,384 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from functools import wraps
-from flask import request, jsonify, current_app
+import bcrypt as bcrypt_lib
+from flask import request, jsonify, current_app, g, has_request_context
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required, get_jwt
+from sqlalchemy.orm import joinedload
+from ..database import db
+from ..models import User, UserRole
+from .errors import HandledError
+from .revocation import revocation_cache
 
 bcrypt = Bcrypt()
 jwt = JWTManager()
+logger = logging.getLogger("swiftlogix.auth")
+
+
+class HashingBusy(HandledError):
+    """Raised when too many password hashes are already queued."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+def _bcrypt_hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt_lib.hashpw(password, bcrypt_lib.gensalt(rounds))
+
+
+def _bcrypt_check(password: bytes, pw_hash: bytes) -> bool:
+    try:
+        return bcrypt_lib.checkpw(password, pw_hash)
+    except ValueError:
+        # Malformed stored hash
+        return False
+
+
+# Workers are started from a clean server process, never by forking the
+# calling process: a gunicorn worker runs --threads request threads, and a
+# fork can copy a lock one of them holds, deadlocking the child
+_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _under_app_server() -> bool:
+    """True while handling a request from gunicorn or the Werkzeug server."""
+    return has_request_context() and "SERVER_SOFTWARE" in request.environ
+
+
+class _HashExecutor:
+    """
+    Runs bcrypt in a dedicated process pool so request threads only wait on
+    a future instead of burning a core. The pool is created lazily per
+    process (gunicorn forks after import) and admission is bounded by
+    HASH_MAX_PENDING so a login burst is shed with 429s instead of queueing
+    without limit.
+
+    Pool processes are started with forkserver/spawn, which re-import the
+    program's ``__main__`` module, so a script that starts the pool must keep
+    its top-level work under ``if __name__ == "__main__":``. The pool is
+    therefore only used for requests served by an app server; scripts, the
+    test client and CLI commands hash inline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._pending = 0
+
+    def _get_pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context(_POOL_START_METHOD))
+            self._pid = os.getpid()
+        return self._pool
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _drop_pool(self):
+        # e.g. a script without a __main__ guard on a spawn platform
+        logging.warning("Password hashing pool is unusable, hashing inline")
+        with self._lock:
+            self._pool = None
+
+    def run(self, fn, *args):
+        config = current_app.config
+        workers = config.get('HASH_POOL_WORKERS', 0)
+        if workers <= 0 or not _under_app_server():
+            return fn(*args)
+
+        with self._lock:
+            if self._pending >= config.get('HASH_MAX_PENDING', 64):
+                raise HashingBusy(config.get('HASH_RETRY_AFTER', 1))
+            self._pending += 1
+            pool = self._get_pool(workers)
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._drop_pool()
+            return fn(*args)
+        # Counted until the task is done, not until this thread stops waiting
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=config.get('HASH_TIMEOUT'))
+        except FutureTimeout:
+            # Drops the task if it has not started; shed load like a full queue
+            future.cancel()
+            raise HashingBusy(config.get('HASH_RETRY_AFTER', 1))
+        except BrokenProcessPool:
+            self._drop_pool()
+            return fn(*args)
+
+    def map(self, fn, arg_tuples):
+        """
+        Run ``fn`` over many argument tuples for bulk jobs. At most one task
+        per pool process is outstanding, so interactive logins queued behind
+        a bulk job wait for one hash, not the whole batch.
+        """
+        config = current_app.config
+        workers = config.get('HASH_POOL_WORKERS', 0)
+        if workers <= 0 or not _under_app_server():
+            return [fn(*args) for args in arg_tuples]
+
+        with self._lock:
+            if self._pending + workers > config.get('HASH_MAX_PENDING', 64):
+                raise HashingBusy(config.get('HASH_RETRY_AFTER', 1))
+            self._pending += workers
+            pool = self._get_pool(workers)
+        try:
+            results = [None] * len(arg_tuples)
+            remaining = iter(enumerate(arg_tuples))
+            in_flight = {}
+            for index, args in remaining:
+                in_flight[pool.submit(fn, *args)] = index
+                if len(in_flight) >= workers:
+                    break
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[in_flight.pop(future)] = future.result()
+                    following = next(remaining, None)
+                    if following is not None:
+                        in_flight[pool.submit(fn, *following[1])] = following[0]
+            return results
+        except BrokenProcessPool:
+            self._drop_pool()
+            return [fn(*args) for args in arg_tuples]
+        finally:
+            with self._lock:
+                self._pending -= workers
+
+
+hash_executor = _HashExecutor()
+
+
+def _log_rounds() -> int:
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.generate_password_hash(password).decode('utf-8')
+    return hash_executor.run(_bcrypt_hash, password.encode('utf-8'), _log_rounds()).decode('utf-8')
+
+
+def hash_passwords(passwords: list) -> list:
+    """Hash many passwords in parallel across the pool's processes."""
+    rounds = _log_rounds()
+    hashes = hash_executor.map(_bcrypt_hash, [(p.encode('utf-8'), rounds) for p in passwords])
+    return [h.decode('utf-8') for h in hashes]
 
 
 def check_password(password: str, pw_hash: str) -> bool:
-    return bcrypt.check_password_hash(pw_hash, password)
+    return hash_executor.run(_bcrypt_check, password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+
+def needs_rehash(pw_hash: str) -> bool:
+    """True when a stored hash was made with a different cost than BCRYPT_LOG_ROUNDS."""
+    try:
+        return int(pw_hash.split('$')[2]) != _log_rounds()
+    except (IndexError, ValueError):
+        return False
+
+
+def too_many_requests(message: str, retry_after: float):
+    response = jsonify({"message": message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+# Version 2 tokens also carry the role profile's primary key and public
+# 9-digit id; version 1 tokens (no "claims_version") only have id and role.
+CLAIMS_VERSION = 2
 
 
 def make_access_token(identity: dict) -> str:
     # Extract user ID and role from identity dict
     user_id = identity.get("id")
     role = identity.get("role")
-    
-    # Create token with user_id as identity and role as additional claim
+    claims = {"role": role, "claims_version": CLAIMS_VERSION,
+              "token_version": identity.get("token_version") or 0}
+    if identity.get("profile_id") is not None:
+        claims["profile_id"] = identity["profile_id"]
+        claims["public_id"] = identity.get("public_id")
+
+    # Create token with user_id as identity and role/profile ids as additional claims
     return create_access_token(
         identity=str(user_id),
-        additional_claims={"role": role}
+        additional_claims=claims
     )
 
 
 # JWT error handlers
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
-    print(f"Expired token: {jwt_header}, {jwt_payload}")
+    logger.debug("Expired token for subject %s", jwt_payload.get("sub"))
     return jsonify({"message": "Token has expired"}), 401
 
 
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
-    print(f"Invalid token: {error}")
+    logger.debug("Invalid token: %s", error)
     return jsonify({"message": "Invalid token"}), 401
 
 
 @jwt.unauthorized_loader
 def missing_token_callback(error):
-    print(f"Missing token: {error}")
+    logger.debug("Missing token: %s", error)
     return jsonify({"message": "Missing token"}), 401
 
 
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return revocation_cache.is_revoked(jwt_payload)
+
+
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    logger.debug("Revoked token for subject %s", jwt_payload.get("sub"))
+    return jsonify({"message": "Token has been revoked"}), 401
+
+
 @jwt.needs_fresh_token_loader
 def needs_fresh_token_callback(jwt_header, jwt_payload):
-    print(f"Needs fresh token: {jwt_header}, {jwt_payload}")
+    logger.debug("Fresh token required for subject %s", jwt_payload.get("sub"))
     return jsonify({"message": "Fresh token required"}), 401
 
 
-def role_required(*allowed_roles):
+class Principal:
+    """
+    The authenticated user plus their customer/driver profile row.
+
+    Profile ids come straight from version 2 token claims; ``user`` and
+    ``profile`` are loaded together with one joined query on first access.
+    """
+
+    __slots__ = ("user_id", "role", "token_id", "_claims", "_loaded", "_user", "_profile")
+
+    def __init__(self, claims):
+        self.user_id = int(claims["sub"])
+        self.role = claims.get("role")
+        self.token_id = claims.get("jti")
+        self._claims = claims
+        self._loaded = False
+        self._user = None
+        self._profile = None
+
+    def _load(self):
+        relationship = _PROFILE_RELATIONSHIPS.get(self.role)
+        query = db.session.query(User)
+        if relationship is not None:
+            query = query.options(joinedload(relationship))
+        self._user = query.filter(User.id == self.user_id).first()
+        if self._user is not None and relationship is not None:
+            self._profile = getattr(self._user, relationship.key)
+        self._loaded = True
+
+    @property
+    def user(self):
+        if not self._loaded:
+            self._load()
+        return self._user
+
+    @property
+    def profile(self):
+        if not self._loaded:
+            self._load()
+        return self._profile
+
+    @property
+    def has_profile_claims(self) -> bool:
+        return self._claims.get("claims_version", 1) >= 2 and "profile_id" in self._claims
+
+    @property
+    def profile_id(self):
+        if self.has_profile_claims:
+            return self._claims["profile_id"]
+        return self.profile.id if self.profile is not None else None
+
+    @property
+    def public_id(self):
+        if self.has_profile_claims:
+            return self._claims.get("public_id")
+        if self.profile is None:
+            return None
+        return getattr(self.profile, f"{self.role}_id", None)
+
+    def is_stale(self) -> bool:
+        # g outlives a request when an app context is pushed by hand (tests, CLI)
+        return self._loaded and self._user is not None and self._user not in db.session
+
+
+_PROFILE_RELATIONSHIPS = {
+    UserRole.CUSTOMER.value: User.customer_profile,
+    UserRole.DRIVER.value: User.driver_profile,
+}
+
+_PROFILE_NOT_FOUND = {
+    UserRole.CUSTOMER.value: "Customer profile not found",
+    UserRole.DRIVER.value: "Driver profile not found",
+}
+
+
+def current_principal() -> Principal:
+    """
+    The JWT principal for this request, cached on ``g``. Nothing is queried
+    until ``user``/``profile`` is accessed, and then only once.
+    """
+    claims = get_jwt()
+    cached = g.get("principal")
+    if cached is not None and cached.token_id == claims.get("jti") and not cached.is_stale():
+        return cached
+    g.principal = Principal(claims)
+    return g.principal
+
+
+def role_required(*allowed_roles, inject_principal=False, claims_only=False):
+    """
+    Restrict a view to the given roles. With ``inject_principal=True`` the
+    view also receives ``principal`` (see ``current_principal``); requests
+    whose user or role profile no longer exists get a 404. Views that only
+    need ``principal.profile_id``/``public_id`` pass ``claims_only=True`` to
+    skip loading the user and profile rows for version 2 tokens.
+    """
     def decorator(fn):
         @wraps(fn)
         @jwt_required()
         def wrapper(*args, **kwargs):
             try:
-                print(f"Checking role for {fn.__name__}")
-                print(f"Allowed roles: {allowed_roles}")
-                # Get user ID from JWT identity
+                # User ID is the JWT identity, role is an additional claim
                 user_id = get_jwt_identity()
-                print(f"JWT Identity (user_id): {user_id}")
-                
-                # Get role from additional claims
-                claims = get_jwt()
-                role = claims.get("role")
-                print(f"User role from claims: {role}")
-                
+                role = get_jwt().get("role")
                 if not user_id or not role or role not in allowed_roles:
-                    print(f"Role not allowed. User role: {role if role else 'None'}")
+                    logger.debug("Role %s not allowed for %s", role, fn.__name__)
                     return jsonify({"message": "Forbidden"}), 403
-                print(f"Role check passed, calling function {fn.__name__}")
+                if inject_principal:
+                    principal = current_principal()
+                    if claims_only:
+                        if role in _PROFILE_NOT_FOUND and principal.profile_id is None:
+                            return jsonify({"message": _PROFILE_NOT_FOUND[role]}), 404
+                    else:
+                        if principal.user is None:
+                            return jsonify({"message": "User not found"}), 404
+                        if role in _PROFILE_NOT_FOUND and principal.profile is None:
+                            return jsonify({"message": _PROFILE_NOT_FOUND[role]}), 404
+                    kwargs["principal"] = principal
                 return fn(*args, **kwargs)
+            except HandledError:
+                # Let the app-level handlers turn these into a 429 / 413 / 415
+                raise
             except Exception as e:
-                # Log the actual error for debugging
-                print(f"Error in role_required decorator: {str(e)}")
+                logger.error("Error in role_required for %s: %s", fn.__name__, e)
                 return jsonify({"message": "Authentication error"}), 401
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,329 @@
+"""
+Content-addressed storage for material photos.
+
+Routes decorated with ``@streams_uploads`` receive their multipart files
+through ``HashingUploadStream`` instead of Werkzeug's default in-memory /
+spooled buffer: each chunk is hashed and appended to a temporary file under
+``UPLOAD_FOLDER`` as it is parsed, the size limit is enforced per chunk and
+the file type is checked from its first bytes, so a rejected upload stops
+at the chunk that broke the rule. ``store_photo`` then renames the file to
+``<sha256>.<ext>``; an identical photo uploaded again is dropped in favour
+of the copy already on disk.
+
+Thumbnails are made by a per-process background thread (Pillow is
+optional; without it the original is served instead). ``flask thumbnails``
+backfills any that were skipped.
+"""
+import hashlib
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+
+from flask import Request, current_app, jsonify, redirect, send_file
+
+from .errors import HandledError
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # thumbnails are skipped without Pillow
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes -> (mimetype, extension). WebP is "RIFF....WEBP".
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"RIFF", "image/webp", ".webp"),
+)
+_SNIFF_BYTES = 12
+_EXTENSIONS = {mimetype: ext for _, mimetype, ext in _SIGNATURES}
+# Multipart boundaries and the other form fields on top of the photo itself
+_FORM_OVERHEAD = 64 * 1024
+
+_NAME = re.compile(r"([0-9a-f]{64})(\.thumb)?\.(jpg|png|webp)")
+
+
+class UploadRejected(HandledError):
+    """An upload broke a size or type rule; raised while the body is parsed."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _sniff(head: bytes):
+    for magic, mimetype, _ in _SIGNATURES:
+        if head.startswith(magic) and (mimetype != "image/webp" or head[8:12] == b"WEBP"):
+            return mimetype
+    return None
+
+
+def _stored_path(folder, name):
+    # Two-character shards keep directories small
+    return os.path.join(folder, name[:2], name)
+
+
+class HashingUploadStream:
+    """Writable file for one multipart file part; see the module docstring."""
+
+    def __init__(self, folder, max_bytes, allowed_types):
+        tmp_dir = os.path.join(folder, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=tmp_dir, prefix="upload-", delete=False)
+        self.path = self._file.name
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._max_bytes = max_bytes
+        self._allowed = allowed_types
+        self.size = 0
+        self.mimetype = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self._max_bytes:
+            raise UploadRejected(f"Photo must be at most {self._max_bytes // (1024 * 1024)} MB", 413)
+        if self.mimetype is None:
+            self._head += data[:_SNIFF_BYTES]
+            if len(self._head) >= _SNIFF_BYTES:
+                self._check_type()
+        self._hash.update(data)
+        self._file.write(data)
+        return len(data)
+
+    def _check_type(self):
+        mimetype = _sniff(self._head)
+        if mimetype is None or mimetype not in self._allowed:
+            raise UploadRejected("Photo must be a JPEG, PNG or WebP image", 415)
+        self.mimetype = mimetype
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def persist(self, folder):
+        """
+        Move the upload to its content address. Returns ``(name, created)``;
+        ``created`` is False when the same bytes were already stored.
+        """
+        if self.mimetype is None:
+            self._check_type()
+        name = f"{self._hash.hexdigest()}{_EXTENSIONS[self.mimetype]}"
+        final = _stored_path(folder, name)
+        self._file.close()
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        created = not os.path.exists(final)
+        if created:
+            os.replace(self.path, final)
+        else:
+            os.remove(self.path)
+        self.path = None
+        return name, created
+
+    def close(self):
+        self._file.close()
+        if self.path is not None:
+            # Never persisted: the request failed or the photo was not used
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+def streams_uploads(view):
+    """Mark a view whose multipart files should go through ``HashingUploadStream``."""
+    view.streams_uploads = True
+    return view
+
+
+class UploadRequest(Request):
+    """Request class that hands marked views a hashing, size-limited file stream."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        view = current_app.view_functions.get(self.endpoint)
+        if not getattr(view, "streams_uploads", False):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        config = current_app.config
+        max_bytes = config.get("UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+        if total_content_length and total_content_length > max_bytes + _FORM_OVERHEAD:
+            # Refuse before reading the body at all
+            raise UploadRejected(f"Photo must be at most {max_bytes // (1024 * 1024)} MB", 413)
+        allowed = {t.strip() for t in config.get("UPLOAD_ALLOWED_TYPES", "").split(",") if t.strip()}
+        stream = HashingUploadStream(config["UPLOAD_FOLDER"], max_bytes, allowed)
+        # Werkzeug drops its containers if parsing fails; close() cleans these up
+        self.__dict__.setdefault("_upload_streams", []).append(stream)
+        return stream
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for stream in self.__dict__.pop("_upload_streams", ()):
+                stream.close()
+
+
+def store_photo(file_storage):
+    """
+    Store an uploaded photo (a ``FileStorage`` from a ``@streams_uploads``
+    view) and queue its thumbnail. Returns the public URL, or None when no
+    file was chosen.
+    """
+    if file_storage is None or not file_storage.filename:
+        return None
+    stream = file_storage.stream
+    if not isinstance(stream, HashingUploadStream):
+        raise TypeError("store_photo needs a @streams_uploads view")
+    if stream.size == 0:
+        return None
+
+    config = current_app.config
+    folder = config["UPLOAD_FOLDER"]
+    name, created = stream.persist(folder)
+    if created:
+        thumbnails.submit(_stored_path(folder, name), config.get("UPLOAD_THUMBNAIL_SIZE", 320))
+    return f"/uploads/{name}"
+
+
+def thumbnail_url(photo_url):
+    """``/uploads/<sha>.thumb.jpg`` for a stored photo URL, else None."""
+    if not photo_url or not photo_url.startswith("/uploads/"):
+        return None
+    match = _NAME.fullmatch(photo_url[len("/uploads/"):])
+    if match is None or match.group(2):
+        return None
+    return f"/uploads/{match.group(1)}.thumb.jpg"
+
+
+def _thumbnail_path(source):
+    digest = os.path.basename(source).split(".", 1)[0]
+    return os.path.join(os.path.dirname(source), f"{digest}.thumb.jpg")
+
+
+def make_thumbnail(source, size):
+    """Write a JPEG thumbnail next to ``source``; returns its path."""
+    target = _thumbnail_path(source)
+    with Image.open(source) as image:
+        image.draft("RGB", (size, size))  # lets the JPEG decoder downscale for free
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                image.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+            os.replace(tmp, target)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return target
+
+
+class ThumbnailWorker:
+    """One background thread per process; the queue is bounded and lossy."""
+
+    def __init__(self, queue_size=256):
+        self._lock = threading.Lock()
+        self._queue_size = queue_size
+        self._queue = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork(); each gunicorn worker starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue_size)
+                threading.Thread(target=self._run, args=(self._queue,),
+                                 name="thumbnails", daemon=True).start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def submit(self, source, size) -> bool:
+        if Image is None:
+            return False
+        try:
+            self._ensure_started().put_nowait((source, size))
+            return True
+        except queue.Full:
+            logger.warning(f"Thumbnail queue full, skipping {os.path.basename(source)}")
+            return False
+
+    def _run(self, jobs):
+        while True:
+            source, size = jobs.get()
+            try:
+                make_thumbnail(source, size)
+            except Exception as e:
+                logger.error(f"Thumbnail failed for {os.path.basename(source)}: {str(e)}")
+            finally:
+                jobs.task_done()
+
+    def join(self):
+        """Wait for queued thumbnails (tests and the CLI)."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+
+thumbnails = ThumbnailWorker()
+
+
+def backfill_thumbnails(folder, size):
+    """Create missing thumbnails for every stored photo; returns how many were made."""
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    made = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            match = _NAME.fullmatch(name)
+            if match is None or match.group(2):
+                continue
+            source = os.path.join(root, name)
+            if os.path.exists(_thumbnail_path(source)):
+                continue
+            try:
+                make_thumbnail(source, size)
+                made += 1
+            except Exception as e:
+                logger.error(f"Thumbnail failed for {name}: {str(e)}")
+    return made
+
+
+def send_upload(name):
+    """
+    Serve a stored photo or thumbnail. Names are content hashes, so the
+    response never changes and is cached for a year; ``send_file`` answers
+    Range and conditional requests.
+    """
+    match = _NAME.fullmatch(name)
+    if match is None:
+        return jsonify({"message": "Not found"}), 404
+    config = current_app.config
+    path = _stored_path(config["UPLOAD_FOLDER"], name)
+    if not os.path.isfile(path):
+        if match.group(2):
+            # Thumbnail not made yet (or no Pillow): fall back to the original
+            for ext in _EXTENSIONS.values():
+                original = f"{match.group(1)}{ext}"
+                if os.path.isfile(_stored_path(config["UPLOAD_FOLDER"], original)):
+                    response = redirect(f"/uploads/{original}")
+                    response.headers["Cache-Control"] = "no-cache"
+                    return response
+        return jsonify({"message": "Not found"}), 404
+
+    response = send_file(path, conditional=True, etag=match.group(1),
+                         max_age=config.get("UPLOAD_CACHE_MAX_AGE", 31536000))
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
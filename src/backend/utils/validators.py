@@ -1,3 +1,14 @@
+import sys
+from collections import namedtuple
+
+from ..models import UserRole
+
+REGISTRATION_FIELDS = ["name", "email", "password", "role"]
+# Optional profile fields accepted at registration, per role
+CUSTOMER_PROFILE_FIELDS = ["phone", "address", "city", "state", "zip_code"]
+DRIVER_PROFILE_FIELDS = ["phone", "license_number", "vehicle_type", "vehicle_number"]
+
+
 def require_fields(data: dict, fields: list[str]):
     missing = [f for f in fields if f not in data or data.get(f) in (None, "")]
     if missing:
@@ -5,12 +16,248 @@ def require_fields(data: dict, fields: list[str]):
     return True, None
 
 
-def validate_lat_lng(lat, lng):
-    try:
-        lat = float(lat)
-        lng = float(lng)
-        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
-            return False
-        return True
-    except Exception:
-        return False
+def validate_registration(data: dict):
+    """
+    Field and role checks shared by /register and the admin bulk import.
+    Email uniqueness needs the database and is checked by the caller.
+    """
+    ok, err = require_fields(data, REGISTRATION_FIELDS)
+    if not ok:
+        return False, err
+    not_text = [f for f in REGISTRATION_FIELDS if not isinstance(data[f], str)]
+    if not_text:
+        return False, f"Fields must be strings: {', '.join(not_text)}"
+    if data["role"].lower() not in [r.value for r in UserRole]:
+        return False, "Invalid role"
+    return True, None
+
+
+_MISSING = object()
+_NAN = float("nan")
+# Heaviest load accepted for an order, in kg (a fully loaded heavy truck)
+MAX_WEIGHT_KG = 50_000
+
+
+class Field:
+    """One declared input; build these with ``text``/``number`` and friends."""
+    __slots__ = ("name", "source", "kind", "required", "nullable", "max_length",
+                 "minimum", "maximum", "positive", "error")
+
+    def __init__(self, name, kind, required=True, nullable=True, source=None, max_length=None,
+                 minimum=None, maximum=None, positive=False, error=None):
+        self.name = name
+        self.source = source or name
+        self.kind = kind
+        self.required = required
+        self.nullable = nullable
+        self.max_length = max_length
+        self.minimum = minimum
+        self.maximum = maximum
+        self.positive = positive
+        self.error = error
+
+
+def text(name, required=True, max_length=None, nullable=True, source=None):
+    """A string, stripped of surrounding whitespace."""
+    return Field(name, "text", required, nullable, source, max_length=max_length)
+
+
+def number(name, required=True, minimum=None, maximum=None, positive=False, error=None, source=None):
+    """A float; strings (form fields) are converted, booleans and NaN/inf rejected."""
+    return Field(name, "number", required, False, source, minimum=minimum, maximum=maximum,
+                 positive=positive, error=error)
+
+
+def latitude(name, **kwargs):
+    return number(name, minimum=-90, maximum=90, error="Invalid coordinates", **kwargs)
+
+
+def longitude(name, **kwargs):
+    return number(name, minimum=-180, maximum=180, error="Invalid coordinates", **kwargs)
+
+
+# What an absent or empty field does
+_REQUIRE, _DEFAULT_NONE, _CLEAR, _REJECT_EMPTY = range(4)
+# Unset bounds are the largest finite floats, so NaN and inf always fail
+_FLOAT_MAX = sys.float_info.max
+
+# One field's checks, worked out when the schema is built. ``invalid`` is the
+# message for a wrong type (or, for numbers, out of range); ``other`` is the
+# one for a number that is not positive or a string that is too long.
+_Step = namedtuple("_Step", "name source when_empty empty_error is_number minimum maximum positive "
+                            "max_length invalid other")
+
+
+def _step(field, partial):
+    if partial:
+        when_empty = _CLEAR if field.nullable else _REJECT_EMPTY
+    else:
+        when_empty = _REQUIRE if field.required else _DEFAULT_NONE
+    empty_error = f"{field.source} cannot be empty"
+    if field.kind == "text":
+        return _Step(field.name, field.source, when_empty, empty_error, False, None, None, False,
+                     sys.maxsize if field.max_length is None else field.max_length,
+                     f"{field.source} must be a string",
+                     f"{field.source} must be at most {field.max_length} characters")
+    return _Step(field.name, field.source, when_empty, empty_error, True,
+                 -_FLOAT_MAX if field.minimum is None else field.minimum,
+                 _FLOAT_MAX if field.maximum is None else field.maximum,
+                 field.positive, None,
+                 field.error or f"{field.source} must be a number",
+                 field.error or f"{field.source} must be greater than 0")
+
+
+class Schema:
+    """
+    A set of fields whose checks are worked out once, at import, into a
+    tuple of steps that ``parse`` runs through. ``parse`` takes a JSON
+    object or form ``MultiDict`` and returns ``(values, None)`` or
+    ``(None, message)``; empty strings count as missing, so form and JSON
+    input behave the same. With ``partial=True`` (profile updates) every
+    field is optional and only the fields sent are returned.
+    """
+
+    def __init__(self, *fields, partial=False, label="Request body"):
+        self.fields = fields
+        self.names = [f.name for f in fields]
+        self.partial = partial
+        self.label = label
+        self._not_object = f"{label} must be a JSON object"
+        # Plain tuples: unpacking them is faster than unpacking the namedtuple
+        self._steps = tuple(tuple(_step(f, partial)) for f in fields)
+
+    def extend(self, *fields, partial=None, label=None):
+        return Schema(*self.fields, *fields, partial=self.partial if partial is None else partial,
+                      label=label or self.label)
+
+    def parse(self, data):
+        if not isinstance(data, dict):
+            return None, self._not_object
+        get = data.get
+        values = {}
+        missing = []
+        error = None
+        # Checks are inlined rather than called per field: this runs on
+        # every order and profile request
+        for (name, source, when_empty, empty_error, is_number, minimum, maximum, positive,
+             max_length, invalid, other) in self._steps:
+            value = get(source, _MISSING)
+            if value is _MISSING or value is None or value == '':
+                if when_empty == _REQUIRE:
+                    missing.append(source)
+                elif when_empty == _DEFAULT_NONE:
+                    values[name] = None
+                elif value is not _MISSING:
+                    if when_empty == _CLEAR:
+                        values[name] = None
+                    elif error is None:
+                        error = empty_error
+            elif error is not None:
+                continue
+            elif is_number:
+                kind = type(value)
+                try:
+                    value = float(value) if kind is float or kind is int or kind is str else _NAN
+                except (ValueError, TypeError, OverflowError):
+                    # OverflowError: an int too large for a float, e.g. 10**400
+                    value = _NAN
+                if not minimum <= value <= maximum:
+                    error = invalid
+                elif positive and value <= 0:
+                    error = other
+                else:
+                    values[name] = value
+            elif type(value) is str:
+                value = value.strip()
+                if len(value) > max_length:
+                    error = other
+                else:
+                    values[name] = value
+            else:
+                error = invalid
+        if missing:
+            return None, "Missing fields: " + ', '.join(missing)
+        if error is not None:
+            return None, error
+        return values, None
+
+
+ROUTE_SCHEMA = Schema(
+    latitude("pickup_lat"), longitude("pickup_lng"),
+    latitude("drop_lat"), longitude("drop_lng"),
+    number("weight_kg", positive=True, maximum=MAX_WEIGHT_KG,
+           error=f"weight_kg must be a number between 0 and {MAX_WEIGHT_KG}"),
+    label="Order",
+)
+ORDER_DETAILS_SCHEMA = Schema(
+    text("pickup_address", max_length=255),
+    text("drop_address", max_length=255),
+    text("material_type", max_length=120),
+    text("material_description", required=False),
+    label="Order",
+)
+ORDER_SCHEMA = ROUTE_SCHEMA.extend(*ORDER_DETAILS_SCHEMA.fields)
+# /orders/simple form: its own field names for the same order columns
+SIMPLE_ORDER_SCHEMA = Schema(
+    text("pickup_address", max_length=255, source="pickup_location"),
+    text("drop_address", max_length=255, source="drop_location"),
+    text("material_type", max_length=120),
+    text("material_description", required=False),
+    label="Order",
+)
+SIMPLE_ROUTE_SCHEMA = Schema(
+    latitude("pickup_lat"), longitude("pickup_lng"),
+    latitude("drop_lat"), longitude("drop_lng"),
+    number("weight_kg", positive=True, maximum=MAX_WEIGHT_KG,
+           error=f"Material weight must be a number greater than 0 and at most {MAX_WEIGHT_KG} kg",
+           source="material_weight"),
+    label="Order",
+)
+LOCATION_SCHEMA = Schema(latitude("lat"), longitude("lng"),
+                         # Fix time in ms since the epoch; see utils/locations.py
+                         number("seq", required=False, minimum=0, error="seq must be a timestamp in ms"),
+                         label="Location")
+
+# PUT /profile: any subset of these; lengths match the columns
+CUSTOMER_PROFILE_SCHEMA = Schema(
+    text("name", max_length=120, nullable=False),
+    text("phone", max_length=20),
+    text("address", max_length=255),
+    text("city", max_length=100),
+    text("state", max_length=100),
+    text("zip_code", max_length=10),
+    text("country", max_length=100),
+    partial=True, label="Profile",
+)
+DRIVER_PROFILE_SCHEMA = Schema(
+    text("name", max_length=120, nullable=False),
+    text("phone", max_length=20),
+    text("license_number", max_length=50),
+    text("vehicle_type", max_length=50),
+    text("vehicle_number", max_length=20),
+    partial=True, label="Profile",
+)
+
+
+def parse_route(data):
+    """
+    Validate the coordinates and weight of a route. Returns ``(route, None)``
+    with floats for the coordinates and weight, or ``(None, message)``.
+    """
+    return ROUTE_SCHEMA.parse(data)
+
+
+def parse_order(data, route=None):
+    """
+    Validate one order payload (JSON object or form fields). Returns
+    ``(order, None)`` with coordinates and weight as floats, or
+    ``(None, message)``. A ``route`` already verified elsewhere (a signed
+    quote) replaces the coordinate and weight fields.
+    """
+    if route is None:
+        return ORDER_SCHEMA.parse(data)
+    order, err = ORDER_DETAILS_SCHEMA.parse(data)
+    if err:
+        return None, err
+    order.update(route)
+    return order, None
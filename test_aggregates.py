@@ -0,0 +1,72 @@
+"""
+Customer and driver totals kept in step with every order change.
+
+Run with: python -m pytest test_aggregates.py
+"""
+from conftest import auth, register
+from backend.database import db
+from backend.models import Customer, Driver
+from backend.utils.order_changes import assign_orders, reconcile_customers, reconcile_drivers
+
+
+def _orders(client, token, weights):
+    rows = [{"pickup_lat": 18.5 + i / 100, "pickup_lng": 73.85, "drop_lat": 18.6, "drop_lng": 73.9,
+             "pickup_address": "A", "drop_address": "B", "material_type": "boxes", "weight_kg": weight}
+            for i, weight in enumerate(weights)]
+    response = client.post("/api/customer/orders/batch", json=rows, headers=auth(token))
+    assert response.status_code == 201
+    return [r["order_id"] for r in response.get_json()["results"]]
+
+
+def _move(client, token, order_id, *statuses):
+    for status in statuses:
+        response = client.post(f"/api/driver/orders/{order_id}/status", json={"status": status},
+                               headers=auth(token))
+        assert response.status_code == 200
+
+
+def _busy_day(client):
+    token, _ = register(client, "customer@example.com")
+    first, _ = register(client, "first@example.com", role="driver")
+    second, second_user = register(client, "second@example.com", role="driver")
+    delivered, returned, cancelled, pending, dispatched = _orders(client, token, [10, 20, 30, 40, 50])
+
+    assert client.post(f"/api/driver/orders/{delivered}/accept", headers=auth(first)).status_code == 200
+    _move(client, first, delivered, "picked", "delivering", "delivered")
+    assert client.post(f"/api/driver/orders/{returned}/accept", headers=auth(second)).status_code == 200
+    # Delivered, then cancelled after all: every total moves back
+    _move(client, second, returned, "delivered", "cancelled")
+    _move(client, first, cancelled, "cancelled")
+
+    driver = Driver.query.filter_by(user_id=second_user["id"]).one()
+    assert [c.order_id for c in assign_orders([(dispatched, driver.id)])] == [dispatched]
+    db.session.commit()
+
+
+def test_incremental_totals_match_a_full_recount(client):
+    _busy_day(client)
+    customer = Customer.query.one()
+    assert (customer.total_orders, customer.completed_orders) == (3, 1)
+
+    assert reconcile_customers(dry_run=True) == (1, 0)
+    assert reconcile_drivers(dry_run=True) == (2, 0)
+    assert [d.total_deliveries for d in Driver.query.order_by(Driver.id)] == [1, 0]
+
+
+def test_reconcile_repairs_drift(client):
+    _busy_day(client)
+    customer = Customer.query.one()
+    expected = (customer.total_orders, customer.total_spent, customer.completed_orders)
+    Customer.query.update({Customer.total_spent: Customer.total_spent + 5, Customer.completed_orders: 0})
+    Driver.query.update({Driver.total_deliveries: 7})
+    db.session.commit()
+
+    assert reconcile_customers(dry_run=True) == (1, 1)
+    assert reconcile_customers() == (1, 1)
+    assert reconcile_drivers() == (2, 2)
+    assert reconcile_customers(dry_run=True) == (1, 0)
+    assert reconcile_drivers(dry_run=True) == (2, 0)
+
+    db.session.expire_all()
+    customer = Customer.query.one()
+    assert (customer.total_orders, customer.total_spent, customer.completed_orders) == expected
@@ -0,0 +1,65 @@
+"""
+Admin bulk user import from CSV and NDJSON uploads.
+
+Run with: python -m pytest test_bulk_import.py
+"""
+import io
+import json
+
+from conftest import auth, register
+from backend.models import Driver, User
+
+CSV = (
+    "name,email,password,role,phone\n"
+    "Driver One,d1@example.com,Secret123!,driver,9000000001\n"
+    "Driver Two,d2@example.com,Secret123!,DRIVER,\n"
+    "Taken,existing@example.com,Secret123!,customer,\n"
+    "Bad Role,bad@example.com,Secret123!,pilot,\n"
+    "Repeat,d1@example.com,Secret123!,driver,\n"
+    "Customer,c1@example.com,Secret123!,customer,\n"
+)
+
+
+def _import(client, token, body, filename, query=""):
+    return client.post(f"/api/admin/users/import{query}", headers=auth(token),
+                       data={"file": (io.BytesIO(body.encode()), filename)},
+                       content_type="multipart/form-data")
+
+
+def test_csv_import_creates_valid_rows_and_reports_the_rest(app, client):
+    app.config["BULK_IMPORT_BATCH_SIZE"] = 2
+    admin_token, _ = register(client, "admin@example.com", role="admin")
+    register(client, "existing@example.com")
+
+    response = _import(client, admin_token, CSV, "fleet.csv")
+    assert response.status_code == 201
+    result = response.get_json()
+    assert result["created"] == 3
+    assert result["created_by_role"] == {"customer": 1, "driver": 2}
+    assert [(e["line"], e["message"]) for e in result["errors"]] == [
+        (5, "Invalid role"),
+        (6, "Duplicate email in upload"),
+        (4, "Email already registered"),
+    ]
+
+    driver = Driver.query.join(User).filter(User.email == "d1@example.com").one()
+    assert driver.phone == "9000000001" and driver.driver_id
+    login = client.post("/api/auth/login", json={"email": "d2@example.com", "password": "Secret123!"})
+    assert login.status_code == 200 and login.get_json()["user"]["role"] == "driver"
+
+
+def test_ndjson_import_takes_the_role_from_the_query(client):
+    admin_token, _ = register(client, "admin@example.com", role="admin")
+    body = "\n".join([json.dumps({"name": "N", "email": "n1@example.com", "password": "Secret123!"}),
+                      "{not json",
+                      json.dumps({"name": "A", "email": "a@example.com", "password": "x", "role": "admin"})])
+
+    result = _import(client, admin_token, body, "fleet.ndjson", query="?role=driver").get_json()
+    assert result["created_by_role"] == {"customer": 0, "driver": 1}
+    assert [e["message"] for e in result["errors"]] == [
+        "Invalid JSON object", "Admin accounts cannot be bulk imported"]
+
+
+def test_only_admins_can_import(client):
+    token, _ = register(client, "customer@example.com")
+    assert _import(client, token, CSV, "fleet.csv").status_code == 403
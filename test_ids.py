@@ -0,0 +1,79 @@
+"""
+Public and order ids from the slot-partitioned id service.
+
+Run with: python -m pytest test_ids.py
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.database import db
+from backend.models import Customer, Order, User
+from backend.utils.ids import IdService, IdSpaceExhausted
+
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc).timestamp()
+LATE = datetime(2026, 10, 18, 22, 0, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def state_dir(app, tmp_path):
+    app.config.update(ID_STATE_DIR=str(tmp_path), ID_WORKER_SLOTS=16, ID_WORKER_RANGE=None)
+    return tmp_path
+
+
+def test_public_ids_ascend_and_keep_nine_digits(state_dir):
+    service = IdService()
+    # A burst runs ahead of the clock; a clock stepping back changes nothing
+    ids = service.public_ids(200, now=NOW) + service.public_ids(5, now=NOW - 3600)
+    assert ids == sorted(set(ids))
+    assert all(len(str(i)) == 9 for i in ids)
+
+
+def test_order_ids_keep_four_digits_late_in_the_day(state_dir):
+    ids = IdService().order_ids(100, now=LATE)
+    assert ids == sorted(set(ids))
+    assert all(len(i) == 15 and i.startswith("ORD20261018") for i in ids)
+
+
+def test_a_full_share_moves_to_the_next_slot_then_raises(app, state_dir):
+    app.config.update(ID_WORKER_SLOTS=4, ID_WORKER_RANGE="0-1")
+    service = IdService()
+    ids = service.order_ids(2400, now=LATE) + service.order_ids(200, now=LATE)
+    assert ids[2499:2501] == ["ORD202610182499", "ORD202610182500"]
+    ids += service.order_ids(2400, now=LATE)
+    assert len(set(ids)) == 5000 and all(len(i) == 15 for i in ids)
+
+    with pytest.raises(IdSpaceExhausted):
+        service.order_ids(1, now=LATE)
+    # The next day starts over in the worker's own slot
+    assert service.order_id(now=LATE + 86400) == "ORD202610190000"
+
+
+def test_workers_in_different_slots_never_share_ids(state_dir):
+    first, second = IdService(), IdService()
+    public, orders = [], []
+    for _ in range(3):
+        public += first.public_ids(50, now=NOW) + second.public_ids(50, now=NOW)
+        orders += first.order_ids(50, now=NOW) + second.order_ids(50, now=NOW)
+    assert first.worker != second.worker
+    assert len(set(public)) == 300 and len(set(orders)) == 300
+
+
+def test_a_lost_state_dir_is_reseeded_from_the_database(app, state_dir, tmp_path_factory):
+    first = IdService()
+    user = User(name="C", email="c@example.com", password_hash="x", role="customer")
+    db.session.add(user)
+    db.session.flush()
+    customer = Customer(user_id=user.id, customer_id=first.public_ids(500, now=NOW)[-1])
+    db.session.add(customer)
+    db.session.flush()
+    order_ids = first.order_ids(3, now=NOW)
+    db.session.add_all(Order(customer_id=customer.id, public_id=i) for i in order_ids)
+    db.session.commit()
+
+    # Same slot, empty state directory: e.g. a redeploy on an ephemeral disk
+    app.config["ID_STATE_DIR"] = str(tmp_path_factory.mktemp("redeployed"))
+    second = IdService()
+    assert second.worker == first.worker
+    assert second.public_id(now=NOW) > customer.customer_id
+    assert second.order_id(now=NOW) > order_ids[-1]
@@ -0,0 +1,84 @@
+"""
+Token buckets and the login throttle in front of bcrypt.
+
+Run with: python -m pytest test_login_rate_limit.py
+"""
+import pytest
+from sqlalchemy import event
+
+from conftest import register
+from backend.database import db
+from backend.utils.rate_limit import MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "buckets.db"))
+
+
+def test_bucket_allows_a_burst_then_rejects_until_refilled(backend):
+    # 2 tokens, refilled at one per 5 seconds
+    assert backend.take("k", 2, 10, now=100.0) == 0
+    assert backend.take("k", 2, 10, now=100.0) == 0
+    assert backend.take("k", 2, 10, now=100.0) == pytest.approx(5.0)
+    assert backend.take("k", 2, 10, now=102.5) == pytest.approx(2.5)
+    assert backend.take("k", 2, 10, now=105.0) == 0
+    assert backend.take("k", 2, 10, now=105.0) > 0
+
+
+def test_bucket_refills_no_higher_than_its_burst(backend):
+    assert backend.take("k", 2, 10, now=0.0) == 0
+    for _ in range(2):
+        assert backend.take("k", 2, 10, now=1000.0) == 0
+    assert backend.take("k", 2, 10, now=1000.0) > 0
+
+
+def test_refund_returns_a_spent_token(backend):
+    assert backend.take("k", 1, 60, now=0.0) == 0
+    backend.refund("k", 1, 60, now=0.0)
+    assert backend.take("k", 1, 60, now=0.0) == 0
+    assert backend.take("k", 1, 60, now=0.0) > 0
+
+
+def _login(client, email, password, ip="203.0.113.7"):
+    return client.post("/api/auth/login", json={"email": email, "password": password},
+                       headers={"X-Forwarded-For": ip})
+
+
+def test_rejected_login_does_no_database_work(app, client):
+    app.config["LOGIN_RATE_LIMIT_PER_IP"] = "2/60"
+    register(client, "bucket@example.com")
+    for _ in range(2):
+        assert _login(client, "bucket@example.com", "wrong").status_code == 401
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        response = _login(client, "bucket@example.com", "wrong")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert statements == []
+
+
+def test_ip_buckets_use_the_forwarded_client_address(app, client):
+    app.config["LOGIN_RATE_LIMIT_PER_IP"] = "1/60"
+    register(client, "proxy@example.com")
+    assert _login(client, "proxy@example.com", "wrong", ip="198.51.100.1").status_code == 401
+    assert _login(client, "proxy@example.com", "wrong", ip="198.51.100.1").status_code == 429
+    assert _login(client, "proxy@example.com", "Secret123!", ip="198.51.100.2").status_code == 200
+
+
+def test_only_failed_logins_count_against_the_email(app, client):
+    app.config["LOGIN_RATE_LIMIT_PER_EMAIL"] = "2/300"
+    register(client, "owner@example.com")
+    for _ in range(5):
+        assert _login(client, "owner@example.com", "Secret123!").status_code == 200
+    assert _login(client, "owner@example.com", "wrong").status_code == 401
+    assert _login(client, "owner@example.com", "Secret123!").status_code == 200
+    assert _login(client, "owner@example.com", "wrong").status_code == 401
+    assert _login(client, "owner@example.com", "wrong").status_code == 429
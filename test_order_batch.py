@@ -0,0 +1,41 @@
+"""
+Batch order creation returns each row's own order id.
+
+Run with: python -m pytest test_order_batch.py
+"""
+import pytest
+
+from conftest import auth, register
+from backend.database import db
+from backend.models import Customer, Order
+
+
+def _order(lat, weight_kg):
+    return {"pickup_lat": lat, "pickup_lng": 73.85, "drop_lat": lat + 0.05, "drop_lng": 73.9,
+            "pickup_address": "A", "drop_address": "B", "material_type": "boxes", "weight_kg": weight_kg}
+
+
+@pytest.mark.parametrize("insert_returning", [True, False], ids=["returning", "row-by-row"])
+def test_batch_ids_belong_to_their_rows(app, client, monkeypatch, insert_returning):
+    # Without RETURNING (MySQL) rows are inserted one at a time
+    monkeypatch.setattr(db.engine.dialect, "insert_returning", insert_returning)
+    app.config["ORDER_BATCH_CHUNK_SIZE"] = 2
+    token, _ = register(client, "batch@example.com")
+    rows = [_order(18.50, 10), {"pickup_lat": "x"}, _order(18.60, 250), _order(18.70, 40)]
+
+    response = client.post("/api/customer/orders/batch", json=rows, headers=auth(token))
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body["created"], body["failed"]) == (3, 1)
+    assert "error" in body["results"][1]
+
+    for index in (0, 2, 3):
+        result = body["results"][index]
+        order = db.session.get(Order, result["order_id"])
+        assert order.public_id == result["public_id"]
+        assert order.pickup_lat == rows[index]["pickup_lat"]
+        assert order.weight_kg == rows[index]["weight_kg"]
+        assert order.fare_total == result["fare_total"]
+        assert order.pickup_cell
+    customer = Customer.query.one()
+    assert customer.total_orders == 3
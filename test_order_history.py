@@ -0,0 +1,84 @@
+"""
+Keyset-paginated order history and its ETags.
+
+Run with: python -m pytest test_order_history.py
+"""
+from conftest import auth, register
+
+
+def _orders(count, lat=18.5):
+    return [{"pickup_lat": lat + i / 100, "pickup_lng": 73.85, "drop_lat": lat + 0.1, "drop_lng": 73.9,
+             "pickup_address": "A", "drop_address": "B", "material_type": "boxes", "weight_kg": 10}
+            for i in range(count)]
+
+
+def _create(client, token, count):
+    response = client.post("/api/customer/orders/batch", json=_orders(count), headers=auth(token))
+    assert response.status_code == 201
+    return [r["order_id"] for r in response.get_json()["results"]]
+
+
+def _pages(client, token, limit, **params):
+    pages, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/customer/orders", query_string=query, headers=auth(token))
+        assert response.status_code == 200
+        pages.append([o["id"] for o in response.get_json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_pages_walk_the_history_newest_first(client):
+    token, _ = register(client, "pages@example.com")
+    # One batch shares a created_at, so the id breaks the ties
+    ids = _create(client, token, 5)
+    assert _pages(client, token, 2) == [ids[:-3:-1], ids[-3:-5:-1], ids[:1]]
+
+
+def test_new_orders_do_not_shift_later_pages(client):
+    token, _ = register(client, "shift@example.com")
+    ids = _create(client, token, 4)
+    first = client.get("/api/customer/orders?limit=2", headers=auth(token))
+    _create(client, token, 3)
+    second = client.get("/api/customer/orders", headers=auth(token),
+                        query_string={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [o["id"] for o in second.get_json()] == [ids[1], ids[0]]
+
+
+def test_history_only_shows_the_customers_own_orders(client):
+    token, _ = register(client, "mine@example.com")
+    other, _ = register(client, "theirs@example.com")
+    mine = _create(client, token, 2)
+    _create(client, other, 2)
+    assert _pages(client, token, 10) == [mine[::-1]]
+
+
+def test_bad_cursor_is_rejected(client):
+    token, _ = register(client, "cursor@example.com")
+    response = client.get("/api/customer/orders?cursor=nonsense", headers=auth(token))
+    assert response.status_code == 400
+
+
+def test_etag_answers_304_until_an_order_changes(client):
+    token, _ = register(client, "etag@example.com")
+    driver_token, _ = register(client, "driver@example.com", role="driver")
+    order_id = _create(client, token, 2)[0]
+
+    first = client.get("/api/customer/orders", headers=auth(token))
+    etag = first.headers["ETag"]
+    again = client.get("/api/customer/orders", headers={**auth(token), "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    summary = client.get("/api/customer/orders/summary", headers=auth(token))
+    assert client.get("/api/customer/orders/summary", headers={
+        **auth(token), "If-None-Match": summary.headers["ETag"]}).status_code == 304
+
+    assert client.post(f"/api/driver/orders/{order_id}/accept", headers=auth(driver_token)).status_code == 200
+    changed = client.get("/api/customer/orders", headers={**auth(token), "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert {o["id"]: o["status"] for o in changed.get_json()}[order_id] == "assigned"
+    assert client.get("/api/customer/orders/summary", headers={
+        **auth(token), "If-None-Match": summary.headers["ETag"]}).status_code == 200
@@ -67,7 +67,8 @@ with app.app_context():
     print("=" * 50)
     
     print("\n1. Testing send_password_reset_email...")
-    test_email_function(send_password_reset_email, test_user)
+    # Any token works here; the reset route stores its hash before sending
+    test_email_function(send_password_reset_email, test_user, "test-reset-token")
     
     print("\n2. Testing send_password_reset_confirmation...")
     test_email_function(send_password_reset_confirmation, test_user)
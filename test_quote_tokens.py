@@ -0,0 +1,54 @@
+"""
+Quote tokens at the edges of their packed fields.
+
+Run with: python -m pytest test_quote_tokens.py
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from backend.utils.pricing import compute_fare, haversine_km
+from backend.utils.quote_cache import Quote
+from backend.utils.quote_tokens import sign_quote, verify_quote
+from backend.utils.validators import MAX_WEIGHT_KG, parse_route
+
+ROUTE = {"pickup_lat": 18.52, "pickup_lng": 73.86, "drop_lat": -18.52, "drop_lng": -106.14}
+
+
+@pytest.fixture
+def app_context():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test-secret'
+    with app.app_context():
+        yield
+
+
+def _quote(weight_kg):
+    distance = haversine_km(ROUTE["pickup_lat"], ROUTE["pickup_lng"], ROUTE["drop_lat"], ROUTE["drop_lng"])
+    return Quote(ROUTE["pickup_lat"], ROUTE["pickup_lng"], ROUTE["drop_lat"], ROUTE["drop_lng"],
+                 weight_kg, distance, *compute_fare(distance, weight_kg))
+
+
+def test_heaviest_weight_on_the_longest_route_signs_and_verifies(app_context):
+    route, err = parse_route({**ROUTE, "weight_kg": MAX_WEIGHT_KG})
+    assert err is None
+    token = sign_quote(_quote(route["weight_kg"]), ROUTE["pickup_lat"], ROUTE["pickup_lng"],
+                       ROUTE["drop_lat"], ROUTE["drop_lng"], route["weight_kg"], customer_id=7)
+    assert verify_quote(token, 7).weight_kg == MAX_WEIGHT_KG
+
+
+@pytest.mark.parametrize("weight_kg", [MAX_WEIGHT_KG + 0.001, 5e6, 10 ** 400])
+def test_weight_above_the_maximum_is_rejected(weight_kg):
+    route, err = parse_route({**ROUTE, "weight_kg": weight_kg})
+    assert route is None and "weight_kg" in err
+
+
+def test_values_outside_the_token_fields_raise_value_error(app_context):
+    # 4294967.296 kg is one gram past uint32
+    with pytest.raises(ValueError):
+        sign_quote(_quote(4_294_967.296), ROUTE["pickup_lat"], ROUTE["pickup_lng"],
+                   ROUTE["drop_lat"], ROUTE["drop_lng"], 4_294_967.296, customer_id=7)
@@ -0,0 +1,45 @@
+"""
+Blacklisting a user revokes the tokens they already hold.
+
+Run with: python -m pytest test_revocation.py
+"""
+import time
+
+from conftest import auth, register
+from backend.database import db
+from backend.utils import revocation
+
+
+def test_blacklisted_users_token_is_refused_after_the_poll_interval(app, client, monkeypatch):
+    app.config["REVOCATION_POLL_INTERVAL"] = 60
+    admin_token, _ = register(client, "admin@example.com", role="admin")
+    token, user = register(client, "revoked@example.com")
+    other_token, _ = register(client, "other@example.com")
+    assert client.get("/api/customer/orders", headers=auth(token)).status_code == 200
+
+    response = client.post(f"/api/admin/users/{user['id']}/blacklist", json={"reason": "test"},
+                           headers=auth(admin_token))
+    assert response.status_code == 200
+
+    # Workers only re-read the revocation counter once per interval
+    assert client.get("/api/customer/orders", headers=auth(token)).status_code == 200
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr(revocation.time, "monotonic", lambda: later)
+    response = client.get("/api/customer/orders", headers=auth(token))
+    assert response.status_code == 401
+    assert response.get_json()["message"] == "Token has been revoked"
+    assert client.get("/api/customer/orders", headers=auth(other_token)).status_code == 200
+
+
+def test_tokens_issued_after_a_revocation_are_accepted(app, client):
+    app.config["REVOCATION_POLL_INTERVAL"] = 0
+    token, user = register(client, "rotated@example.com")
+    with app.app_context():
+        revocation.revoke_user_tokens(user["id"])
+        db.session.commit()
+    assert client.get("/api/customer/orders", headers=auth(token)).status_code == 401
+
+    response = client.post("/api/auth/login", json={"email": "rotated@example.com", "password": "Secret123!"})
+    assert response.status_code == 200
+    assert client.get("/api/customer/orders", headers=auth(response.get_json()["token"])).status_code == 200